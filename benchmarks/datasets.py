@@ -0,0 +1,244 @@
+"""
+Scales the recorded upstream responses in 'fixtures/' into datasets of a
+configurable size (connections, minions, jobs, instances).
+"""
+
+import copy
+import json
+import os
+import uuid
+from datetime import datetime, timedelta
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+ROLES = ['controller', 'compute', 'storage', 'cache', 'share', 'pxe', 'mds']
+PHYSICAL_ROLES = {'compute', 'storage'}
+START_DATE = 1718035620000
+
+
+def load_fixture(name: str) -> dict:
+    """
+    Loads a recorded upstream response from the fixtures directory.
+
+    Parameters:
+        name (str): The name of the fixture file without extension.
+
+    Returns:
+        dict: The recorded responses.
+    """
+    with open(os.path.join(FIXTURES_DIR, f'{name}.json'), encoding='utf8') as f:
+        return json.load(f)
+
+
+def _uuid(namespace: str, index: int) -> str:
+    """
+    Returns a deterministic uuid so repeated runs replay identical data.
+    """
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f'{namespace}/{index}'))
+
+
+class GuacamoleDataset:
+    """
+    Guacamole connection tree, active sessions, users and history.
+
+    Parameters:
+        connections (int): The number of connections in the tree.
+        group_size (int): The number of connections per connection group.
+        history (int): The number of history entries per connection.
+    """
+
+    def __init__(self, connections: int, group_size: int = 10,
+                 history: int = 20):
+        recorded = load_fixture('guacamole')
+        self.tree = copy.deepcopy(recorded['tree'])
+        group_template = self.tree.pop('childConnectionGroups')[0]
+        self.connections = {}
+        self.active = {}
+        self.users = {}
+        self.history = {}
+
+        groups = []
+        for index in range(connections):
+            group_index = index // group_size
+            if group_index == len(groups):
+                group = copy.deepcopy(group_template)
+                group['name'] = f'team-{group_index + 1:02d}'
+                group['identifier'] = str(group_index + 1)
+                group['childConnections'] = []
+                groups.append(group)
+            group = groups[group_index]
+
+            identifier = str(index + 1)
+            conn = copy.deepcopy(recorded['connection'])
+            conn['name'] = f"{group['name']}-host-{index + 1}"
+            conn['identifier'] = identifier
+            conn['parentIdentifier'] = group['identifier']
+
+            username = f'student{index // 2 + 1:03d}'
+            if username not in self.users:
+                user = copy.deepcopy(recorded['user'])
+                user['username'] = username
+                user['attributes']['guac-organization'] = group['name']
+                self.users[username] = user
+
+            # every other connection has between one and three sessions
+            sessions = (index % 3) + 1 if index % 2 == 0 else 0
+            for session_index in range(sessions):
+                active = copy.deepcopy(recorded['active_connection'])
+                active['identifier'] = _uuid('active', index * 3 + session_index)
+                active['connectionIdentifier'] = identifier
+                active['startDate'] = START_DATE + session_index * 60000
+                active['username'] = username
+                self.active[active['identifier']] = active
+            conn['activeConnections'] = sessions
+
+            entries = []
+            for history_index in range(history):
+                entry = copy.deepcopy(recorded['history'])
+                entry['connectionIdentifier'] = identifier
+                entry['connectionName'] = conn['name']
+                entry['username'] = f'student{(index + history_index) % max(connections // 2, 1) + 1:03d}'
+                entry['startDate'] = START_DATE - history_index * 3600000
+                entry['endDate'] = entry['startDate'] + 1800000
+                entry['uuid'] = _uuid('history', index * history + history_index)
+                entries.append(entry)
+            self.history[identifier] = entries
+
+            group['childConnections'].append(conn)
+            self.connections[identifier] = {
+                key: value
+                for key, value in conn.items()
+                if key != 'activeConnections'
+            }
+
+        self.tree['childConnectionGroups'] = groups
+
+
+def connection_history(rows: int, users: int = 200) -> list:
+    """
+    Returns the history of a single busy connection shared by many users,
+    the worst case of the connection timeline.
+
+    Parameters:
+        rows (int): The number of history entries.
+        users (int): The number of distinct users.
+
+    Returns:
+        list: The history entries, newest first like Guacamole returns them.
+    """
+    recorded = load_fixture('guacamole')['history']
+    history = []
+    for index in range(rows):
+        entry = dict(recorded)
+        entry['connectionIdentifier'] = '1'
+        entry['username'] = f'student{index % users + 1:03d}'
+        entry['startDate'] = START_DATE - index * 300000
+        entry['endDate'] = entry['startDate'] + 240000
+        history.append(entry)
+    return history
+
+
+def job_cache(jobs: int, minion_ids: list) -> dict:
+    """
+    Returns a jobs.list_jobs job cache, one job every 37 seconds going
+    back from the recorded job, every fifth job being a 'test.ping'.
+
+    Parameters:
+        jobs (int): The number of jobs.
+        minion_ids (list): The minions the jobs are spread over.
+
+    Returns:
+        dict: The jobs keyed by JID.
+    """
+    recorded = load_fixture('saltstack')['job']
+    cache = {}
+    start = datetime(2024, 6, 10, 14, 7)
+    for index in range(jobs):
+        started = start - timedelta(seconds=index * 37)
+        jid = started.strftime('%Y%m%d%H%M%S') + f'{index % 1000000:06d}'
+        job = copy.deepcopy(recorded)
+        job['StartTime'] = started.strftime('%Y, %b %d %H:%M:%S.%f')
+        job['Target'] = minion_ids[index % len(minion_ids)] if minion_ids else '*'
+        if index % 5 == 0:
+            job['Function'] = 'test.ping'
+        cache[jid] = job
+    return cache
+
+
+class SaltDataset:
+    """
+    Salt minion grains, job cache and job returns.
+
+    Parameters:
+        minions (int): The number of minions.
+        jobs (int): The number of jobs in the job cache.
+        hostname (str): The hostname of the salt master.
+    """
+
+    def __init__(self, minions: int, jobs: int, hostname: str = 'salt-dev'):
+        recorded = load_fixture('saltstack')
+        self.hostname = hostname
+        self.grains = {}
+        self.ipmi = {}
+        self.jobs = {}
+        self.job_return = recorded['job_return']
+        self.uptime = recorded['uptime']
+        self.loadavg = recorded['loadavg']
+
+        for index in range(minions):
+            role = ROLES[index % len(ROLES)]
+            minion_uuid = _uuid('minion', index)
+            minion_id = f'{role}-{minion_uuid}'
+            grains = copy.deepcopy(recorded['grains'])
+            grains['id'] = minion_id
+            grains['uuid'] = minion_uuid
+            grains['role'] = role
+            grains['fqdn_ip4'] = [f'10.100.{index // 250}.{index % 250 + 1}']
+            if role in PHYSICAL_ROLES:
+                grains['virtual'] = 'physical'
+                ipmi = copy.deepcopy(recorded['ipmi'])
+                ipmi['cpu_temp'] = f'{40 + index % 20} degrees C'
+                ipmi['system_temp'] = f'{28 + index % 10} degrees C'
+                grains['ipmi'] = ipmi
+                self.ipmi[minion_id] = ipmi
+            self.grains[minion_id] = grains
+
+        self.jobs = job_cache(jobs, list(self.grains))
+        # (tag, data) events streamed by salt-api's '/events'
+        self.events = []
+
+    def manage_up(self) -> list:
+        """
+        Returns the minion ids reported by 'manage.up'.
+        """
+        return list(self.grains)
+
+
+class OpenStackDataset:
+    """
+    OpenStack servers and networks.
+
+    Parameters:
+        instances (int): The number of servers.
+        network_size (int): The number of servers per network.
+    """
+
+    def __init__(self, instances: int, network_size: int = 10):
+        recorded = load_fixture('openstack')
+        self.servers = []
+        self.networks = []
+
+        for index in range(instances):
+            if index % network_size == 0:
+                network = copy.deepcopy(recorded['network'])
+                network['id'] = _uuid('network', index)
+                network['name'] = f'team-{index // network_size + 1:02d}-net'
+                self.networks.append(network)
+
+            server = copy.deepcopy(recorded['server'])
+            server['id'] = _uuid('server', index)
+            server['name'] = f'team-{index // network_size + 1:02d}-host-{index + 1}'
+            server['status'] = 'ACTIVE' if index % 4 else 'SHUTOFF'
+            address = server['addresses'].pop('team-01-net')
+            server['addresses'] = {self.networks[-1]['name']: address}
+            self.servers.append(server)
@@ -0,0 +1,271 @@
+"""
+Measures the memory held per snapshot entity.
+
+Every kind of entity kept in snapshots (Guacamole connections and sessions,
+salt minions and jobs, OpenStack servers and networks) is scaled from the
+recorded responses in 'fixtures/', decoded from JSON like an upstream
+response, then kept either as the decoded dictionaries or as the records
+the plugins build from them. The bytes still allocated afterwards are
+measured with tracemalloc and divided by the number of entities.
+
+Usage:
+    python -m benchmarks.memory --entities 100000
+"""
+
+import argparse
+import gc
+import json
+import sys
+import tracemalloc
+
+from benchmarks.datasets import ROLES, START_DATE, _uuid, load_fixture
+
+
+def connections(count: int) -> list:
+    """
+    Returns connections as found in the Guacamole connection tree.
+    """
+    recorded = load_fixture('guacamole')['connection']
+    return [
+        dict(
+            recorded,
+            name=f'team-{index // 10 + 1:02d}-host-{index + 1}',
+            identifier=str(index + 1),
+            parentIdentifier=str(index // 10 + 1),
+            protocol=('rdp', 'ssh', 'vnc')[index % 3],
+            activeConnections=index % 3,
+            lastActive=START_DATE + index * 1000,
+        )
+        for index in range(count)
+    ]
+
+
+def sessions(count: int) -> list:
+    """
+    Returns Guacamole active connections.
+    """
+    recorded = load_fixture('guacamole')['active_connection']
+    return [
+        dict(
+            recorded,
+            identifier=_uuid('active', index),
+            connectionIdentifier=str(index // 2 + 1),
+            startDate=START_DATE + index * 1000,
+            username=f'student{index % 200 + 1:03d}',
+        )
+        for index in range(count)
+    ]
+
+
+def minions(count: int) -> list:
+    """
+    Returns the default grains of salt minions.
+    """
+    recorded = load_fixture('saltstack')['grains']
+    grains = ['id', 'virtual', 'uuid', 'build_phase', 'role', 'fqdn_ip4']
+    result = []
+    for index in range(count):
+        minion_uuid = _uuid('minion', index)
+        minion = {key: recorded[key] for key in grains}
+        minion['id'] = f'{ROLES[index % len(ROLES)]}-{minion_uuid}'
+        minion['uuid'] = minion_uuid
+        minion['role'] = ROLES[index % len(ROLES)]
+        minion['fqdn_ip4'] = [f'10.100.{index // 250}.{index % 250 + 1}']
+        result.append(minion)
+    return result
+
+
+def jobs(count: int) -> list:
+    """
+    Returns (jid, details) pairs of the salt job cache.
+    """
+    recorded = load_fixture('saltstack')['job']
+    return [
+        [
+            f'2024061014{index % 60:02d}00{index:06d}',
+            dict(recorded, Target=f'{ROLES[index % len(ROLES)]}-{_uuid("minion", index % 2000)}'),
+        ]
+        for index in range(count)
+    ]
+
+
+def servers(count: int) -> list:
+    """
+    Returns servers in the format of openstacksdk's Server.to_dict().
+    """
+    recorded = load_fixture('openstack')['server']
+    return [
+        {
+            'id': _uuid('server', index),
+            'name': f'team-{index // 10 + 1:02d}-host-{index + 1}',
+            'status': 'ACTIVE' if index % 4 else 'SHUTOFF',
+            'project_id': recorded['tenant_id'],
+            'user_id': recorded['user_id'],
+            'created_at': recorded['created'],
+            'updated_at': recorded['updated'],
+            'addresses': {
+                f'team-{index // 10 + 1:02d}-net': recorded['addresses']['team-01-net']
+            },
+            'flavor': recorded['flavor'],
+            'image': recorded['image'],
+            'key_name': recorded['key_name'],
+            'availability_zone': recorded['OS-EXT-AZ:availability_zone'],
+            'vm_state': recorded['OS-EXT-STS:vm_state'],
+            'power_state': recorded['OS-EXT-STS:power_state'],
+            'task_state': recorded['OS-EXT-STS:task_state'],
+            'security_groups': recorded['security_groups'],
+            'metadata': recorded['metadata'],
+            'description': None,
+            'host_id': recorded['hostId'],
+            'hypervisor_hostname': None,
+            'is_locked': None,
+            'tags': None,
+        }
+        for index in range(count)
+    ]
+
+
+def networks(count: int) -> list:
+    """
+    Returns networks in the format of openstacksdk's Network.to_dict().
+    """
+    recorded = load_fixture('openstack')['network']
+    return [
+        {
+            'id': _uuid('network', index),
+            'name': f'team-{index + 1:02d}-net',
+            'status': recorded['status'],
+            'project_id': recorded['project_id'],
+            'subnet_ids': recorded['subnets'],
+            'is_admin_state_up': recorded['admin_state_up'],
+            'is_shared': recorded['shared'],
+            'is_router_external': recorded['router:external'],
+            'mtu': recorded['mtu'],
+            'provider_network_type': recorded['provider:network_type'],
+            'created_at': recorded['created_at'],
+            'updated_at': recorded['updated_at'],
+            'availability_zones': recorded['availability_zones'],
+            'revision_number': recorded['revision_number'],
+            'tags': recorded['tags'],
+            'description': None,
+            'dns_domain': None,
+            'qos_policy_id': None,
+        }
+        for index in range(count)
+    ]
+
+
+def entity_kinds() -> dict:
+    """
+    Returns the generator of every kind of entity and the function
+    building its record from one decoded entity.
+    """
+    from range_monitor.plugins.guacamole import parse as guac_parse
+    from range_monitor.plugins.openstack import parse as stack_parse
+    from range_monitor.plugins.saltstack import parse as salt_parse
+
+    def compact(record_type):
+        return lambda data: record_type.from_dict({
+            key: value for key, value in data.items() if value is not None
+        })
+
+    return {
+        'guacamole.connection': (connections, guac_parse.Connection.from_dict),
+        'guacamole.session': (sessions, guac_parse.Session.from_dict),
+        'saltstack.minion': (minions, salt_parse.Minion.from_dict),
+        'saltstack.job': (jobs, lambda job: salt_parse.JobRecord(*job)),
+        'openstack.server': (servers, compact(stack_parse.Server)),
+        'openstack.network': (networks, compact(stack_parse.Network)),
+    }
+
+
+def retained(payload: str, convert=None) -> int:
+    """
+    Returns the bytes still allocated after decoding a JSON payload and
+    optionally converting every decoded entity.
+
+    Parameters:
+        payload (str): The JSON list of entities.
+        convert (callable, optional): Builds what is kept of an entity.
+
+    Returns:
+        int: The allocated bytes.
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        kept = json.loads(payload)
+        if convert is not None:
+            kept = [convert(entity) for entity in kept]
+        gc.collect()
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del kept
+    return size
+
+
+def measure(count: int, only: str = None) -> dict:
+    """
+    Measures the bytes per entity of every kind of entity.
+
+    Parameters:
+        count (int): The number of entities of each kind.
+        only (str, optional): Only kinds containing this text.
+
+    Returns:
+        dict: The 'dict_bytes' and 'record_bytes' per entity by kind.
+    """
+    results = {}
+    for name, (generate, convert) in entity_kinds().items():
+        if only and only not in name:
+            continue
+        # decoded from JSON, repeated strings are distinct objects like
+        # in an upstream response
+        payload = json.dumps(generate(count))
+        results[name] = {
+            'dict_bytes': retained(payload) / count,
+            'record_bytes': retained(payload, convert) / count,
+        }
+    return results
+
+
+def print_table(results: dict):
+    """
+    Prints the bytes per entity as a table.
+    """
+    width = max([len(name) for name in results] + [len('entity')])
+    print(f"{'entity':<{width}}  {'dict B':>10}  {'record B':>10}  {'saved':>6}")
+    for name, stats in results.items():
+        saved = 1 - stats['record_bytes'] / stats['dict_bytes']
+        print(
+            f"{name:<{width}}  {stats['dict_bytes']:>10.1f}"
+            f"  {stats['record_bytes']:>10.1f}  {saved:>6.0%}"
+        )
+
+
+def parse_args(argv=None):
+    """
+    Parses the command line arguments.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--entities', type=int, default=100000,
+                        help='Entities of each kind')
+    parser.add_argument('--only', help='Only measure entities containing this text')
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    """
+    Measures and prints the bytes per entity.
+
+    Returns:
+        int: The exit code.
+    """
+    args = parse_args(argv)
+    print_table(measure(args.entities, args.only))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
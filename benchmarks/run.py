@@ -0,0 +1,420 @@
+"""
+Runs the Range Monitor benchmark suite.
+
+Every '/api/*' route of every plugin is exercised end-to-end through the
+Flask app against local stub servers replaying recorded Guacamole, salt-api
+and OpenStack responses, and every parse function is timed on the same
+datasets. Results are written to 'benchmarks/results/' and compared against
+a previous run to catch regressions between releases.
+
+Usage:
+    python -m benchmarks.run --connections 500 --minions 1500 \\
+        --baseline benchmarks/results/baseline.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import ExitStack, redirect_stdout
+from datetime import datetime, timezone
+from io import StringIO
+
+from benchmarks import datasets, stubs
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+
+# request bodies for the '/api/*' routes that only accept POST
+POST_PAYLOADS = {
+    '/guacamole/api/connect-to-node': lambda scale: {
+        'identifiers': [str(i + 1) for i in range(min(scale.connections, 20))]
+    },
+    '/guacamole/api/kill-connections': lambda scale: {
+        'identifiers': [str(i + 1) for i in range(min(scale.connections, 20))]
+    },
+    '/guacamole/api/kill-sessions': lambda scale: {
+        'groups': ['ROOT']
+    },
+}
+
+# page routes without an '/api/' prefix that still poll an upstream
+EXTRA_ROUTES = [
+    ('GET', '/saltstack/jobs'),
+    ('GET', '/saltstack/'),
+    ('GET', '/openstack/diagnostics/'),
+]
+
+
+def percentile(samples: list, percent: float) -> float:
+    """
+    Returns the given percentile of a list of samples.
+
+    Parameters:
+        samples (list): The samples.
+        percent (float): The percentile between 0 and 100.
+
+    Returns:
+        float: The interpolated percentile.
+    """
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    rank = (len(ordered) - 1) * percent / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def summarize(samples: list, errors: int = 0) -> dict:
+    """
+    Summarizes latency samples measured in seconds.
+
+    Parameters:
+        samples (list): The latency of each iteration in seconds.
+        errors (int): The number of failed iterations.
+
+    Returns:
+        dict: Latency statistics in milliseconds and the throughput.
+    """
+    total = sum(samples)
+    return {
+        'iterations': len(samples),
+        'errors': errors,
+        'mean_ms': round(statistics.fmean(samples) * 1000, 3) if samples else 0.0,
+        'p50_ms': round(percentile(samples, 50) * 1000, 3),
+        'p95_ms': round(percentile(samples, 95) * 1000, 3),
+        'max_ms': round(max(samples, default=0) * 1000, 3),
+        'throughput_rps': round(len(samples) / total, 2) if total else 0.0,
+    }
+
+
+def measure(func, iterations: int, warmup: int) -> dict:
+    """
+    Times a callable.
+
+    Parameters:
+        func: The callable to time. It returns False on failure.
+        iterations (int): The number of timed iterations.
+        warmup (int): The number of untimed iterations run first.
+
+    Returns:
+        dict: The summarized timings.
+    """
+    for _ in range(warmup):
+        func()
+
+    samples = []
+    errors = 0
+    for _ in range(iterations):
+        start = time.perf_counter()
+        ok = func()
+        samples.append(time.perf_counter() - start)
+        errors += ok is False
+    return summarize(samples, errors)
+
+
+def create_app(guac_url: str, salt_url: str, stack_url: str,
+               hostname: str, db_path: str):
+    """
+    Creates the app with its data sources pointed at the stub servers.
+    """
+    from range_monitor import create_app as _create_app
+    from range_monitor.db import get_db, init_db
+
+    with redirect_stdout(StringIO()):
+        app = _create_app({'TESTING': True, 'DATABASE': db_path})
+
+    with app.app_context():
+        init_db()
+        db = get_db()
+        db.execute('UPDATE guacamole SET endpoint = ?', (guac_url,))
+        db.execute(
+            'UPDATE saltstack SET endpoint = ?, hostname = ?',
+            (salt_url, hostname)
+        )
+        db.execute(
+            'UPDATE openstack SET auth_url = ?', (f'{stack_url}/identity/v3',)
+        )
+        db.commit()
+    return app
+
+
+def api_routes(app) -> list:
+    """
+    Lists the '/api/*' routes of the app that take no url arguments.
+
+    Returns:
+        list: (method, path) tuples.
+    """
+    routes = []
+    for rule in app.url_map.iter_rules():
+        if '/api/' not in rule.rule or rule.arguments:
+            continue
+        method = 'GET' if 'GET' in rule.methods else 'POST'
+        routes.append((method, rule.rule))
+    return sorted(routes, key=lambda route: route[1]) + EXTRA_ROUTES
+
+
+def bench_routes(app, scale, iterations: int, warmup: int,
+                 only: str = None) -> dict:
+    """
+    Benchmarks every route end-to-end through the Flask test client.
+    """
+    client = app.test_client()
+    client.post('/auth/login', data={
+        'username': 'Administrator', 'password': 'password'
+    })
+
+    results = {}
+    for method, path in api_routes(app):
+        name = f'route {method} {path}'
+        if only and only not in name:
+            continue
+        payload = POST_PAYLOADS.get(path, lambda scale: None)(scale)
+
+        def request(method=method, path=path, payload=payload):
+            with redirect_stdout(StringIO()):
+                response = client.open(path, method=method, json=payload)
+            return response.status_code < 400
+
+        results[name] = measure(request, iterations, warmup)
+    return results
+
+
+def build_timeline(salt_parse, jobs: dict):
+    """
+    Builds a JobTimeline from cleaned jobs, as the job index does.
+    """
+    timeline = salt_parse.JobTimeline()
+    for jid, job in jobs.items():
+        timeline.add(salt_parse.JobRecord(jid, job))
+    return timeline
+
+
+def bench_parsers(guac, salt, busy_history: list, busy_jobs: dict,
+                  iterations: int, warmup: int, only: str = None) -> dict:
+    """
+    Benchmarks every parse function on the benchmark datasets.
+    """
+    from range_monitor.plugins.guacamole import parse as guac_parse
+    from range_monitor.plugins.saltstack import parse as salt_parse
+
+    history = [
+        entry
+        for entries in guac.history.values()
+        for entry in entries
+    ]
+    grains = {'return': [{salt.hostname: salt.grains}]}
+    jobs = {'return': [{salt.hostname: salt.jobs}]}
+    manage_up = {'return': [{salt.hostname: salt.manage_up()}]}
+    virtual = {'return': [{salt.hostname: {
+        minion_id: {'virtual': grain_data['virtual']}
+        for minion_id, grain_data in salt.grains.items()
+    }}]}
+    cleaned_jobs = salt_parse.clean_jobs(salt.jobs)
+    grouped_jobs = salt_parse.group_jobs_by_target(cleaned_jobs)
+    minions = salt_parse.clean_minion_data(salt.grains)
+    busy_cleaned = salt_parse.clean_jobs(busy_jobs)
+    busy_timeline = build_timeline(salt_parse, busy_cleaned)
+
+    parsers = {
+        'guacamole.extract_connections': lambda: guac_parse.extract_connections([guac.tree]),
+        'guacamole.format_history': lambda: guac_parse.format_history(history),
+        'guacamole.format_history_busy': lambda: guac_parse.format_history(busy_history),
+        'guacamole.format_history_busy_hourly': lambda: guac_parse.format_history(busy_history, 3600000),
+        'saltstack.simplify_response': lambda: salt_parse.simplify_response(grains, salt.hostname),
+        'saltstack.clean_minion_data': lambda: salt_parse.clean_minion_data(salt.grains),
+        'saltstack.sort_minions_by_role': lambda: salt_parse.sort_minions_by_role(minions),
+        'saltstack.clean_jobs': lambda: salt_parse.clean_jobs(salt.jobs),
+        'saltstack.group_jobs_by_target': lambda: salt_parse.group_jobs_by_target(cleaned_jobs),
+        'saltstack.sort_jobs_by_time': lambda: salt_parse.sort_jobs_by_time(grouped_jobs),
+        'saltstack.get_physical_minions': lambda: salt_parse.get_physical_minions(virtual, salt.hostname),
+        'saltstack.count_roles': lambda: salt_parse.count_roles(manage_up, salt.hostname),
+        'saltstack.sort_jobs_by_time_busy': lambda: salt_parse.sort_jobs_by_time(
+            salt_parse.group_jobs_by_target(busy_cleaned)
+        ),
+        'saltstack.job_timeline_build_busy': lambda: build_timeline(salt_parse, busy_cleaned),
+        'saltstack.job_timeline_latest_busy': lambda: busy_timeline.grouped(20),
+        'saltstack.jobs_pipeline': lambda: salt_parse.sort_jobs_by_time(
+            salt_parse.group_jobs_by_target(
+                salt_parse.clean_jobs(
+                    salt_parse.simplify_response(jobs, salt.hostname)
+                )
+            )
+        ),
+    }
+
+    return {
+        f'parse {name}': measure(func, iterations, warmup)
+        for name, func in parsers.items()
+        if not only or only in f'parse {name}'
+    }
+
+
+def git_revision() -> str:
+    """
+    Returns the current git revision or 'unknown'.
+    """
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(__file__)
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """
+    Compares the p50 latency of each benchmark against a baseline run.
+
+    Parameters:
+        results (dict): The current results.
+        baseline (dict): The baseline results.
+        threshold (float): The tolerated relative slowdown (0.2 = 20%).
+
+    Returns:
+        list: (name, baseline p50, current p50) tuples of regressions.
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous or not previous['p50_ms']:
+            continue
+        if current['p50_ms'] > previous['p50_ms'] * (1 + threshold):
+            regressions.append((name, previous['p50_ms'], current['p50_ms']))
+    return regressions
+
+
+def print_table(results: dict):
+    """
+    Prints the results as a table.
+    """
+    width = max((len(name) for name in results), default=10)
+    print(f"{'benchmark':<{width}}  {'p50 ms':>10}  {'p95 ms':>10}  {'req/s':>10}  {'errors':>6}")
+    for name, stats in results.items():
+        print(
+            f"{name:<{width}}  {stats['p50_ms']:>10.3f}  {stats['p95_ms']:>10.3f}"
+            f"  {stats['throughput_rps']:>10.2f}  {stats['errors']:>6}"
+        )
+
+
+def parse_args(argv=None):
+    """
+    Parses the command line arguments.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--connections', type=int, default=200,
+                        help='Guacamole connections in the tree')
+    parser.add_argument('--history', type=int, default=20,
+                        help='Guacamole history entries per connection')
+    parser.add_argument('--history-rows', type=int, default=100000,
+                        help='History entries of the single busy connection')
+    parser.add_argument('--minions', type=int, default=200,
+                        help='Salt minions')
+    parser.add_argument('--jobs', type=int, default=2000,
+                        help='Jobs in the salt job cache')
+    parser.add_argument('--job-rows', type=int, default=100000,
+                        help='Jobs in the large job cache of the job parsers')
+    parser.add_argument('--instances', type=int, default=200,
+                        help='OpenStack servers')
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--only', help='Only run benchmarks containing this text')
+    parser.add_argument('--skip-routes', action='store_true',
+                        help='Only run the parse function benchmarks')
+    parser.add_argument('--output', default=RESULTS_DIR,
+                        help='Directory the results are written to')
+    parser.add_argument('--baseline', help='Results file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='Tolerated p50 slowdown against the baseline')
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    """
+    Runs the benchmark suite.
+
+    Returns:
+        int: The exit code, 1 if a regression was found.
+    """
+    args = parse_args(argv)
+    guac = datasets.GuacamoleDataset(args.connections, history=args.history)
+    salt = datasets.SaltDataset(args.minions, args.jobs)
+    stack = datasets.OpenStackDataset(args.instances)
+
+    results = {}
+    if not args.skip_routes:
+        db_fd, db_path = tempfile.mkstemp()
+        try:
+            with ExitStack() as servers:
+                guac_server = servers.enter_context(
+                    stubs.StubServer(stubs.GuacamoleHandler, guac))
+                salt_server = servers.enter_context(
+                    stubs.StubServer(stubs.SaltHandler, salt))
+                stack_server = servers.enter_context(
+                    stubs.StubServer(stubs.OpenStackHandler, stack))
+                app = create_app(guac_server.url, salt_server.url,
+                                 stack_server.url, salt.hostname, db_path)
+                results.update(
+                    bench_routes(app, args, args.iterations, args.warmup, args.only)
+                )
+        finally:
+            os.close(db_fd)
+            os.unlink(db_path)
+
+    results.update(
+        bench_parsers(guac, salt, datasets.connection_history(args.history_rows),
+                      datasets.job_cache(args.job_rows, list(salt.grains)),
+                      args.iterations, args.warmup, args.only)
+    )
+    print_table(results)
+
+    os.makedirs(args.output, exist_ok=True)
+    created = datetime.now(timezone.utc)
+    report = {
+        'meta': {
+            'created': created.isoformat(),
+            'revision': git_revision(),
+            'python': sys.version.split()[0],
+            'scale': {
+                'connections': args.connections,
+                'history': args.history,
+                'history_rows': args.history_rows,
+                'minions': args.minions,
+                'jobs': args.jobs,
+                'job_rows': args.job_rows,
+                'instances': args.instances,
+            },
+            'iterations': args.iterations,
+        },
+        'results': results,
+    }
+    output = os.path.join(
+        args.output, f"{created.strftime('%Y%m%dT%H%M%S')}-{report['meta']['revision']}.json"
+    )
+    with open(output, 'w', encoding='utf8') as f:
+        json.dump(report, f, indent=2)
+    print(f'\nResults written to {output}')
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf8') as f:
+            baseline = json.load(f)
+        if baseline['meta']['scale'] != report['meta']['scale']:
+            print('WARNING: baseline was recorded at a different scale')
+        regressions = compare(results, baseline['results'], args.threshold)
+        for name, before, after in regressions:
+            print(f'REGRESSION {name}: {before:.3f} ms -> {after:.3f} ms')
+        if regressions:
+            return 1
+        print('No regressions against the baseline.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,315 @@
+"""
+Local stub servers replaying the Guacamole, salt-api and OpenStack APIs
+from a benchmark dataset.
+"""
+
+import json
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Base request handler. Subclasses implement 'route' and return a
+    (status, body, headers) tuple.
+    """
+
+    dataset = None
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        """
+        Silences the per-request access log.
+        """
+
+    def _dispatch(self):
+        url = urlsplit(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length) if length else b''
+        try:
+            body = json.loads(raw) if raw else None
+        except ValueError:
+            body = parse_qs(raw.decode())
+
+        status, payload, headers = self.route(
+            self.command, url.path.rstrip('/'), parse_qs(url.query), body
+        )
+        data = json.dumps(payload).encode() if status != 204 else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = do_POST = do_PATCH = do_DELETE = _dispatch
+
+    def route(self, method: str, path: str, query: dict, body):
+        """
+        Returns the response for a request.
+
+        Parameters:
+            method (str): The HTTP method.
+            path (str): The request path without trailing slash.
+            query (dict): The parsed query string.
+            body: The decoded request body.
+
+        Returns:
+            tuple: The status code, JSON payload and extra headers.
+        """
+        raise NotImplementedError
+
+
+class StubServer:
+    """
+    Runs a stub handler on a local port in a background thread.
+
+    Parameters:
+        handler (type): The StubHandler subclass to serve.
+        dataset: The dataset the handler replays.
+    """
+
+    def __init__(self, handler: type, dataset):
+        handler_class = type(handler.__name__, (handler,), {'dataset': dataset})
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), handler_class)
+        self.server.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self.server.server_port}'
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, daemon=True
+        )
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class GuacamoleHandler(StubHandler):
+    """
+    Replays the subset of the Guacamole REST API used by the plugin.
+    """
+
+    def route(self, method, path, query, body):
+        dataset = self.dataset
+        if path == '/api/tokens':
+            return 200, {'authToken': 'stub-token', 'dataSource': 'mysql'}, None
+
+        parts = path.split('/')
+        if parts[:4] != ['', 'api', 'session', 'data']:
+            return 404, {'message': 'Not found'}, None
+        resource = parts[5:]
+
+        match resource:
+            case ['connectionGroups', _, 'tree']:
+                return 200, dataset.tree, None
+            case ['connections']:
+                return 200, dataset.connections, None
+            case ['connections', identifier]:
+                return 200, dataset.connections.get(identifier, {}), None
+            case ['connections', identifier, 'history']:
+                return 200, dataset.history.get(identifier, []), None
+            case ['history', 'connections']:
+                return 200, [
+                    entry
+                    for entries in dataset.history.values()
+                    for entry in entries
+                ], None
+            case ['activeConnections'] if method == 'PATCH':
+                return 204, None, None
+            case ['activeConnections']:
+                return 200, dataset.active, None
+            case ['users']:
+                return 200, dataset.users, None
+            case ['users', username]:
+                return 200, dataset.users.get(username, {}), None
+        return 404, {'message': 'Not found'}, None
+
+
+class SaltHandler(StubHandler):
+    """
+    Replays salt-api, answering the 'monitor.salt_local_cmd' and
+    'monitor.salt_run_cmd' wrappers used by the plugin. '/events' streams
+    the dataset's queued events and then closes the stream.
+    """
+
+    def do_GET(self):
+        if urlsplit(self.path).path.rstrip('/') != '/events':
+            return self._dispatch()
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(b'retry: 400\n\n')
+        for tag, data in self.dataset.events:
+            event = json.dumps({'tag': tag, 'data': data})
+            self.wfile.write(f'tag: {tag}\ndata: {event}\n\n'.encode())
+        self.wfile.flush()
+        self.close_connection = True
+
+    def route(self, method, path, query, body):
+        if path == '/login':
+            return 200, {'return': [{'token': 'stub-token', 'eauth': 'pam'}]}, None
+        if path != '' or method != 'POST':
+            return 404, {'return': ['Not found']}, None
+
+        chunks = body if isinstance(body, list) else [body]
+        return 200, {
+            'return': [
+                {self.dataset.hostname: self.execute(chunk)}
+                for chunk in chunks
+            ]
+        }, None
+
+    def execute(self, chunk: dict):
+        """
+        Returns the result of one lowstate chunk.
+
+        Parameters:
+            chunk (dict): The lowstate chunk.
+
+        Returns:
+            The result the salt master would return.
+        """
+        dataset = self.dataset
+        cmd = chunk['arg'][0]
+        function = cmd[0]
+        target = cmd[1] if len(cmd) > 1 else ''
+        args = cmd[2] if len(cmd) > 2 else []
+        minions = (
+            dataset.grains
+            if target in ('*', '')
+            else {target: dataset.grains[target]}
+            if target in dataset.grains
+            else {}
+        )
+
+        match function:
+            case 'grains.items':
+                return minions
+            case 'grains.item':
+                return {
+                    minion_id: {
+                        grain: grains[grain]
+                        for grain in args
+                        if grain in grains
+                    }
+                    for minion_id, grains in minions.items()
+                }
+            case 'status.uptime':
+                return {minion_id: dataset.uptime for minion_id in minions}
+            case 'status.loadavg':
+                return {minion_id: dataset.loadavg for minion_id in minions}
+            case 'jobs.list_jobs':
+                kwargs = dict(
+                    arg.split('=', 1) for arg in args
+                    if isinstance(arg, str) and '=' in arg
+                )
+                if 'start_time' not in kwargs:
+                    return dataset.jobs
+                start_time = datetime.strptime(
+                    kwargs['start_time'], '%Y-%m-%d %H:%M:%S'
+                )
+                return {
+                    jid: job
+                    for jid, job in dataset.jobs.items()
+                    if datetime.strptime(
+                        job['StartTime'], '%Y, %b %d %H:%M:%S.%f'
+                    ) >= start_time
+                }
+            case 'jobs.lookup_jid':
+                job = dataset.jobs.get(target)
+                if not job:
+                    return {}
+                return {job['Target']: dataset.job_return}
+            case 'jobs.list_job':
+                job = dataset.jobs.get(target)
+                if not job:
+                    return {}
+                return dict(
+                    job, jid=target,
+                    Minions=job.get('Minions', [job['Target']]),
+                    Result={job['Target']: {'return': dataset.job_return}},
+                )
+            case 'manage.up':
+                return dataset.manage_up()
+        return f"'{function}' is not available."
+
+
+class OpenStackHandler(StubHandler):
+    """
+    Replays the Keystone, Nova and Neutron endpoints needed to list
+    servers and networks.
+    """
+
+    def route(self, method, path, query, body):
+        base = f'http://{self.headers["Host"]}'
+        if path in ('/identity', '/identity/v3'):
+            return 200, {
+                'version': {
+                    'id': 'v3.14', 'status': 'stable',
+                    'links': [{'rel': 'self', 'href': f'{base}/identity/v3/'}],
+                }
+            }, None
+
+        if path == '/identity/v3/auth/tokens':
+            token = {
+                'methods': ['password'],
+                'expires_at': '2099-01-01T00:00:00.000000Z',
+                'issued_at': '2024-06-10T00:00:00.000000Z',
+                'user': {'id': 'stub-user', 'name': 'stub', 'domain': {'id': 'default', 'name': 'Default'}},
+                'project': {'id': 'projectID', 'name': 'service', 'domain': {'id': 'default', 'name': 'Default'}},
+                'roles': [{'id': 'admin', 'name': 'admin'}],
+                'catalog': [
+                    {
+                        'type': service_type, 'name': name, 'id': name,
+                        'endpoints': [{
+                            'id': f'{name}-public', 'interface': 'public',
+                            'region': 'RegionOne', 'region_id': 'RegionOne',
+                            'url': f'{base}/{path_prefix}',
+                        }],
+                    }
+                    for service_type, name, path_prefix in (
+                        ('identity', 'keystone', 'identity/v3'),
+                        ('compute', 'nova', 'compute/v2.1'),
+                        ('network', 'neutron', 'network'),
+                    )
+                ],
+            }
+            return 201, {'token': token}, {'X-Subject-Token': 'stub-token'}
+
+        if path in ('/compute', '/compute/v2.1'):
+            return 200, {
+                'version': {
+                    'id': 'v2.1', 'status': 'CURRENT', 'version': '2.95',
+                    'min_version': '2.1',
+                    'links': [{'rel': 'self', 'href': f'{base}/compute/v2.1/'}],
+                }
+            }, None
+        if path == '/compute/v2.1/servers/detail':
+            return 200, {'servers': self.dataset.servers}, None
+        if path == '/compute/v2.1/servers':
+            return 200, {
+                'servers': [
+                    {'id': server['id'], 'name': server['name'], 'links': []}
+                    for server in self.dataset.servers
+                ]
+            }, None
+
+        if path == '/network':
+            return 200, {
+                'versions': [{
+                    'id': 'v2.0', 'status': 'CURRENT',
+                    'links': [{'rel': 'self', 'href': f'{base}/network/v2.0/'}],
+                }]
+            }, None
+        if path == '/network/v2.0/networks':
+            return 200, {'networks': self.dataset.networks}, None
+
+        return 404, {'error': {'code': 404, 'message': 'Not found'}}, None
@@ -43,8 +43,20 @@ def create_app(test_config=None):
     }
     # setup.share_components(app)
 
+    from . import profiling
+    profiling.init_app(app)
+
+    from . import responses
+    responses.init_app(app)
+
     from . import db
     db.init_app(app)
+
+    from . import snapshots
+    snapshots.init_app(app)
+
+    from . import loadgen
+    loadgen.init_app(app)
     
     from . import auth
     app.register_blueprint(auth.bp)
@@ -53,5 +65,8 @@ def create_app(test_config=None):
     app.register_blueprint(main.bp)
     app.add_url_rule('/', endpoint='index')
 
+    from . import debug
+    app.register_blueprint(debug.bp)
+
     setup.import_plugins(app)
     return app
@@ -2,9 +2,11 @@
 SQLite database wrapper
 """
 
+import os
 import sqlite3
 import click
 from flask import current_app, g
+from range_monitor.profiling import ProfiledConnection
 
 
 def get_db():
@@ -17,7 +19,8 @@ def get_db():
     if 'db' not in g:
         g.db = sqlite3.connect(
             current_app.config['DATABASE'],
-            detect_types=sqlite3.PARSE_DECLTYPES
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            factory=ProfiledConnection
         )
         g.db.row_factory = sqlite3.Row
 
@@ -44,7 +47,8 @@ def close_db(e=None):
 
 def init_db():
     """
-    Initializes the database by executing the SQL commands in the 'schema.sql' file.
+    Initializes the database by executing the SQL commands in the 'schema.sql' file,
+    then the migrations.
 
     This function does not take any parameters.
 
@@ -55,6 +59,59 @@ def init_db():
 
     with current_app.open_resource('schema.sql') as f:
         db.executescript(f.read().decode('utf8'))
+    migrate()
+
+
+# columns added to the tables of schema.sql since their creation
+COLUMNS = [
+    ('guacamole', 'timeout', 'REAL NOT NULL DEFAULT 12'),
+]
+
+# tables replaced since their creation, with the script moving their rows
+# to the new table and dropping them
+REPLACED = [
+    ('salt_temp', """
+        INSERT INTO salt_sensors (hostname, node, sensor, unit, value, time)
+        SELECT hostname, node, sensor || '_temp', 'C', temp,
+               CAST(strftime('%s', time) AS REAL)
+        FROM salt_temp WHERE strftime('%s', time) IS NOT NULL;
+        DROP TABLE salt_temp;
+    """),
+]
+
+
+def migrate():
+    """
+    Brings an existing database up to date without touching its data.
+
+    Creates the tables and indexes of 'migrations.sql', which only uses
+    CREATE ... IF NOT EXISTS, adds the missing COLUMNS to existing tables
+    and moves the rows of REPLACED tables that still exist.
+
+    Returns:
+        None
+    """
+    db = get_db()
+
+    with current_app.open_resource('migrations.sql') as f:
+        db.executescript(f.read().decode('utf8'))
+
+    for table, column, definition in COLUMNS:
+        existing = {
+            row['name']
+            for row in db.execute(f'PRAGMA table_info({table})').fetchall()
+        }
+        if existing and column not in existing:
+            db.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+    db.commit()
+
+    for table, script in REPLACED:
+        exists = db.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+            (table,)
+        ).fetchone()
+        if exists:
+            db.executescript(f'BEGIN; {script} COMMIT;')
 
 
 @click.command('init-db')
@@ -75,3 +132,9 @@ def init_app(app):
     """
     app.teardown_appcontext(close_db)
     app.cli.add_command(init_db_command)
+
+    # databases created by 'flask init-db' are migrated on startup, a
+    # missing one is left for init-db to create
+    if os.path.exists(app.config['DATABASE']):
+        with app.app_context():
+            migrate()
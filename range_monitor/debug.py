@@ -0,0 +1,111 @@
+"""
+Debug views for the Range Monitor application.
+"""
+from flask import Blueprint, jsonify, request, session
+from werkzeug.exceptions import abort
+
+from range_monitor import profiling
+from range_monitor import responses
+from range_monitor import snapshots
+from range_monitor.auth import admin_required
+
+bp = Blueprint('debug', __name__, url_prefix='/debug')
+
+
+@bp.route('/profile')
+@admin_required
+def profile_list():
+    """
+    Lists the stored profiles, newest first, without their span trees.
+
+    Returns:
+        Response: The JSON list of profile summaries.
+    """
+    return jsonify([
+        {
+            key: value
+            for key, value in profile.items()
+            if key != 'spans'
+        } | {'duration_ms': profile['spans']['duration_ms']}
+        for profile in reversed(profiling.list_profiles())
+    ])
+
+
+@bp.route('/profile/<string:profile_id>')
+@admin_required
+def profile_detail(profile_id):
+    """
+    Returns the span tree of a stored profile.
+
+    Parameters:
+        profile_id (str): The identifier of the profile.
+
+    Returns:
+        Response: The JSON profile.
+    """
+    profile = profiling.get_profile(profile_id)
+    if profile is None:
+        abort(404, f"Profile {profile_id} doesn't exist.")
+    return jsonify(profile)
+
+
+@bp.route('/profile/toggle', methods=['POST'])
+@admin_required
+def profile_toggle():
+    """
+    Toggles profiling of every request made by the current session.
+
+    Returns:
+        Response: The JSON profiling state of the session.
+    """
+    session['profile'] = not session.get('profile', False)
+    return jsonify({'success': True, 'profile': session['profile']})
+
+
+@bp.route('/snapshots')
+@admin_required
+def snapshot_list():
+    """
+    Lists the snapshots of the shared snapshot store without their values.
+
+    Returns:
+        Response: The JSON list of snapshot summaries.
+    """
+    return jsonify([
+        {
+            'key': snapshot.key,
+            'source': snapshot.source,
+            'version': snapshot.version,
+            'age': round(snapshot.age(), 3),
+            'stale': snapshot.stale,
+        }
+        for snapshot in snapshots.store.list()
+    ])
+
+
+@bp.route('/snapshots/invalidate', methods=['POST'])
+@admin_required
+def snapshot_invalidate():
+    """
+    Drops snapshots so they are loaded again on next use. The optional
+    'key' and 'source' form or JSON fields restrict what is dropped.
+
+    Returns:
+        Response: The JSON number of dropped snapshots.
+    """
+    data = request.get_json(silent=True) or request.form
+    dropped = snapshots.invalidate(data.get('key'), data.get('source'))
+    return jsonify({'success': True, 'dropped': dropped})
+
+
+@bp.route('/responses')
+@admin_required
+def response_metrics():
+    """
+    Reports the JSON encoder in use, the encoding time, sizes and cache
+    hits of every endpoint and the cached responses.
+
+    Returns:
+        Response: The JSON serialization metrics.
+    """
+    return jsonify(responses.get_metrics())
@@ -0,0 +1,361 @@
+"""
+Synthetic load generator simulating many concurrent dashboard viewers.
+
+Each simulated viewer logs in through '/auth/login', opens a page and then
+reproduces the polling pattern of that page's JavaScript. The report gives
+per-route latency percentiles, error rates and the upstream call
+amplification measured through the profiling headers.
+"""
+
+import math
+import random
+import threading
+import time
+from collections import defaultdict
+
+import click
+import requests
+
+# page -> (page url, [(method, api url, poll interval in seconds)]),
+# mirroring the fetch loops in each plugin's static/js
+PAGES = {
+    'guacamole.topology': ('/guacamole/', [
+        # topology.js refresh speed 'high', used during range events
+        ('GET', '/guacamole/api/topology_data', 5),
+    ]),
+    'guacamole.active_connections': ('/guacamole/active_connections', [
+        ('GET', '/guacamole/api/conns_data', 5),
+    ]),
+    'guacamole.connections_graph': ('/guacamole/connections_graph', [
+        ('GET', '/guacamole/api/conns_data', 5),
+    ]),
+    'guacamole.active_users': ('/guacamole/active_users', [
+        ('GET', '/guacamole/api/users_data', 5),
+    ]),
+    'guacamole.slideshow': ('/guacamole/slideshow', [
+        ('GET', '/guacamole/api/slideshow_data', 15),
+    ]),
+    'saltstack.minion_graph': ('/saltstack/minion_graph', [
+        ('GET', '/saltstack/api/minion_data', 5),
+    ]),
+    'saltstack.sensors': ('/saltstack/sensors', [
+        ('GET', '/saltstack/api/sensors', 5),
+    ]),
+}
+
+
+def percentile(samples: list, percent: float) -> float:
+    """
+    Returns the nearest-rank percentile of a list of samples.
+
+    Parameters:
+        samples (list): The samples.
+        percent (float): The percentile between 0 and 100.
+
+    Returns:
+        float: The percentile, 0.0 for an empty list.
+    """
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(math.ceil(percent / 100 * len(ordered)) - 1, 0)
+    return ordered[rank]
+
+
+class LoadStats:
+    """
+    Thread-safe collector of request outcomes, grouped by route.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.upstream = defaultdict(list)
+        self.logins_failed = 0
+
+    def record(self, route: str, latency: float, ok: bool,
+               upstream_calls: int = None):
+        """
+        Records the outcome of a single request.
+
+        Parameters:
+            route (str): The requested route.
+            latency (float): The latency in seconds.
+            ok (bool): False if the request failed.
+            upstream_calls (int, optional): The upstream calls the server
+                made for the request, when it was profiled.
+        """
+        with self._lock:
+            self.latencies[route].append(latency)
+            if not ok:
+                self.errors[route] += 1
+            if upstream_calls is not None:
+                self.upstream[route].append(upstream_calls)
+
+    def login_failed(self):
+        """
+        Records a simulated viewer that could not log in.
+        """
+        with self._lock:
+            self.logins_failed += 1
+
+    def report(self, elapsed: float) -> list:
+        """
+        Summarizes the recorded requests.
+
+        Parameters:
+            elapsed (float): The duration of the run in seconds.
+
+        Returns:
+            list: One dictionary per route.
+        """
+        with self._lock:
+            rows = []
+            for route, latencies in sorted(self.latencies.items()):
+                upstream = self.upstream.get(route)
+                rows.append({
+                    'route': route,
+                    'requests': len(latencies),
+                    'rps': len(latencies) / elapsed if elapsed else 0.0,
+                    'error_rate': self.errors[route] / len(latencies),
+                    'p50_ms': percentile(latencies, 50) * 1000,
+                    'p95_ms': percentile(latencies, 95) * 1000,
+                    'p99_ms': percentile(latencies, 99) * 1000,
+                    'amplification': (
+                        sum(upstream) / len(upstream) if upstream else None
+                    ),
+                })
+            return rows
+
+
+class ViewerSession(threading.Thread):
+    """
+    A simulated dashboard viewer polling the APIs of one page.
+
+    Parameters:
+        base_url (str): The url of the Range Monitor instance.
+        credentials (tuple): The username and password to log in with.
+        page (str): The key of the page in PAGES.
+        stats (LoadStats): The collector of request outcomes.
+        stop (threading.Event): Set when the run is over.
+        profile_rate (float): The fraction of requests sent with the
+            'X-Profile' header to measure upstream amplification.
+        timeout (float): The timeout of a single request in seconds.
+    """
+
+    def __init__(self, base_url: str, credentials: tuple, page: str,
+                 stats: LoadStats, stop: threading.Event,
+                 profile_rate: float, timeout: float):
+        super().__init__(daemon=True)
+        self.base_url = base_url.rstrip('/')
+        self.credentials = credentials
+        self.page = page
+        self.stats = stats
+        self.stop = stop
+        self.profile_rate = profile_rate
+        self.timeout = timeout
+        self.http = requests.Session()
+
+    def login(self) -> bool:
+        """
+        Logs in through '/auth/login' like the login page does.
+
+        Returns:
+            bool: True if the login succeeded.
+        """
+        username, password = self.credentials
+        try:
+            response = self.http.post(
+                f'{self.base_url}/auth/login',
+                data={'username': username, 'password': password},
+                headers={'X-Requested-With': 'XMLHttpRequest'},
+                timeout=self.timeout,
+            )
+            return response.ok and response.json().get('success', False)
+        except (requests.RequestException, ValueError):
+            return False
+
+    def request(self, method: str, route: str):
+        """
+        Sends one request and records its outcome.
+
+        Parameters:
+            method (str): The HTTP method.
+            route (str): The route to request.
+        """
+        headers = {}
+        if self.profile_rate and random.random() < self.profile_rate:
+            headers['X-Profile'] = '1'
+
+        start = time.perf_counter()
+        try:
+            response = self.http.request(
+                method, f'{self.base_url}{route}',
+                headers=headers, timeout=self.timeout,
+                allow_redirects=False,
+            )
+            ok = response.status_code < 400
+            upstream = response.headers.get('X-Upstream-Calls')
+        except requests.RequestException:
+            ok = False
+            upstream = None
+        self.stats.record(
+            route, time.perf_counter() - start, ok,
+            int(upstream) if upstream is not None else None
+        )
+
+    def run(self):
+        if not self.login():
+            self.stats.login_failed()
+            return
+
+        page_url, pollers = PAGES[self.page]
+        self.request('GET', page_url)
+
+        # spread the first poll over one interval, like viewers opening
+        # the page at different times
+        next_poll = [
+            time.monotonic() + random.uniform(0, interval)
+            for _, _, interval in pollers
+        ]
+        while not self.stop.is_set():
+            now = time.monotonic()
+            for index, (method, route, interval) in enumerate(pollers):
+                if now >= next_poll[index]:
+                    self.request(method, route)
+                    next_poll[index] = max(next_poll[index] + interval, now)
+            self.stop.wait(max(min(next_poll) - time.monotonic(), 0))
+
+
+def run_load(base_url: str, credentials: tuple, sessions: int,
+             duration: float, pages: list, ramp_up: float = 0.0,
+             profile_rate: float = 0.1, timeout: float = 30.0) -> dict:
+    """
+    Runs the simulated viewers and collects their statistics.
+
+    Parameters:
+        base_url (str): The url of the Range Monitor instance.
+        credentials (tuple): The username and password to log in with.
+        sessions (int): The number of simulated viewers.
+        duration (float): The duration of the run in seconds.
+        pages (list): The pages to spread the viewers over.
+        ramp_up (float): The seconds over which the viewers are started.
+        profile_rate (float): The fraction of profiled requests.
+        timeout (float): The timeout of a single request in seconds.
+
+    Returns:
+        dict: The elapsed time, the number of failed logins and the
+            per-route report.
+    """
+    stats = LoadStats()
+    stop = threading.Event()
+    viewers = [
+        ViewerSession(base_url, credentials, pages[index % len(pages)],
+                      stats, stop, profile_rate, timeout)
+        for index in range(sessions)
+    ]
+
+    start = time.monotonic()
+    for index, viewer in enumerate(viewers):
+        viewer.start()
+        if ramp_up and sessions > 1:
+            stop.wait(ramp_up / (sessions - 1) if index < sessions - 1 else 0)
+
+    stop.wait(max(duration - (time.monotonic() - start), 0))
+    stop.set()
+    for viewer in viewers:
+        viewer.join(timeout)
+    elapsed = time.monotonic() - start
+
+    return {
+        'elapsed': elapsed,
+        'logins_failed': stats.logins_failed,
+        'routes': stats.report(elapsed),
+    }
+
+
+def format_report(result: dict) -> str:
+    """
+    Formats the result of run_load as a table.
+
+    Parameters:
+        result (dict): The result of run_load.
+
+    Returns:
+        str: The report.
+    """
+    lines = [
+        f"{'route':<36} {'reqs':>6} {'req/s':>7} {'err %':>6} "
+        f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'upstream':>8}"
+    ]
+    total_requests = 0
+    total_upstream = 0.0
+    for row in result['routes']:
+        amplification = row['amplification']
+        total_requests += row['requests']
+        if amplification is None:
+            upstream = f"{'-':>8}"
+        else:
+            upstream = f"{amplification:>8.2f}"
+            total_upstream += amplification * row['requests']
+        lines.append(
+            f"{row['route']:<36} {row['requests']:>6} {row['rps']:>7.2f} "
+            f"{row['error_rate'] * 100:>6.1f} {row['p50_ms']:>8.1f} "
+            f"{row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f} {upstream}"
+        )
+
+    elapsed = result['elapsed']
+    lines.append('')
+    lines.append(
+        f"{total_requests} requests in {elapsed:.1f}s "
+        f"({total_requests / elapsed if elapsed else 0:.2f} req/s), "
+        f"~{total_upstream / elapsed if elapsed else 0:.2f} upstream calls/s"
+    )
+    if result['logins_failed']:
+        lines.append(f"{result['logins_failed']} simulated viewers failed to log in")
+    return '\n'.join(lines)
+
+
+@click.command('load-test')
+@click.option('--url', default='http://127.0.0.1:5000', show_default=True,
+              help='Url of the running Range Monitor instance.')
+@click.option('--username', default='Administrator', show_default=True)
+@click.option('--password', prompt=True, hide_input=True)
+@click.option('--sessions', default=20, show_default=True,
+              help='Number of simulated viewers.')
+@click.option('--duration', default=60.0, show_default=True,
+              help='Duration of the run in seconds.')
+@click.option('--ramp-up', default=0.0, show_default=True,
+              help='Seconds over which the viewers are started.')
+@click.option('--page', 'pages', multiple=True,
+              type=click.Choice(sorted(PAGES)),
+              help='Page to simulate (repeatable), all pages by default.')
+@click.option('--profile-rate', default=0.1, show_default=True,
+              help='Fraction of requests profiled to measure upstream calls.')
+@click.option('--timeout', default=30.0, show_default=True,
+              help='Timeout of a single request in seconds.')
+def load_test_command(url, username, password, sessions, duration, ramp_up,
+                      pages, profile_rate, timeout):
+    """Simulate concurrent dashboard viewers against a running instance."""
+    pages = list(pages) or sorted(PAGES)
+    click.echo(
+        f"Simulating {sessions} viewers on {len(pages)} page(s) "
+        f"against {url} for {duration:.0f}s..."
+    )
+    result = run_load(url, (username, password), sessions, duration, pages,
+                      ramp_up, profile_rate, timeout)
+    click.echo(format_report(result))
+
+
+def init_app(app):
+    """
+    Registers the load-test command on the given app.
+
+    Parameters:
+        app (object): The Flask app instance.
+
+    Returns:
+        None
+    """
+    app.cli.add_command(load_test_command)
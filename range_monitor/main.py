@@ -14,6 +14,12 @@ from range_monitor.auth import login_required, user_required, admin_required
 
 bp = Blueprint('main', __name__)
 
+"""
+data sources that monitor every enabled entry at once, the others use a
+single enabled entry
+"""
+MULTI_SOURCE_PLUGINS = {'guacamole', 'openstack', 'saltstack'}
+
 @bp.before_app_request
 def load_plugins():
     """
@@ -72,13 +78,14 @@ def toggle_enabled(datasource, entry_id):
         
     db = get_db()
 
-    result = db.execute(
-        f"UPDATE {datasource} SET enabled = 0"
-    )
-    error = None
-    if not result:
-        error = "Failed to update the status of the entry."
-        return jsonify({'success': False, 'error': error}) if is_ajax else refresh
+    if datasource not in MULTI_SOURCE_PLUGINS:
+        result = db.execute(
+            f"UPDATE {datasource} SET enabled = 0"
+        )
+        error = None
+        if not result:
+            error = "Failed to update the status of the entry."
+            return jsonify({'success': False, 'error': error}) if is_ajax else refresh
     
     entry = db.execute(
         f"SELECT enabled FROM {datasource} WHERE id = ?",
@@ -0,0 +1,77 @@
+-- Tables added after schema.sql, created on startup in existing databases.
+-- Every statement must be idempotent: never DROP, only CREATE ... IF NOT EXISTS.
+
+CREATE TABLE IF NOT EXISTS salt_sensors (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  hostname TEXT NOT NULL,
+  node TEXT NOT NULL,
+  sensor TEXT NOT NULL,
+  unit TEXT NOT NULL,
+  value REAL NOT NULL,
+  time REAL NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS salt_sensors_by_sensor
+  ON salt_sensors (hostname, sensor, time);
+CREATE INDEX IF NOT EXISTS salt_sensors_by_node
+  ON salt_sensors (hostname, node, sensor, time);
+CREATE INDEX IF NOT EXISTS salt_sensors_by_time
+  ON salt_sensors (hostname, time);
+
+CREATE TABLE IF NOT EXISTS guac_history (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  source TEXT NOT NULL,
+  connection_identifier TEXT NOT NULL,
+  connection_name TEXT,
+  username TEXT NOT NULL,
+  remote_host TEXT,
+  start_date INTEGER NOT NULL,
+  end_date INTEGER,
+  UNIQUE (source, connection_identifier, username, start_date)
+);
+
+CREATE INDEX IF NOT EXISTS guac_history_by_connection
+  ON guac_history (source, connection_identifier, start_date);
+CREATE INDEX IF NOT EXISTS guac_history_by_user
+  ON guac_history (source, username, start_date);
+CREATE INDEX IF NOT EXISTS guac_history_by_start
+  ON guac_history (source, start_date);
+CREATE INDEX IF NOT EXISTS guac_history_open
+  ON guac_history (source, end_date) WHERE end_date IS NULL;
+
+CREATE TABLE IF NOT EXISTS salt_jobs (
+  source TEXT NOT NULL,
+  jid TEXT NOT NULL,
+  function TEXT,
+  arguments TEXT,
+  target TEXT,
+  start_time TEXT,
+  start_epoch REAL,
+  user TEXT,
+  PRIMARY KEY (source, jid)
+);
+
+CREATE TABLE IF NOT EXISTS salt_job_targets (
+  source TEXT NOT NULL,
+  target TEXT NOT NULL,
+  jid TEXT NOT NULL,
+  PRIMARY KEY (source, target, jid)
+);
+
+CREATE TABLE IF NOT EXISTS salt_job_watermark (
+  source TEXT PRIMARY KEY,
+  jid TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS salt_presence (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  source TEXT NOT NULL,
+  minion TEXT NOT NULL,
+  up INTEGER NOT NULL,
+  time REAL NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS salt_presence_by_minion
+  ON salt_presence (source, minion, time);
+CREATE INDEX IF NOT EXISTS salt_presence_by_time
+  ON salt_presence (source, time);
@@ -4,8 +4,12 @@ Guacamole Monitor
 import json
 from datetime import datetime
 from flask import Blueprint, render_template, jsonify, request
+from range_monitor import responses
 from range_monitor.auth import login_required, admin_required, user_required
-from . import guac_data
+from . import guac_conn
+from . import guac_history
+from . import guac_kill
+from . import guac_servers
 from . import parse
 
 bp = Blueprint('guacamole',
@@ -79,23 +83,84 @@ def active_users():
     return render_template('guac/active_users.html')
 
 
-@bp.route('/<int:conn_identifier>/connection_timeline', methods=('GET', 'POST'))
+@bp.route('/<string:conn_identifier>/connection_timeline', methods=('GET', 'POST'))
 @login_required
 def connection_timeline(conn_identifier):
     """
-    Renders the active connections from the server.
+    Renders the session timeline of a connection.
+
+    Args:
+        conn_identifier (str): The namespaced or plain identifier of the
+            connection.
+        bucket (Optional[int]): Sums the sessions of each user per bucket
+            of this many seconds.
 
     Returns:
-        str: The rendered HTML template for displaying the active connections.
+        str: The rendered HTML template for displaying the timeline.
     """
 
-    history = guac_data.get_connection_history(conn_identifier)
-    dataset = parse.format_history(history)
+    server_id, conn_identifier = guac_servers.split_identifier(conn_identifier)
+    gconn = guac_conn.guac_connect(server_id)
+    if not gconn:
+        return render_template('guac/timeline.html', history=json.dumps({'datasets': []}))
+
+    history = guac_history.get_connection_history(conn_identifier, gconn=gconn)
+    bucket = request.args.get('bucket', type=int)
+    dataset = parse.format_history(history, bucket * 1000 if bucket else None)
 
     return render_template('guac/timeline.html',
                            history=json.dumps(dataset))
 
 
+@bp.route('/api/history/users')
+@login_required
+def history_users():
+    """
+    Retrieve the number of sessions and the total session time per user
+    from the local history store.
+
+    Args:
+        since (Optional[int]): Start of the window in milliseconds.
+        until (Optional[int]): End of the window in milliseconds.
+
+    Returns:
+        list: A list of dictionaries with the keys 'username', 'sessions'
+            and 'total' (milliseconds).
+    """
+
+    totals = guac_history.get_user_totals(
+        request.args.get('since', type=int),
+        request.args.get('until', type=int)
+    )
+
+    return jsonify(totals)
+
+
+@bp.route('/api/history/concurrency')
+@login_required
+def history_concurrency():
+    """
+    Retrieve the number of concurrent sessions over time from the local
+    history store.
+
+    Args:
+        since (Optional[int]): Start of the window in milliseconds.
+        until (Optional[int]): End of the window in milliseconds.
+        connection (Optional[str]): Restrict to one connection identifier.
+
+    Returns:
+        list: A list of [timestamp, concurrent sessions] pairs.
+    """
+
+    series = guac_history.get_concurrency(
+        request.args.get('since', type=int),
+        request.args.get('until', type=int),
+        request.args.get('connection')
+    )
+
+    return jsonify(series)
+
+
 @bp.route('/api/slideshow_data')
 @admin_required
 def slideshow_data():
@@ -109,19 +174,19 @@ def slideshow_data():
         dict: A dictionary containing the slideshow dat with the following keys:
             - token (str): The token for the slideshow.
             - url (str): The URL for the slideshow.
+            - links (list): The token and URL of every server.
 
     Raises:
         None
     """
 
-    active_conns = guac_data.get_active_ids()
-    url = guac_data.get_connection_link(active_conns)
-
-    token = guac_data.get_token()
+    links = guac_servers.get_slideshow()
+    first = links[0] if links else {}
 
     slideshow_data = {
-        'token': token,
-        'url': url
+        'token': first.get('token'),
+        'url': first.get('url'),
+        'links': links
     }
 
     return jsonify(slideshow_data)
@@ -140,18 +205,20 @@ def conns_data():
         dict: A dictionary containing the graph data with the following keys:
             - date (str): The current date and time in the format "HH:MM:SS".
             - conns (int): The number of active connections.
+            - servers (list): The status of every server.
 
     Raises:
         None
     """
 
     date = datetime.now().strftime("%H:%M:%S")
-    active_conns = guac_data.get_active_conns()
+    active = guac_servers.get_active_conns()
 
     graph_data = {
         'date': date,
-        'amount': len(active_conns),
-        'conns': active_conns
+        'amount': len(active['conns']),
+        'conns': active['conns'],
+        'servers': active['servers']
     }
 
     return jsonify(graph_data)
@@ -175,13 +242,14 @@ def users_data():
         None
     """
 
-    users = guac_data.get_active_users()
-
-    return jsonify(users)
+    results = guac_servers.poll_active_users()
 
+    return responses.cached_json(
+        'guacamole.active_users',
+        responses.version_of(results),
+        lambda: guac_servers.get_active_users(results)
+    )
 
-last_conn_tree = {}
-last_connections = {}
 
 @bp.route('/api/topology_data')
 @login_required
@@ -189,29 +257,19 @@ def get_tree_data():
     """
     Retrieves the tree data for the topology API.
 
-    Parameters:
-        timeout (float, optional): The timeout value in seconds for the request. Defaults to None.
-
     Returns:
-        Response: The JSON response containing the extracted connections.
+        Response: The JSON response containing the extracted connections of
+            every server, merged under a ROOT node with namespaced
+            identifiers, and the status of every server.
     """
 
-    global last_conn_tree
-    global last_connections
+    results = guac_servers.poll_topology()
 
-    conn_tree = guac_data.get_tree_data()
-
-    if last_conn_tree != conn_tree:
-        connections, conn_sum = parse.extract_connections(conn_tree)
-        connections = guac_data.resolve_users(connections)
-        last_conn_tree = conn_tree
-        last_connections = connections
-
-    data = {
-        'nodes': last_connections,
-    }
-
-    return jsonify(data)
+    return responses.cached_json(
+        'guacamole.topology',
+        responses.version_of(results),
+        lambda: guac_servers.get_topology(results)
+    )
 
 
 @bp.route('/api/connect-to-node', methods=['POST'])
@@ -228,14 +286,13 @@ def connect_to_node():
     """
 
     data = request.get_json()
-    conn_identifiers = data['identifiers']
-    token = guac_data.get_token()
-
-    url = guac_data.get_connection_link(conn_identifiers)
+    links = guac_servers.get_links(data['identifiers'])
+    first = links[0] if links else {}
 
     connection_data = {
-        'token': token,
-        'url': url
+        'token': first.get('token'),
+        'url': first.get('url'),
+        'links': links
     }
 
     return jsonify(connection_data)
@@ -257,6 +314,58 @@ def kill_node_connections():
     data = request.get_json()
     conn_identifiers = data['identifiers']
 
-    response = guac_data.kill_connection(conn_identifiers)
+    response = guac_servers.kill_connections(conn_identifiers)
 
     return jsonify(response)
+
+
+@bp.route('/api/kill-sessions', methods=['POST'])
+@admin_required
+def kill_sessions():
+    """
+    Kills every session of the given connection groups, connections,
+    users and organizations in the background.
+
+    Args:
+        groups (Optional[list]): Connection group identifiers.
+        identifiers (Optional[list]): Connection identifiers.
+        users (Optional[list]): Usernames.
+        organizations (Optional[list]): User organizations.
+
+    Returns:
+        A JSON response with the progress of the kill job, polled at
+        /api/kill-sessions/<job_id>.
+    """
+
+    data = request.get_json()
+    job = guac_kill.start_kill(
+        groups=data.get('groups', []),
+        connections=data.get('identifiers', []),
+        users=data.get('users', []),
+        organizations=data.get('organizations', [])
+    )
+    if job is None:
+        return jsonify({'error': 'No enabled Guacamole data source'}), 404
+
+    return jsonify(job.to_dict()), 202
+
+
+@bp.route('/api/kill-sessions/<string:job_id>')
+@admin_required
+def kill_sessions_progress(job_id):
+    """
+    Returns the progress of a kill job.
+
+    Args:
+        job_id (str): The id returned when the job was started.
+
+    Returns:
+        A JSON response with the state, total, killed and failed sessions
+        of the job.
+    """
+
+    job = guac_kill.get_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown kill job'}), 404
+
+    return jsonify(job.to_dict())
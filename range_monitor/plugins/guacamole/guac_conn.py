@@ -1,58 +1,94 @@
 """
-Connects to Guacamole using the configuration specified in the 'config.yaml' file.
+Connects to the Guacamole servers enabled in the 'guacamole' table.
 """
 
 from range_monitor.db import get_db
 from guacamole import session
+import threading
 import time
 
 gconn_cache = {
-    'gconn': None,
-    'guac_config': None,
-    'last_connected': None
+    'sessions': {},
+    'lock': threading.Lock()
 }
 
 
-def guac_connect():
+def list_servers() -> list:
     """
-    Connects to Guacamole using the configuration 
-    specified in the 'config.yaml' file.
+    Lists the enabled Guacamole servers.
 
     Returns:
-        gconn (guac_connection): The connection object to Guacamole.
+        list: The configuration of every enabled server, ordered by id.
     """
 
     db = get_db()
-    guac_entry = db.execute(
+    guac_entries = db.execute(
         'SELECT p.*'
         ' FROM guacamole p'
         ' WHERE p.enabled = 1'
-    ).fetchone()
+        ' ORDER BY p.id'
+    ).fetchall()
+
+    return [
+        {
+            key: guac_entry[key]
+            for key in guac_entry.keys()
+        }
+        for guac_entry in guac_entries
+    ]
 
-    if not guac_entry:
-        return None
 
-    guac_config = {
-        key: guac_entry[key]
-        for key in guac_entry.keys()
-    }
+def connect(guac_config: dict):
+    """
+    Returns the session of a Guacamole server, reusing it for 5 minutes
+    as long as the server's configuration is unchanged.
+
+    Parameters:
+        guac_config (dict): The configuration of the server.
 
-    # Check if guac_config has changed
-    if gconn_cache['guac_config'] != guac_config:
-        gconn_cache['gconn'] = None
+    Returns:
+        gconn (guac_connection): The connection object to Guacamole.
+    """
 
-    # more than 5 minutes since last connection
-    if gconn_cache['last_connected'] is not None and time.time() - gconn_cache['last_connected'] > 300:
-        gconn_cache['gconn'] = None
+    with gconn_cache['lock']:
+        cached = gconn_cache['sessions'].get(guac_config['id'])
 
-    if gconn_cache['gconn'] is None:
+    # more than 5 minutes since last connection or configuration changed
+    if (
+        cached is None
+        or cached['guac_config'] != guac_config
+        or time.time() - cached['last_connected'] > 300
+    ):
         gconn = session(guac_config['endpoint'],
                         guac_config['datasource'],
                         guac_config['username'],
                         guac_config['password']
                         )
-        gconn_cache['gconn'] = gconn
-        gconn_cache['guac_config'] = guac_config
-        gconn_cache['last_connected'] = time.time()
+        cached = {
+            'gconn': gconn,
+            'guac_config': guac_config,
+            'last_connected': time.time()
+        }
+        with gconn_cache['lock']:
+            gconn_cache['sessions'][guac_config['id']] = cached
+
+    return cached['gconn']
+
+
+def guac_connect(server_id: int = None):
+    """
+    Connects to an enabled Guacamole server.
+
+    Parameters:
+        server_id (int, optional): The id of the server, defaults to the
+            first enabled server.
+
+    Returns:
+        gconn (guac_connection): The connection object to Guacamole, None
+            if the server is not enabled.
+    """
 
-    return gconn_cache['gconn']
+    for guac_config in list_servers():
+        if server_id is None or guac_config['id'] == int(server_id):
+            return connect(guac_config)
+    return None
@@ -3,42 +3,164 @@ Gets data from Guacamole
 """
 
 from base64 import b64encode
+from functools import lru_cache
+from flask import current_app
 from . import guac_conn
+from . import guac_users
+from . import parse
 from guacamole import session 
+from range_monitor import profiling
+from range_monitor import snapshots
 
+links_cache = {
+    'indexes': {}
+}
 
-def get_token():
+
+class GuacAPIError(Exception):
+    """
+    Raised when Guacamole returns an unexpected response.
+    """
+
+
+@profiling.traced
+def get_token(gconn: session = None):
     """
-    
+    Returns the authentication token of a Guacamole session.
+
+    Parameters:
+        gconn (session, optional): The Guacamole session, defaults to the
+            first enabled server.
     """
-    gconn: session = guac_conn.guac_connect()
+    gconn = gconn or guac_conn.guac_connect()
     return gconn.token
 
 
-def get_active_ids():
+def load_active_connections(gconn) -> dict:
     """
-    Retrieves a set of active connections identifiers.
+    Loads the active connections of a Guacamole server into the snapshot
+    store.
+
+    Parameters:
+        gconn (session): The Guacamole session.
 
     Returns:
-        set: A set of active connection identifiers.
+        dict: The active connections by uuid, as Session records.
+    """
+    active = gconn.list_active_connections()
+    if not isinstance(active, dict):
+        raise GuacAPIError(active)
+    return {
+        uuid: parse.Session.from_dict(instance)
+        for uuid, instance in active.items()
+    }
+
+
+def get_active_snapshot(gconn) -> snapshots.Snapshot:
     """
+    Returns the snapshot of the active connections, reloaded after
+    GUAC_ACTIVE_TTL seconds.
 
-    gconn = guac_conn.guac_connect()
+    Parameters:
+        gconn (session): The Guacamole session.
 
-    active_instances = gconn.list_active_connections().values()
-    
-    active_ids = set(
-        active_instance['connectionIdentifier']
-        for active_instance in active_instances
+    Returns:
+        Snapshot: The active connections by uuid.
+    """
+    return snapshots.get(
+        'guac.active_connections',
+        gconn.host,
+        lambda source: load_active_connections(gconn),
+        current_app.config.get('GUAC_ACTIVE_TTL', 2)
     )
 
-    return active_ids
+
+def invalidate_active_connections(gconn):
+    """
+    Drops the active connections snapshot, e.g. after killing sessions.
+
+    Parameters:
+        gconn (session): The Guacamole session.
+    """
+    snapshots.invalidate('guac.active_connections', gconn.host)
 
 
-def get_active_conns():
+def get_oldest_sessions(gconn) -> dict:
+    """
+    Returns the oldest active session of every connection, computed once
+    per version of the active connections snapshot.
+
+    Parameters:
+        gconn (session): The Guacamole session.
+
+    Returns:
+        dict: The uuid of the oldest session by connection identifier.
+    """
+    snapshot = get_active_snapshot(gconn)
+    cached = links_cache['indexes'].get(gconn.host)
+    if cached is not None and cached[0] == snapshot.version:
+        return cached[1]
+
+    oldest = {}
+    for uuid, instance in snapshot.value.items():
+        identifier = instance['connectionIdentifier']
+        current = oldest.get(identifier)
+        if current is None or instance['startDate'] < current[1]:
+            oldest[identifier] = (uuid, instance['startDate'])
+    index = {
+        identifier: uuid
+        for identifier, (uuid, _) in oldest.items()
+    }
+    links_cache['indexes'][gconn.host] = (snapshot.version, index)
+    return index
+
+
+@lru_cache(maxsize=4096)
+def encode_client_id(identifier: str, kind: str, data_source: str) -> str:
+    """
+    Returns the id of a Guacamole client as used in '/#/client' links.
+
+    Parameters:
+        identifier (str): The uuid of an active connection ('a') or the
+            identifier of a connection ('c').
+        kind (str): 'a' or 'c'.
+        data_source (str): The Guacamole data source.
+
+    Returns:
+        str: The base64 client id without padding.
+    """
+    return b64encode(
+        f"{identifier}\u0000{kind}\u0000{data_source}".encode('utf-8', 'strict')
+    ).decode().removesuffix('=').removesuffix('=')
+
+
+@profiling.traced
+def get_active_ids(gconn: session = None):
+    """
+    Retrieves a set of active connections identifiers.
+
+    Parameters:
+        gconn (session, optional): The Guacamole session, defaults to the
+            first enabled server.
+
+    Returns:
+        set: A set of active connection identifiers.
+    """
+
+    gconn = gconn or guac_conn.guac_connect()
+
+    return set(get_oldest_sessions(gconn))
+
+
+@profiling.traced
+def get_active_conns(gconn: session = None):
     """
     Retrieves a list of active connections.
 
+    Parameters:
+        gconn (session, optional): The Guacamole session, defaults to the
+            first enabled server.
+
     Returns:
         dict: A dictionary containing active connections grouped by column name.
             Each key represents a column name and its corresponding value is a
@@ -46,7 +168,7 @@ def get_active_conns():
             username associated with that connection.
     """
 
-    gconn = guac_conn.guac_connect()
+    gconn = gconn or guac_conn.guac_connect()
 
     connections = gconn.list_connections()
     connection_ids = connections.keys()
@@ -58,52 +180,45 @@ def get_active_conns():
             ]['name'],
             'username': active_instance['username'],
         }
-        for active_instance in gconn.list_active_connections().values()
+        for active_instance in get_active_snapshot(gconn).value.values()
         if active_instance['connectionIdentifier'] in connection_ids
     ]
 
     return active_data
 
 
-def get_active_users():
+@profiling.traced
+def get_active_users(gconn: session = None):
     """
     Get the active users from the guacamole connection.
 
+    Parameters:
+        gconn (session, optional): The Guacamole session, defaults to the
+            first enabled server.
+
     Returns:
         active_users (dict): A dictionary containing the active users.
-            Grouped by column user organization.
+            Grouped by column user organization, each user once.
     """
 
-    gconn = guac_conn.guac_connect()
+    return guac_users.get_active_users(gconn)
 
-    active_user_data = [
-        gconn.detail_user(active_instance['username'])
-        for active_instance in gconn.list_active_connections().values()
-    ]
 
-    active_users = {}
-    for user in active_user_data:
-        user_name = user.get('username')
-        column_name = user['attributes'].get(
-            'guac-organization', 'No Organization'
-        )
-        active_users.setdefault(
-            column_name, []
-        ).append(user_name)
-
-    return active_users
-
-
-def get_tree_data():
+@profiling.traced
+def get_tree_data(gconn: session = None):
     """
     Get the tree data from the guacamole connection.
 
+    Parameters:
+        gconn (session, optional): The Guacamole session, defaults to the
+            first enabled server.
+
     Returns:
         tree_data (dict): A dictionary containing the tree data.
             Grouped by column user organization.
     """
 
-    gconn = guac_conn.guac_connect()
+    gconn = gconn or guac_conn.guac_connect()
 
     if not gconn:
         return None
@@ -121,19 +236,22 @@ def get_tree_data():
     return tree_data
 
 
-def resolve_users(connections: list):
+@profiling.traced
+def resolve_users(connections: list, gconn: session = None):
     """
     Resolve the users associated with the given connections.
 
     Parameters:
         connections (list): A list of connection dictionaries.
+        gconn (session, optional): The Guacamole session, defaults to the
+            first enabled server.
 
     Returns:
         connections (list): The updated list of connection dictionaries
             with the 'users' field populated.
     """
 
-    gconn = guac_conn.guac_connect()
+    gconn = gconn or guac_conn.guac_connect()
 
     if not gconn:
         return None
@@ -143,7 +261,7 @@ def resolve_users(connections: list):
             'connectionIdentifier': active_instance['connectionIdentifier'],
             'username': active_instance['username'],
         }
-        for active_instance in gconn.list_active_connections().values()
+        for active_instance in get_active_snapshot(gconn).value.values()
     ]
 
     for conn in connections:
@@ -159,18 +277,21 @@ def resolve_users(connections: list):
     return connections
 
 
-def kill_connection(conn_identifiers: list):
+@profiling.traced
+def kill_connection(conn_identifiers: list, gconn: session = None):
     """
     Kill connections.
 
     Parameters:
         conn_identifiers (list): The identifiers of the connections to kill.
+        gconn (session, optional): The Guacamole session, defaults to the
+            first enabled server.
     """
 
     if not conn_identifiers:
         return None
 
-    gconn = guac_conn.guac_connect()
+    gconn = gconn or guac_conn.guac_connect()
 
     active_instances = gconn.list_active_connections()
 
@@ -181,61 +302,56 @@ def kill_connection(conn_identifiers: list):
     ]
 
     gconn.kill_active_connections(active_uuids)
+    invalidate_active_connections(gconn)
 
     return active_uuids
 
 
-def get_connection_link(conn_identifiers: list) -> str:
+@profiling.traced
+def get_connection_link(conn_identifiers: list, gconn: session = None) -> str:
     """
-    Returns a connection link.
+    Returns a connection link, joining the oldest active session of every
+    connection, or the connection itself when nobody is connected.
 
     Parameters:
-        identifiers (list): The identifiers of the connections to kill.
+        conn_identifiers (list): The identifiers of the connections.
+        gconn (session, optional): The Guacamole session, defaults to the
+            first enabled server.
     """
 
-    gconn = guac_conn.guac_connect()
+    gconn = gconn or guac_conn.guac_connect()
 
     if not conn_identifiers:
         return gconn.host
 
-    active_instances = gconn.list_active_connections()
+    oldest_sessions = get_oldest_sessions(gconn)
     host_url = f"{gconn.host}/#/client"
     url_data = []
 
     for conn_identifier in conn_identifiers:
-        oldest_instance = {}
-        for instance in active_instances.values():
-            is_older_instance = instance['connectionIdentifier'] == conn_identifier and (
-                not oldest_instance
-                or instance['startDate'] < oldest_instance.get('startDate', 0)
-            )
-            if is_older_instance:
-                oldest_instance = instance
-
-        if oldest_instance:
-            uuid = oldest_instance['identifier']
-            url_data.append(b64encode(
-                    f"{uuid}\u0000a\u0000{gconn.data_source}".encode('utf-8', 'strict')
-            ).decode().removesuffix('=').removesuffix('='))
+        uuid = oldest_sessions.get(conn_identifier)
+        if uuid is not None:
+            url_data.append(encode_client_id(uuid, 'a', gconn.data_source))
         else:
-            url_data.append(b64encode(
-                    f"{conn_identifier}\u0000c\u0000{gconn.data_source}".encode('utf-8', 'strict')
-            ).decode().removesuffix('=').removesuffix('='))
+            url_data.append(encode_client_id(conn_identifier, 'c', gconn.data_source))
 
     url_str = '.'.join(url_data)
 
     return f"{host_url}/{url_str}"
 
 
-def get_connection_history(conn_identifier: str):
+@profiling.traced
+def get_connection_history(conn_identifier: str, gconn: session = None):
     """
-    Returns a connection link.
+    Returns the history of a connection as returned by Guacamole.
 
     Parameters:
-        identifiers (list): The identifiers of the connections to kill.
+        conn_identifier (str): The identifier of the connection.
+        gconn (session, optional): The Guacamole session, defaults to the
+            first enabled server.
     """
 
-    gconn = guac_conn.guac_connect()
+    gconn = gconn or guac_conn.guac_connect()
 
     if not conn_identifier:
         return {}
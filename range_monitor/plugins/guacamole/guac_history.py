@@ -0,0 +1,422 @@
+"""
+Local store of Guacamole connection history.
+
+History is ingested incrementally from Guacamole into the 'guac_history'
+table, watermarked by startDate and kept per server, and the timeline,
+per-user totals and concurrency queries are answered from SQLite, the
+latter two across every enabled server. Sessions stored as open are
+checked against the active connections on every ingest, so a session that
+dropped out of the history listing is closed instead of counting as active
+forever, and sessions that ended more than GUAC_HISTORY_RETENTION seconds
+ago are deleted.
+"""
+
+import time
+from flask import current_app
+from range_monitor.db import get_db
+from range_monitor import profiling
+from . import guac_conn
+from . import guac_servers
+
+history_cache = {
+    'last_ingest': {},
+    'backfilled': set()
+}
+
+
+def _now_ms() -> int:
+    return round(time.time() * 1000)
+
+
+def retention_cutoff() -> int:
+    """
+    Returns:
+        int: The time (ms) before which ended sessions are not kept.
+    """
+    retention = current_app.config.get('GUAC_HISTORY_RETENTION', 90 * 86400)
+    return _now_ms() - retention * 1000
+
+
+def get_watermark(source: str):
+    """
+    Returns the startDate from which history must be fetched again.
+
+    Sessions that were still open at the last ingest are re-fetched so
+    their endDate gets filled in, otherwise only newer sessions are kept.
+
+    Parameters:
+        source (str): The Guacamole endpoint the history belongs to.
+
+    Returns:
+        int: The watermark in milliseconds, None if nothing is stored yet.
+    """
+    db = get_db()
+    row = db.execute(
+        'SELECT MIN(start_date) AS open_start FROM guac_history'
+        ' WHERE source = ? AND end_date IS NULL',
+        (source,)
+    ).fetchone()
+    if row['open_start'] is not None:
+        return row['open_start']
+
+    row = db.execute(
+        'SELECT MAX(start_date) AS last_start FROM guac_history'
+        ' WHERE source = ?',
+        (source,)
+    ).fetchone()
+    return row['last_start']
+
+
+def store_history(source: str, history: list, watermark: int = None,
+                  conn_identifier: str = None) -> int:
+    """
+    Upserts history entries at or after the watermark.
+
+    Parameters:
+        source (str): The Guacamole endpoint the history belongs to.
+        history (list): History entries as returned by Guacamole.
+        watermark (int, optional): Entries starting before it are skipped.
+        conn_identifier (str, optional): The connection the entries belong
+            to, for per-connection history without 'connectionIdentifier'.
+
+    Returns:
+        int: The number of entries written.
+    """
+    if not isinstance(history, list):
+        return 0
+
+    cutoff = retention_cutoff()
+    rows = [
+        (
+            source,
+            str(entry.get('connectionIdentifier') or conn_identifier),
+            entry.get('connectionName'),
+            entry['username'],
+            entry.get('remoteHost'),
+            entry['startDate'],
+            entry.get('endDate'),
+        )
+        for entry in history
+        if entry.get('startDate') is not None
+        and entry.get('username') is not None
+        and (watermark is None or entry['startDate'] >= watermark)
+        and (entry.get('endDate') is None or entry['endDate'] >= cutoff)
+    ]
+    if not rows:
+        return 0
+
+    db = get_db()
+    db.executemany(
+        'INSERT INTO guac_history (source, connection_identifier,'
+        ' connection_name, username, remote_host, start_date, end_date)'
+        ' VALUES (?, ?, ?, ?, ?, ?, ?)'
+        ' ON CONFLICT (source, connection_identifier, username, start_date)'
+        ' DO UPDATE SET end_date = excluded.end_date,'
+        ' connection_name = excluded.connection_name',
+        rows
+    )
+    db.commit()
+    return len(rows)
+
+
+@profiling.traced
+def ingest(force: bool = False, gconn=None) -> str:
+    """
+    Fetches the connection history newer than the watermark from
+    Guacamole, at most once every GUAC_HISTORY_TTL seconds.
+
+    Parameters:
+        force (bool): Ignore GUAC_HISTORY_TTL.
+        gconn (session, optional): The Guacamole session, defaults to the
+            first enabled server.
+
+    Returns:
+        str: The source the history was ingested for, None without an
+            enabled Guacamole data source.
+    """
+    gconn = gconn or guac_conn.guac_connect()
+    if not gconn:
+        return None
+
+    source = gconn.host
+    ttl = current_app.config.get('GUAC_HISTORY_TTL', 60)
+    last_ingest = history_cache['last_ingest'].get(source)
+    if not force and last_ingest and time.time() - last_ingest < ttl:
+        return source
+
+    watermark = get_watermark(source)
+    store_history(source, gconn.list_history_connections(), watermark)
+    close_ended(source, gconn.list_active_connections())
+    prune_history(source)
+    history_cache['last_ingest'][source] = time.time()
+    return source
+
+
+def ingest_servers(force: bool = False) -> dict:
+    """
+    Ingests the history of every enabled server, see ingest. A server that
+    cannot be reached is served from the history already stored.
+
+    Parameters:
+        force (bool): Ignore GUAC_HISTORY_TTL.
+
+    Returns:
+        dict: The source of every server by server id.
+    """
+    sources = {}
+    for guac_config in guac_conn.list_servers():
+        try:
+            sources[guac_config['id']] = ingest(force, guac_conn.connect(guac_config))
+        except Exception as e:
+            print(f"Unable to ingest the history of {guac_config['endpoint']}:", e)
+            sources[guac_config['id']] = guac_config['endpoint']
+    return sources
+
+
+def close_ended(source: str, active: dict) -> int:
+    """
+    Closes the sessions stored as open that are not active anymore.
+
+    A session that drops out of the history listing before its endDate
+    was stored would pin the watermark and count as active forever. The
+    active connections cover every open session, so an open session
+    missing from them has ended and is closed at the current time.
+
+    Parameters:
+        source (str): The Guacamole endpoint the history belongs to.
+        active (dict): The active connections by uuid, as returned by
+            Guacamole.
+
+    Returns:
+        int: The number of closed sessions.
+    """
+    if not isinstance(active, dict):
+        return 0
+
+    active_starts = {}
+    for instance in active.values():
+        key = (str(instance.get('connectionIdentifier')), instance.get('username'))
+        active_starts.setdefault(key, []).append(instance.get('startDate') or 0)
+
+    db = get_db()
+    rows = db.execute(
+        'SELECT id, connection_identifier, username, start_date'
+        ' FROM guac_history WHERE source = ? AND end_date IS NULL',
+        (source,)
+    ).fetchall()
+    now = _now_ms()
+    ended = [
+        (now, row['id'])
+        for row in rows
+        # both dates come from the same record, allow for rounding
+        if not any(
+            abs(start - row['start_date']) <= 1000
+            for start in active_starts.get(
+                (row['connection_identifier'], row['username']), ()
+            )
+        )
+    ]
+    if ended:
+        db.executemany('UPDATE guac_history SET end_date = ? WHERE id = ?', ended)
+        db.commit()
+    return len(ended)
+
+
+def prune_history(source: str) -> int:
+    """
+    Deletes the sessions that ended more than GUAC_HISTORY_RETENTION
+    seconds ago.
+
+    Parameters:
+        source (str): The Guacamole endpoint the history belongs to.
+
+    Returns:
+        int: The number of deleted sessions.
+    """
+    db = get_db()
+    deleted = db.execute(
+        'DELETE FROM guac_history WHERE source = ? AND end_date < ?',
+        (source, retention_cutoff())
+    ).rowcount
+    db.commit()
+    return deleted
+
+
+@profiling.traced
+def backfill_connection(source: str, conn_identifier: str, gconn=None):
+    """
+    Fetches the full history of a connection once per process, since the
+    global history listing only covers the most recent sessions.
+
+    Parameters:
+        source (str): The Guacamole endpoint the history belongs to.
+        conn_identifier (str): The identifier of the connection.
+        gconn (session, optional): The Guacamole session, defaults to the
+            first enabled server.
+    """
+    key = (source, str(conn_identifier))
+    if key in history_cache['backfilled']:
+        return
+
+    gconn = gconn or guac_conn.guac_connect()
+    store_history(
+        source,
+        gconn.detail_connection(conn_identifier, 'history'),
+        conn_identifier=conn_identifier
+    )
+    history_cache['backfilled'].add(key)
+
+
+def _window(since: int = None, until: int = None) -> tuple:
+    """
+    Returns the SQL condition and parameters selecting the sessions that
+    overlap the [since, until] window.
+    """
+    clauses = []
+    params = []
+    if since is not None:
+        clauses.append(' AND (end_date IS NULL OR end_date >= ?)')
+        params.append(since)
+    if until is not None:
+        clauses.append(' AND start_date <= ?')
+        params.append(until)
+    return ''.join(clauses), params
+
+
+@profiling.traced
+def get_connection_history(conn_identifier: str, since: int = None,
+                           until: int = None, gconn=None) -> list:
+    """
+    Returns the history of a connection in the Guacamole format, oldest
+    session first.
+
+    Parameters:
+        conn_identifier (str): The identifier of the connection.
+        since (int, optional): Only sessions still open at this time (ms).
+        until (int, optional): Only sessions started before this time (ms).
+        gconn (session, optional): The Guacamole session, defaults to the
+            first enabled server.
+
+    Returns:
+        list: The history entries.
+    """
+    source = ingest(gconn=gconn)
+    if source is None:
+        return []
+    backfill_connection(source, conn_identifier, gconn)
+
+    condition, params = _window(since, until)
+    rows = get_db().execute(
+        'SELECT connection_identifier, connection_name, username,'
+        ' remote_host, start_date, end_date'
+        ' FROM guac_history'
+        ' WHERE source = ? AND connection_identifier = ?' + condition +
+        ' ORDER BY start_date',
+        [source, str(conn_identifier)] + params
+    ).fetchall()
+
+    return [
+        {
+            'connectionIdentifier': row['connection_identifier'],
+            'connectionName': row['connection_name'],
+            'username': row['username'],
+            'remoteHost': row['remote_host'],
+            'startDate': row['start_date'],
+            'endDate': row['end_date'],
+            'active': row['end_date'] is None,
+        }
+        for row in rows
+    ]
+
+
+@profiling.traced
+def get_user_totals(since: int = None, until: int = None) -> list:
+    """
+    Returns the number of sessions and the total session time of every
+    user on every enabled server, open sessions counting up to now.
+
+    Parameters:
+        since (int, optional): Only sessions still open at this time (ms).
+        until (int, optional): Only sessions started before this time (ms).
+
+    Returns:
+        list: Dictionaries with 'username', 'sessions' and 'total', sorted
+            by total session time.
+    """
+    sources = list(ingest_servers().values())
+    if not sources:
+        return []
+
+    condition, params = _window(since, until)
+    rows = get_db().execute(
+        'SELECT username, COUNT(*) AS sessions,'
+        ' SUM(COALESCE(end_date, ?) - start_date) AS total'
+        ' FROM guac_history'
+        f' WHERE source IN ({", ".join("?" * len(sources))})' + condition +
+        ' GROUP BY username ORDER BY total DESC',
+        [_now_ms()] + sources + params
+    ).fetchall()
+    return [dict(row) for row in rows]
+
+
+@profiling.traced
+def get_concurrency(since: int = None, until: int = None,
+                    conn_identifier: str = None) -> list:
+    """
+    Returns the number of concurrent sessions over time as a step series.
+
+    Parameters:
+        since (int, optional): Start of the window (ms).
+        until (int, optional): End of the window (ms).
+        conn_identifier (str, optional): Restrict to one connection, by
+            namespaced or plain identifier.
+
+    Returns:
+        list: [timestamp, concurrent sessions] pairs, one per change,
+            across every enabled server.
+    """
+    sources = ingest_servers()
+    if not sources:
+        return []
+
+    condition, params = _window(since, until)
+    if conn_identifier is not None:
+        grouped = guac_servers.group_by_server([conn_identifier])
+        server_id, identifiers = next(iter(grouped.items()))
+        # plain identifiers belong to the first enabled server
+        server_id = next(iter(sources)) if server_id is None else server_id
+        if server_id not in sources:
+            return []
+        sources = {server_id: sources[server_id]}
+        condition += ' AND connection_identifier = ?'
+        params.append(identifiers[0])
+    sources = list(sources.values())
+    rows = get_db().execute(
+        'SELECT start_date, end_date FROM guac_history'
+        f' WHERE source IN ({", ".join("?" * len(sources))})' + condition,
+        sources + params
+    ).fetchall()
+
+    now = _now_ms()
+    events = []
+    for row in rows:
+        events.append((row['start_date'], 1))
+        events.append((row['end_date'] or now, -1))
+    # end events sort before start events at the same instant
+    events.sort(key=lambda event: (event[0], event[1]))
+
+    series = []
+    concurrent = 0
+    for timestamp, change in events:
+        concurrent += change
+        if series and series[-1][0] == timestamp:
+            series[-1][1] = concurrent
+        else:
+            series.append([timestamp, concurrent])
+
+    if since is not None:
+        before = [point for point in series if point[0] < since]
+        series = [point for point in series if point[0] >= since]
+        if before:
+            series.insert(0, [since, before[-1][1]])
+    return series
@@ -0,0 +1,339 @@
+"""
+Bulk termination of Guacamole sessions.
+
+Targets are given as connection groups, connections, users or
+organizations and resolved to active sessions in one pass over the active
+connections of every server, connection groups through an index of the
+connections below every group built once per version of the connection
+tree snapshot. Namespaced groups and connections only go to their own
+server, users and organizations to every server. Every server is
+resolved on the thread pool of the kill job, a server that fails only
+being reported in its errors, and the sessions are killed in chunks of
+GUAC_KILL_CHUNK on GUAC_KILL_WORKERS threads. The progress of each kill
+job can be polled.
+"""
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from flask import current_app
+from range_monitor import profiling
+from range_monitor import snapshots
+from . import guac_conn
+from . import guac_data
+from . import guac_servers
+from . import guac_users
+
+kill_cache = {
+    'indexes': {},
+    'jobs': OrderedDict()
+}
+
+MAX_JOBS = 100
+
+
+def load_tree(gconn) -> dict:
+    """
+    Loads the connection tree of a Guacamole server into the snapshot
+    store.
+
+    Parameters:
+        gconn (session): The Guacamole session.
+
+    Returns:
+        dict: The connection group tree from the ROOT group.
+    """
+    tree = gconn.list_connection_group_connections()
+    if not isinstance(tree, dict):
+        raise guac_data.GuacAPIError(tree)
+    return tree
+
+
+def index_groups(tree: dict) -> dict:
+    """
+    Maps every connection group to the connections below it, at any depth.
+
+    Parameters:
+        tree (dict): A connection group with its children.
+
+    Returns:
+        dict: The set of connection identifiers of every group identifier.
+    """
+    index = {}
+
+    def walk(group):
+        connections = {
+            str(conn['identifier'])
+            for conn in group.get('childConnections') or []
+        }
+        for child in group.get('childConnectionGroups') or []:
+            connections |= walk(child)
+        index[str(group.get('identifier', 'ROOT'))] = connections
+        return connections
+
+    walk(tree)
+    return index
+
+
+def get_group_index(gconn) -> dict:
+    """
+    Returns the group index of the connection tree, rebuilt only when the
+    tree snapshot changes.
+
+    Parameters:
+        gconn (session): The Guacamole session.
+
+    Returns:
+        dict: The set of connection identifiers of every group identifier.
+    """
+    snapshot = snapshots.get(
+        'guac.connection_tree',
+        gconn.host,
+        lambda source: load_tree(gconn),
+        current_app.config.get('GUAC_TREE_TTL', 60)
+    )
+    cached = kill_cache['indexes'].get(gconn.host)
+    if cached is not None and cached[0] == snapshot.version:
+        return cached[1]
+    index = index_groups(snapshot.value)
+    kill_cache['indexes'][gconn.host] = (snapshot.version, index)
+    return index
+
+
+@profiling.traced
+def resolve_sessions(gconn, groups: list = (), connections: list = (),
+                     users: list = (), organizations: list = ()) -> list:
+    """
+    Returns the active sessions matching any of the targets.
+
+    Parameters:
+        gconn (session): The Guacamole session.
+        groups (list): Connection group identifiers.
+        connections (list): Connection identifiers.
+        users (list): Usernames.
+        organizations (list): User organizations.
+
+    Returns:
+        list: The uuids of the matching active sessions.
+    """
+    conn_ids = {str(identifier) for identifier in connections}
+    if groups:
+        index = get_group_index(gconn)
+        for group in groups:
+            conn_ids |= index.get(str(group), set())
+    usernames = set(users)
+
+    active = gconn.list_active_connections()
+    if not isinstance(active, dict):
+        raise guac_data.GuacAPIError(active)
+
+    if organizations:
+        organizations = set(organizations)
+        directory = guac_users.get_directory(gconn.host)
+        entries = directory.lookup(gconn, (
+            instance['username'] for instance in active.values()
+            if instance.get('username')
+        ))
+        usernames |= {
+            username for username, entry in entries.items()
+            if entry['organization'] in organizations
+        }
+
+    return [
+        session_uuid
+        for session_uuid, instance in active.items()
+        if instance['connectionIdentifier'] in conn_ids
+        or instance.get('username') in usernames
+    ]
+
+
+class KillJob:
+    """
+    Resolves the sessions of every server and kills them in chunks on a
+    thread pool, keeping track of progress.
+
+    Parameters:
+        targets (list): (guac_config, target) pairs, the configuration of
+            every Guacamole server and the keyword arguments of
+            resolve_sessions for it.
+        chunk_size (int): The number of sessions per kill request.
+        workers (int): The number of concurrent requests.
+    """
+
+    def __init__(self, targets: list, chunk_size: int, workers: int):
+        self.id = uuid.uuid4().hex
+        self.lock = threading.Lock()
+        self.targets = targets
+        self.chunk_size = chunk_size
+        self.servers = []
+        self.workers = workers
+        self.resolving = len(targets)
+        self.total = 0
+        self.killed = 0
+        self.failed = 0
+        self.errors = []
+        self.started = time.time()
+        self.finished = None
+
+    def resolve(self, app, guac_config: dict, target: dict) -> list:
+        """
+        Connects to one server and resolves its sessions, recording a
+        failure of the server in the errors instead of raising it.
+
+        Returns:
+            list: (session, uuids) pairs, the chunks to kill.
+        """
+        try:
+            with app.app_context():
+                gconn = guac_conn.connect(guac_config)
+                sessions = resolve_sessions(gconn, **target)
+        except Exception as e:
+            server = guac_config.get('endpoint', guac_config['id'])
+            with self.lock:
+                self.resolving -= 1
+                self.errors.append(f'{server}: {e}')
+            return []
+        with self.lock:
+            self.resolving -= 1
+            self.servers.append(gconn)
+            self.total += len(sessions)
+        return [
+            (gconn, sessions[start:start + self.chunk_size])
+            for start in range(0, len(sessions), self.chunk_size)
+        ]
+
+    def kill_chunk(self, gconn, chunk: list):
+        """
+        Kills one chunk of sessions and records the outcome.
+        """
+        try:
+            response = gconn.kill_active_connections(chunk)
+            error = response.get('message') if isinstance(response, dict) else None
+        except Exception as e:
+            error = str(e)
+        with self.lock:
+            if error:
+                self.failed += len(chunk)
+                self.errors.append(error)
+            else:
+                self.killed += len(chunk)
+
+    def run(self, app):
+        """
+        Resolves every server and kills its chunks as soon as they are
+        known, then waits for them to complete.
+
+        Parameters:
+            app (object): The Flask app, for the context of the lookups.
+        """
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            resolving = [
+                executor.submit(self.resolve, app, guac_config, target)
+                for guac_config, target in self.targets
+            ]
+            for future in as_completed(resolving):
+                for gconn, chunk in future.result():
+                    executor.submit(self.kill_chunk, gconn, chunk)
+        self.finished = time.time()
+
+    def to_dict(self) -> dict:
+        """
+        Returns:
+            dict: The progress of the job.
+        """
+        with self.lock:
+            done = self.killed + self.failed
+            if self.total:
+                progress = round(100 * done / self.total, 1)
+            else:
+                progress = 0.0 if self.resolving else 100.0
+            return {
+                'id': self.id,
+                'state': 'done' if self.finished is not None else 'running',
+                'resolving': self.resolving,
+                'total': self.total,
+                'killed': self.killed,
+                'failed': self.failed,
+                'progress': progress,
+                'errors': list(self.errors),
+                'started': self.started,
+                'finished': self.finished,
+            }
+
+
+@profiling.traced
+def start_kill(groups: list = (), connections: list = (), users: list = (),
+               organizations: list = (), wait: bool = False) -> KillJob:
+    """
+    Starts a job resolving the targets on every server and killing their
+    sessions in the background. A server that cannot be reached or
+    queried is reported in the errors of the job.
+
+    Parameters:
+        groups (list): Namespaced or plain connection group identifiers.
+        connections (list): Namespaced or plain connection identifiers.
+        users (list): Usernames.
+        organizations (list): User organizations.
+        wait (bool): Kill the sessions before returning.
+
+    Returns:
+        KillJob: The started job, None without an enabled Guacamole data
+            source.
+    """
+    servers = guac_conn.list_servers()
+    if not servers:
+        return None
+
+    owned = {}
+    for kind, identifiers in (('groups', groups), ('connections', connections)):
+        for server_id, server_identifiers in guac_servers.group_by_server(identifiers).items():
+            server_id = servers[0]['id'] if server_id is None else server_id
+            owned.setdefault(server_id, {'groups': [], 'connections': []})[kind] += server_identifiers
+
+    targets = []
+    for guac_config in servers:
+        target = owned.get(guac_config['id'], {'groups': [], 'connections': []})
+        if not (target['groups'] or target['connections'] or users or organizations):
+            continue
+        targets.append((guac_config, dict(
+            target, users=users, organizations=organizations
+        )))
+
+    job = KillJob(
+        targets,
+        current_app.config.get('GUAC_KILL_CHUNK', 100),
+        current_app.config.get('GUAC_KILL_WORKERS', 4)
+    )
+    jobs = kill_cache['jobs']
+    jobs[job.id] = job
+    while len(jobs) > MAX_JOBS:
+        jobs.popitem(last=False)
+
+    app = current_app._get_current_object()
+
+    def run():
+        job.run(app)
+        with app.app_context():
+            for gconn in job.servers:
+                guac_data.invalidate_active_connections(gconn)
+
+    if wait:
+        run()
+    else:
+        threading.Thread(target=run, daemon=True).start()
+    return job
+
+
+def get_job(job_id: str) -> KillJob:
+    """
+    Returns a kill job.
+
+    Parameters:
+        job_id (str): The id of the job.
+
+    Returns:
+        KillJob: The job, None if unknown.
+    """
+    return kill_cache['jobs'].get(job_id)
@@ -0,0 +1,353 @@
+"""
+Federated view of every enabled Guacamole server.
+
+The servers are polled concurrently and each one is waited for at most its
+own 'timeout', so a slow server only delays itself: its last good result,
+kept in the snapshot store, is served marked stale until it answers again.
+Results are reused for GUAC_POLL_TTL seconds and concurrent requests share
+the poll of a server in flight, so every viewer of the dashboard adds no
+work upstream and a hung server holds one thread per kind of data. With a
+max_stale age, as for the topology and active users, an expired result is
+served at once while the server is polled in the background, so dashboard
+polls never wait on Guacamole.
+A result restored from disk at startup is served without waiting while
+the server is polled in the background. Identifiers in merged
+views are namespaced with the id of their server, e.g. '2-15' for
+connection 15 of server 2, and actions on namespaced identifiers are
+routed to the owning server. Identifiers without a namespace belong to the
+first enabled server.
+"""
+
+import re
+import time
+from concurrent.futures import TimeoutError as FutureTimeout
+from flask import current_app
+from range_monitor import profiling
+from range_monitor import snapshots
+from . import guac_conn
+from . import guac_data
+from . import parse
+
+NAMESPACED = re.compile(r'^(\d+)-(.+)$')
+
+# the slideshow holds the admin token of every server
+snapshots.never_persist('guac.slideshow')
+
+def namespace(server_id: int, identifier) -> str:
+    """
+    Returns an identifier namespaced with its server.
+
+    Parameters:
+        server_id (int): The id of the server.
+        identifier: The identifier on the server.
+
+    Returns:
+        str: The namespaced identifier.
+    """
+    return f"{server_id}-{identifier}"
+
+
+def split_identifier(identifier) -> tuple:
+    """
+    Splits a namespaced identifier.
+
+    Parameters:
+        identifier: A namespaced or plain identifier.
+
+    Returns:
+        tuple: The id of the server, None for a plain identifier, and the
+            identifier on the server.
+    """
+    match = NAMESPACED.match(str(identifier))
+    if match is None:
+        return None, str(identifier)
+    return int(match.group(1)), match.group(2)
+
+
+def group_by_server(identifiers: list) -> dict:
+    """
+    Groups namespaced identifiers by server.
+
+    Parameters:
+        identifiers (list): Namespaced or plain identifiers.
+
+    Returns:
+        dict: The identifiers on the server by server id, None for the
+            plain identifiers.
+    """
+    grouped = {}
+    for identifier in identifiers:
+        server_id, identifier = split_identifier(identifier)
+        grouped.setdefault(server_id, []).append(identifier)
+    return grouped
+
+
+@profiling.traced
+def poll(key: str, func, ttl: float = None, max_stale: float = 0) -> list:
+    """
+    Runs a function against every enabled server concurrently.
+
+    Parameters:
+        key (str): The name of the data, under which the last good result
+            of every server is kept as the 'guac.<key>' snapshot.
+        func (callable): Called with the session of a server.
+        ttl (float, optional): Seconds a result is reused, defaults to
+            GUAC_POLL_TTL.
+        max_stale (float, optional): Seconds an expired result is served
+            without waiting while the server is polled again.
+
+    Returns:
+        list: One dictionary per server with its 'id', 'host', 'status'
+            ('ok', 'timeout', 'error' or 'restored'), whether the 'value'
+            is 'stale', the 'value', None if the server never answered, and
+            the 'version' of its snapshot.
+    """
+    servers = guac_conn.list_servers()
+    if not servers:
+        return []
+
+    default_timeout = current_app.config.get('GUAC_TIMEOUT', 12)
+    ttl = current_app.config.get('GUAC_POLL_TTL', 5) if ttl is None else ttl
+
+    def loader(guac_config):
+        return lambda source: func(guac_conn.connect(guac_config))
+
+    lasts = [
+        snapshots.store.peek(f'guac.{key}', guac_config['endpoint'])
+        for guac_config in servers
+    ]
+    futures = [
+        (guac_config, snapshots.store.load_async(
+            f'guac.{key}', guac_config['endpoint'], loader(guac_config), ttl
+        ))
+        for guac_config in servers
+    ]
+    started = time.time()
+    results = []
+    for (guac_config, future), last in zip(futures, lasts):
+        restored = last is not None and last.stale
+        refreshing = not restored and last is not None and last.age() < max_stale
+        # a result restored at startup, or expired but younger than
+        # max_stale, is served without waiting
+        if restored or refreshing:
+            timeout = 0
+        else:
+            timeout = guac_config.get('timeout') or default_timeout
+        result = {
+            'id': guac_config['id'],
+            'host': guac_config['endpoint'],
+            'status': 'ok',
+            'stale': False,
+            'version': None,
+        }
+        try:
+            snapshot = future.result(
+                timeout=max(0, started + timeout - time.time())
+            )
+            result['value'] = snapshot.value
+            result['version'] = snapshot.version
+        except FutureTimeout:
+            if refreshing:
+                result['value'] = last.value
+                result['version'] = last.version
+            else:
+                result['status'] = 'restored' if restored else 'timeout'
+        except Exception as e:
+            print(f"Guacamole server {guac_config['endpoint']} failed:", e)
+            result['status'] = 'error'
+        if result['status'] != 'ok':
+            result['stale'] = last is not None
+            result['value'] = last.value if last is not None else None
+            result['version'] = last.version if last is not None else None
+        results.append(result)
+    # slow servers finish in the background, shared with the next polls
+    return results
+
+
+def status_of(results: list) -> list:
+    """
+    Returns the status of every polled server, without the values.
+    """
+    return [
+        {key: value for key, value in result.items() if key != 'value'}
+        for result in results
+    ]
+
+
+def server_topology(gconn) -> list:
+    """
+    Returns the flattened connection tree of one server with its users.
+    """
+    connections, _ = parse.extract_connections(guac_data.get_tree_data(gconn))
+    return guac_data.resolve_users(connections, gconn)
+
+
+def poll_topology() -> list:
+    """
+    Polls the connection tree of every server, see poll, reusing it for
+    GUAC_TOPOLOGY_TTL seconds and serving it while it is polled again for
+    up to 10 times as long.
+    """
+    ttl = current_app.config.get('GUAC_TOPOLOGY_TTL', 10)
+    return poll('topology', server_topology, ttl, ttl * 10)
+
+
+@profiling.traced
+def get_topology(results: list = None) -> dict:
+    """
+    Returns the connection trees of every server merged under a ROOT
+    node, one child root per server.
+
+    Parameters:
+        results (list, optional): The results of poll_topology, polled
+            when not given.
+
+    Returns:
+        dict: 'nodes', the namespaced connections and groups, and
+            'servers', the status of every server.
+    """
+    results = poll_topology() if results is None else results
+    nodes = []
+    active = 0
+    for result in results:
+        for conn in result['value'] or []:
+            node = dict(conn)
+            node['server'] = result['id']
+            node['identifier'] = namespace(result['id'], conn['identifier'])
+            if conn.get('parentIdentifier'):
+                node['parentIdentifier'] = namespace(result['id'], conn['parentIdentifier'])
+            else:
+                # the ROOT group of the server
+                node['parentIdentifier'] = 'ROOT'
+                node['stale'] = result['stale']
+                active += conn.get('activeConnections', 0)
+            nodes.append(node)
+
+    nodes.append({
+        'name': 'Guacamole',
+        'identifier': 'ROOT',
+        'type': 'ORGANIZATIONAL',
+        'activeConnections': active,
+    })
+    return {'nodes': nodes, 'servers': status_of(results)}
+
+
+@profiling.traced
+def get_active_conns() -> dict:
+    """
+    Returns the active connections of every server.
+
+    Returns:
+        dict: 'conns', the active connections with their server, and
+            'servers', the status of every server.
+    """
+    results = poll('active_conns', guac_data.get_active_conns)
+    conns = [
+        dict(conn, server=result['id'])
+        for result in results
+        for conn in result['value'] or []
+    ]
+    return {'conns': conns, 'servers': status_of(results)}
+
+
+def poll_active_users() -> list:
+    """
+    Polls the active users of every server, see poll, reusing them for
+    GUAC_ACTIVE_USERS_TTL seconds and serving them while they are polled
+    again for up to 10 times as long.
+    """
+    ttl = current_app.config.get('GUAC_ACTIVE_USERS_TTL', 10)
+    return poll('active_users', guac_data.get_active_users, ttl, ttl * 10)
+
+
+@profiling.traced
+def get_active_users(results: list = None) -> dict:
+    """
+    Returns the active users of every server grouped by organization.
+
+    Parameters:
+        results (list, optional): The results of poll_active_users, polled
+            when not given.
+
+    Returns:
+        dict: The usernames of every organization, each user once.
+    """
+    results = poll_active_users() if results is None else results
+    groups = {}
+    for result in results:
+        for organization, usernames in (result['value'] or {}).items():
+            groups.setdefault(organization, set()).update(usernames)
+    return {
+        organization: sorted(usernames)
+        for organization, usernames in groups.items()
+    }
+
+
+def server_slideshow(gconn) -> dict:
+    """
+    Returns the link to every active connection of one server.
+    """
+    return {
+        'token': guac_data.get_token(gconn),
+        'url': guac_data.get_connection_link(guac_data.get_active_ids(gconn), gconn),
+    }
+
+
+@profiling.traced
+def get_slideshow() -> list:
+    """
+    Returns the slideshow link of every server.
+
+    Returns:
+        list: Dictionaries with the 'server', its 'token' and the 'url'.
+    """
+    return [
+        dict(result['value'], server=result['id'])
+        for result in poll('slideshow', server_slideshow)
+        if result['value']
+    ]
+
+
+@profiling.traced
+def get_links(identifiers: list) -> list:
+    """
+    Returns the connection links of namespaced identifiers, one per
+    owning server.
+
+    Parameters:
+        identifiers (list): Namespaced or plain connection identifiers.
+
+    Returns:
+        list: Dictionaries with the 'server', its 'token' and the 'url'.
+    """
+    links = []
+    for server_id, conn_identifiers in group_by_server(identifiers).items():
+        gconn = guac_conn.guac_connect(server_id)
+        if not gconn:
+            continue
+        links.append({
+            'server': server_id,
+            'token': guac_data.get_token(gconn),
+            'url': guac_data.get_connection_link(conn_identifiers, gconn),
+        })
+    return links
+
+
+@profiling.traced
+def kill_connections(identifiers: list) -> list:
+    """
+    Kills the sessions of namespaced connection identifiers on their
+    owning servers.
+
+    Parameters:
+        identifiers (list): Namespaced or plain connection identifiers.
+
+    Returns:
+        list: The uuids of the killed sessions.
+    """
+    killed = []
+    for server_id, conn_identifiers in group_by_server(identifiers).items():
+        gconn = guac_conn.guac_connect(server_id)
+        if gconn:
+            killed += guac_data.kill_connection(conn_identifiers, gconn) or []
+    return killed
@@ -0,0 +1,255 @@
+"""
+Cached Guacamole user directory and active users index.
+
+The directory maps every username to its organization and attributes. It
+is prefetched with one list_users request and reloaded after
+GUAC_USERS_TTL seconds, so the active users poll only calls detail_user
+for users created since the last prefetch, once per username. The
+per-organization grouping of active users is updated from the sessions
+that opened or closed since the previous poll, which guac_servers reuses
+for GUAC_ACTIVE_USERS_TTL seconds.
+"""
+
+import threading
+import time
+from flask import current_app
+from range_monitor import profiling
+from . import guac_conn
+
+NO_ORGANIZATION = 'No Organization'
+
+users_cache = {
+    'directories': {},
+    'indexes': {}
+}
+
+
+def organization_of(user: dict) -> str:
+    """
+    Returns the organization of a user.
+
+    Parameters:
+        user (dict): The user as returned by Guacamole.
+
+    Returns:
+        str: The 'guac-organization' attribute, 'No Organization' if unset.
+    """
+    attributes = user.get('attributes') or {}
+    return attributes.get('guac-organization') or NO_ORGANIZATION
+
+
+class UserDirectory:
+    """
+    Usernames of a Guacamole server mapped to their organization and
+    attributes.
+
+    Parameters:
+        ttl (float): Seconds before the directory is prefetched again.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.users = {}
+        self.loaded = None
+
+    def is_stale(self) -> bool:
+        """
+        Returns:
+            bool: True if the directory was never or too long ago prefetched.
+        """
+        return self.loaded is None or time.time() - self.loaded >= self.ttl
+
+    def prefetch(self, gconn) -> set:
+        """
+        Loads every user with one list_users request.
+
+        Parameters:
+            gconn (session): The Guacamole session.
+
+        Returns:
+            set: The usernames whose organization changed.
+        """
+        users = gconn.list_users()
+        if not isinstance(users, dict):
+            return set()
+
+        changed = set()
+        directory = {}
+        for username, user in users.items():
+            entry = {
+                'organization': organization_of(user),
+                'attributes': user.get('attributes') or {},
+            }
+            previous = self.users.get(username)
+            if previous is not None and previous['organization'] != entry['organization']:
+                changed.add(username)
+            directory[username] = entry
+        self.users = directory
+        self.loaded = time.time()
+        return changed
+
+    def lookup(self, gconn, usernames) -> dict:
+        """
+        Returns the directory entries of users, fetching the unknown ones.
+
+        Parameters:
+            gconn (session): The Guacamole session.
+            usernames (iterable): The usernames, duplicates allowed.
+
+        Returns:
+            dict: The entries of the usernames, by username.
+        """
+        entries = {}
+        for username in set(usernames):
+            entry = self.users.get(username)
+            if entry is None:
+                # created since the last prefetch
+                user = gconn.detail_user(username)
+                if not isinstance(user, dict):
+                    user = {}
+                entry = self.users[username] = {
+                    'organization': organization_of(user),
+                    'attributes': user.get('attributes') or {},
+                }
+            entries[username] = entry
+        return entries
+
+
+class ActiveUserIndex:
+    """
+    Active users grouped by organization, maintained from the sessions
+    that opened and closed between two polls.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sessions = {}
+        self.counts = {}
+        self.organizations = {}
+        self.groups = {}
+
+    def sync(self, active: dict, directory: UserDirectory, gconn) -> bool:
+        """
+        Applies the difference between the known and the active sessions.
+
+        Parameters:
+            active (dict): Active connections by uuid, as returned by
+                list_active_connections.
+            directory (UserDirectory): The user directory.
+            gconn (session): The Guacamole session.
+
+        Returns:
+            bool: True if the grouping changed.
+        """
+        opened = {
+            uuid: instance['username']
+            for uuid, instance in active.items()
+            if uuid not in self.sessions and instance.get('username')
+        }
+        closed = [uuid for uuid in self.sessions if uuid not in active]
+
+        changed = False
+        entries = directory.lookup(gconn, opened.values())
+        for uuid, username in opened.items():
+            self.sessions[uuid] = username
+            self.counts[username] = self.counts.get(username, 0) + 1
+            if self.counts[username] == 1:
+                self._add(username, entries[username]['organization'])
+                changed = True
+
+        for uuid in closed:
+            username = self.sessions.pop(uuid)
+            self.counts[username] -= 1
+            if not self.counts[username]:
+                del self.counts[username]
+                self._remove(username)
+                changed = True
+        return changed
+
+    def move(self, usernames: set, directory: UserDirectory) -> bool:
+        """
+        Regroups active users whose organization changed.
+
+        Parameters:
+            usernames (set): The usernames whose organization changed.
+            directory (UserDirectory): The user directory.
+
+        Returns:
+            bool: True if an active user was moved.
+        """
+        moved = False
+        for username in usernames:
+            if username in self.organizations:
+                self._remove(username)
+                self._add(username, directory.users[username]['organization'])
+                moved = True
+        return moved
+
+    def grouped(self) -> dict:
+        """
+        Returns:
+            dict: The sorted usernames of every organization.
+        """
+        return {
+            organization: sorted(usernames)
+            for organization, usernames in self.groups.items()
+        }
+
+    def _add(self, username: str, organization: str):
+        self.organizations[username] = organization
+        self.groups.setdefault(organization, set()).add(username)
+
+    def _remove(self, username: str):
+        organization = self.organizations.pop(username)
+        group = self.groups[organization]
+        group.discard(username)
+        if not group:
+            del self.groups[organization]
+
+
+def get_directory(source: str) -> UserDirectory:
+    """
+    Returns the user directory of a Guacamole server.
+
+    Parameters:
+        source (str): The Guacamole endpoint.
+
+    Returns:
+        UserDirectory: The directory, prefetched again every
+            GUAC_USERS_TTL seconds.
+    """
+    directory = users_cache['directories'].get(source)
+    if directory is None:
+        directory = users_cache['directories'][source] = UserDirectory(
+            current_app.config.get('GUAC_USERS_TTL', 300)
+        )
+    return directory
+
+
+@profiling.traced
+def get_active_users(gconn=None) -> dict:
+    """
+    Returns the active users grouped by organization, looking up only the
+    users of the sessions opened since the previous call.
+
+    Parameters:
+        gconn (session, optional): The Guacamole session, defaults to the
+            first enabled server.
+
+    Returns:
+        dict: The usernames of every organization, each user once.
+    """
+    gconn = gconn or guac_conn.guac_connect()
+    if not gconn:
+        return {}
+
+    source = gconn.host
+    directory = get_directory(source)
+    index = users_cache['indexes'].setdefault(source, ActiveUserIndex())
+    active = gconn.list_active_connections()
+    with index.lock:
+        if directory.is_stale():
+            index.move(directory.prefetch(gconn), directory)
+        if isinstance(active, dict):
+            index.sync(active, directory, gconn)
+        return index.grouped()
@@ -3,6 +3,33 @@ Helper functions
 """
 
 from time import time
+from range_monitor.records import Record
+
+
+class Connection(Record):
+    """
+    A connection or connection group of the connection tree.
+    """
+
+    __slots__ = (
+        'name', 'identifier', 'parentIdentifier', 'type', 'protocol',
+        'activeConnections', 'lastActive', 'attributes', 'sharingProfiles',
+        'users',
+    )
+    INTERNED = frozenset({'type', 'protocol'})
+
+
+class Session(Record):
+    """
+    An active connection.
+    """
+
+    __slots__ = (
+        'identifier', 'connectionIdentifier', 'startDate', 'remoteHost',
+        'username', 'connectable',
+    )
+    INTERNED = frozenset({'connectionIdentifier', 'username', 'remoteHost'})
+
 
 def extract_connections(obj: object) -> tuple [object, int]:
     """
@@ -13,7 +40,8 @@ def extract_connections(obj: object) -> tuple [object, int]:
     obj (dict): The object to extract groups and connections from.
 
     Returns:
-    list: The extracted connection groups, connections, and sharing groups.
+    list: The extracted connection groups, connections, and sharing groups,
+    as Connection records.
     """
 
     conns = []
@@ -21,7 +49,7 @@ def extract_connections(obj: object) -> tuple [object, int]:
 
     if isinstance(obj, dict):
         if obj.get('name') and obj.get('identifier'):
-            conn = obj.copy()
+            conn = Connection.from_dict(obj)
             conn['activeConnections'] = int(conn['activeConnections'])
             if conn.get('childConnectionGroups'):
                 child_conns, child_sum = extract_connections(conn['childConnectionGroups'])
@@ -81,47 +109,54 @@ def remove_empty(obj: object) -> object:
     return obj
 
 
-def format_history(history: list) -> list:
+def format_history(history: list, bucket: int = None) -> dict:
     """
-    Formats the history of a connection.
+    Formats the history of a connection into one sparse series per user.
+
+    Each session becomes a single {x: startDate, y: duration} point of its
+    user's series, so the payload grows linearly with the history instead
+    of padding every user with None for every session.
+
+    Parameters:
+        history (list): The history entries of the connection.
+        bucket (int, optional): Width of a time bucket in milliseconds.
+            Sessions starting in the same bucket are summed per user.
+
+    Returns:
+        dict: The chart dataset with one series per user.
     """
 
-    timestamps = []
+    now = round(time() * 1000)
     users = {}
 
     for conn in history:
-        users.setdefault(
-            conn['username'], []
-        )
-
-    for conn in history:
-        username = conn['username']
         start_date = conn['startDate']
-        if conn['endDate']:
-            end_date = conn['endDate']
+        duration = (conn['endDate'] or now) - start_date
+        if bucket:
+            start_date -= start_date % bucket
+            points = users.setdefault(conn['username'], {})
+            points[start_date] = points.get(start_date, 0) + duration
         else:
-            end_date = round(time() * 1000)
-
-        for user, value in users.items():
-            if user == username:
-                value.append(
-                    (end_date - start_date)
-                )
-            else:
-                value.append(None)
-
-        timestamps.append(
-            conn['startDate']
-        )
+            users.setdefault(conn['username'], []).append(
+                {'x': start_date, 'y': duration}
+            )
+
+    if bucket:
+        users = {
+            username: [
+                {'x': start_date, 'y': duration}
+                for start_date, duration in sorted(points.items())
+            ]
+            for username, points in users.items()
+        }
 
     dataset = {
-        "labels": timestamps,
         "datasets": [
             {
                 "label": username,
-                "data": intervals,
+                "data": points,
             }
-            for username, intervals in users.items()
+            for username, points in users.items()
         ]
     }
 
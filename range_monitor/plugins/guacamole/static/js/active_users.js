@@ -1,7 +1,21 @@
+// ETag of the last users received, sent back in If-None-Match
+let usersETag = null;
+
 function updateActiveConns() {
-    fetch('api/users_data')
-        .then(response => response.json())
+    const headers = usersETag ? { 'If-None-Match': usersETag } : {};
+    fetch('api/users_data', { headers })
+        .then(response => {
+            if (response.status === 304) {
+                // nothing changed, keep the users on the page
+                return null;
+            }
+            usersETag = response.headers.get('ETag');
+            return response.json();
+        })
         .then(data => {
+            if (data === null) {
+                return;
+            }
             const container = document.getElementById('active-users-container');
             // Clear the container before adding new data
             container.innerHTML = '';
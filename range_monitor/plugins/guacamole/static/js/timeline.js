@@ -11,13 +11,10 @@ const datasets = historyObject.datasets.map((dataset, index) => ({
     borderWidth: 1,
 }));
 
-const labels = historyObject.labels.map((label) => {
-    return new Date(label);
-});
-
+// each dataset is a sparse {x: startDate, y: duration} series, placed on
+// the time axis without a shared labels array
 const updatedHistory = {
     datasets,
-    labels,
 };
 
 console.log(updatedHistory);
@@ -40,6 +40,11 @@ export const topology = {
 	},
 	async renderWorker(isFirstRender) {
 		const apiData = await getTopologyData(15000, 3);
+		if(apiData === null && this.context) {
+			// the topology did not change since the last refresh
+			this.afterRender();
+			return;
+		}
 		if(this.context) {
 			this.updateTopology(apiData, isFirstRender);
 		} else {
@@ -125,10 +130,13 @@ export const topology = {
 	}
 };
 
+// ETag of the last topology received, sent back in If-None-Match
+let topologyETag = null;
+
 /**
  * @param {Number} timeout - refresh speed - 2,500 
  * @param {Number} retries 
- * @returns {Promise<Object[]>}
+ * @returns {Promise<Object[]|null>} null when the topology did not change
  */
 async function getTopologyData(timeout = 15000, retries = 1) {
 	if(retries > 5) {
@@ -138,7 +146,12 @@ async function getTopologyData(timeout = 15000, retries = 1) {
 	const { signal } = controller;
 	const timeoutId = setTimeout(() => controller.abort(), timeout);
 	try {
-		const response = await fetch("api/topology_data", { signal });
+		const headers = topologyETag ? { "If-None-Match": topologyETag } : {};
+		const response = await fetch("api/topology_data", { signal, headers });
+		if(response.status === 304) {
+			clearTimeout(timeoutId);
+			return null;
+		}
 		if(!response.ok) {
 			throw new Error(`Failed to fetch topology data: ${response.statusText}`);
 		}
@@ -147,6 +160,7 @@ async function getTopologyData(timeout = 15000, retries = 1) {
 			throw new Error("Invalid topology data received likely due to missing data");
 		}
 		clearTimeout(timeoutId);
+		topologyETag = response.headers.get("ETag");
 		return data.nodes;
 	} catch(err) {
 		return onFetchError(err, timeout, retries, timeoutId);
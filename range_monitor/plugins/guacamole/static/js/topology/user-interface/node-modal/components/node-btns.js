@@ -25,8 +25,11 @@ const controlEvents = {
 				request.status === 200
 			) {
 				const response = JSON.parse(request.responseText);
-				const link = `${response.url}?token=${response.token}`;
-				window.open(link, "_blank");
+				// one link per Guacamole server owning the selected nodes
+				const links = response.links || [response];
+				links.forEach(({ url, token }) => {
+					window.open(`${url}?token=${token}`, "_blank");
+				});
 			} else if (request.readyState === XMLHttpRequest.DONE) {
 				alert(request.responseText);
 			}
@@ -2,11 +2,11 @@
 OpenStack Monitor
 """
 
+from range_monitor import responses
 from range_monitor.auth import login_required, admin_required, user_required
 import range_monitor.db as sqlite3_wrapper
 import flask
-import concurrent.futures
-from . import stack_conn
+from . import stack_regions
 
 
 bp = flask.Blueprint(
@@ -23,33 +23,46 @@ def dashboard():
     return flask.render_template("pages/dashboard.html")
 
 
+@bp.route("/api/overview_data", methods=["GET"])
+@login_required
+def api_overview_data():
+    """
+    API endpoint to provide the instance and network summaries across
+    regions, with the counts and status of every region.
+    """
+    results = stack_regions.poll_inventory()
+    return responses.cached_json(
+        "openstack.overview",
+        responses.version_of(results),
+        lambda: stack_regions.get_overview(results)
+    )
+
+
 @bp.route("/diagnostics/")
 @login_required
 def diagnostics():
-    connection = stack_conn.connect()
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        servers = list(
-            executor.submit(lambda: connection.compute.servers()).result())
-        networks = list(
-            executor.submit(lambda: connection.network.networks()).result())
-    
+    inventory = stack_regions.get_inventory()
+    servers = inventory["servers"]
+    networks = inventory["networks"]
+
     servers_summary = {
         "inactive_servers": [
-            server for server in servers if server.status == "ACTIVE"
+            server for server in servers if server["status"] == "ACTIVE"
         ],
         "total_servers": len(servers)
     }
     
     networks_summary = {
         "inactive_networks": [
-            network for network in networks if network.status == "ACTIVE"
+            network for network in networks if network["status"] == "ACTIVE"
         ],
         "total_networks": len(networks)
     }
     
     data = {
         "servers_summary": servers_summary,
-        "networks_summary": networks_summary
+        "networks_summary": networks_summary,
+        "regions": inventory["regions"]
     }
     
     return flask.render_template("pages/diagnostics.html", data=data)
@@ -57,27 +70,27 @@ def diagnostics():
 @bp.route("/troubleshoot/", methods=["POST"])
 @login_required
 def troubleshoot():
-    connection = stack_conn.connect()
-    
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        servers = list(
-            executor.submit(lambda: connection.compute.servers()).result())
-        networks = list(
-            executor.submit(lambda: connection.network.networks()).result())
-    
+    inventory = stack_regions.get_inventory()
+
     entity_type = flask.request.form.get("service_type")
     entity_id = flask.request.form.get("service_id")
-    
-    openstack_entity = None
+    entity_region = flask.request.form.get("service_region")
+
+    resources = []
     match(entity_type):
         case "server":
-            openstack_entity = next(
-                (server for server in servers if server.id == entity_id), None
-            )
+            resources = inventory["servers"]
         case "network":
-            openstack_entity = next(
-                (network for network in networks if network.id == entity_id), None
-            )
+            resources = inventory["networks"]
+
+    openstack_entity = next(
+        (
+            resource for resource in resources
+            if resource["id"] == entity_id
+            and entity_region in (None, resource["region"])
+        ),
+        None
+    )
         
     return flask.render_template("pages/troubleshoot.html", service=openstack_entity)
 
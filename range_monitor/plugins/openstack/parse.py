@@ -3,6 +3,59 @@ Helper functions
 """
 
 from time import time
+from range_monitor.records import Record
+
+
+class Server(Record):
+    """
+    A compute server, as returned by Server.to_dict().
+    """
+
+    __slots__ = (
+        'id', 'name', 'status', 'project_id', 'user_id', 'created_at',
+        'updated_at', 'addresses', 'flavor', 'image', 'key_name',
+        'availability_zone', 'vm_state', 'power_state', 'task_state',
+        'security_groups', 'metadata', 'region',
+    )
+    INTERNED = frozenset({
+        'status', 'project_id', 'user_id', 'key_name', 'availability_zone',
+        'vm_state', 'task_state', 'region',
+    })
+
+
+class Network(Record):
+    """
+    A network, as returned by Network.to_dict().
+    """
+
+    __slots__ = (
+        'id', 'name', 'status', 'project_id', 'subnet_ids', 'is_admin_state_up',
+        'is_shared', 'is_router_external', 'mtu', 'provider_network_type',
+        'created_at', 'updated_at', 'availability_zones', 'region',
+    )
+    INTERNED = frozenset({
+        'status', 'project_id', 'provider_network_type', 'region',
+    })
+
+
+def compact(resource, record_type):
+    """
+    Converts an openstacksdk resource to a record, leaving out the
+    attributes it does not set.
+
+    Parameters:
+        resource (openstack.resource.Resource): The server or network.
+        record_type (type): Server or Network.
+
+    Returns:
+        Record: The record.
+    """
+    return record_type.from_dict({
+        key: value
+        for key, value in resource.to_dict().items()
+        if value is not None
+    })
+
 
 def extract_connections(obj: object) -> tuple [object, int]:
     """
@@ -81,47 +134,54 @@ def remove_empty(obj: object) -> object:
     return obj
 
 
-def format_history(history: list) -> list:
+def format_history(history: list, bucket: int = None) -> dict:
     """
-    Formats the history of a connection.
+    Formats the history of a connection into one sparse series per user.
+
+    Each session becomes a single {x: startDate, y: duration} point of its
+    user's series, so the payload grows linearly with the history instead
+    of padding every user with None for every session.
+
+    Parameters:
+        history (list): The history entries of the connection.
+        bucket (int, optional): Width of a time bucket in milliseconds.
+            Sessions starting in the same bucket are summed per user.
+
+    Returns:
+        dict: The chart dataset with one series per user.
     """
 
-    timestamps = []
+    now = round(time() * 1000)
     users = {}
 
     for conn in history:
-        users.setdefault(
-            conn['username'], []
-        )
-
-    for conn in history:
-        username = conn['username']
         start_date = conn['startDate']
-        if conn['endDate']:
-            end_date = conn['endDate']
+        duration = (conn['endDate'] or now) - start_date
+        if bucket:
+            start_date -= start_date % bucket
+            points = users.setdefault(conn['username'], {})
+            points[start_date] = points.get(start_date, 0) + duration
         else:
-            end_date = round(time() * 1000)
-
-        for user, value in users.items():
-            if user == username:
-                value.append(
-                    (end_date - start_date)
-                )
-            else:
-                value.append(None)
-
-        timestamps.append(
-            conn['startDate']
-        )
+            users.setdefault(conn['username'], []).append(
+                {'x': start_date, 'y': duration}
+            )
+
+    if bucket:
+        users = {
+            username: [
+                {'x': start_date, 'y': duration}
+                for start_date, duration in sorted(points.items())
+            ]
+            for username, points in users.items()
+        }
 
     dataset = {
-        "labels": timestamps,
         "datasets": [
             {
                 "label": username,
-                "data": intervals,
+                "data": points,
             }
-            for username, intervals in users.items()
+            for username, points in users.items()
         ]
     }
 
@@ -1,60 +1,83 @@
 """
-Connects to OpenStack using the configuration specified in the 'clouds.yaml' 
+Connects to OpenStack using the configuration specified in the 'clouds.yaml'
 file or from the database if no cloud is provided.
+
+Every enabled 'openstack' row is a cloud, and its 'region_name' may list
+several comma separated regions: one connection is kept per region.
 """
 
 import openstack
+import threading
 from typing import Optional
-from functools import cache
 import range_monitor.db as sqlite3_wrapper
 import logging
 
 logging.basicConfig(level=logging.INFO)
 
+conns_cache = {
+    'clouds': {},
+    'regions': {},
+    'lock': threading.Lock()
+}
 
-@cache
-def connect(cloud: Optional[str] = None) -> Optional[
-    openstack.connection.Connection]:
-    """
-    Connects to OpenStack. If a cloud is provided, connects using the 
-    'clouds.yaml' configuration. Otherwise, retrieves OpenStack connection 
-    details from the database.
 
-    :param cloud: Optional name of the cloud in 'clouds.yaml' to connect to.
-    :return: OpenStack Connection object if successful, None otherwise.
+def list_regions() -> list:
     """
-    if cloud:
-        logging.info(
-            f"Connecting to OpenStack using cloud: {cloud}"
-        )
-        return openstack.connect(cloud=cloud)
+    Lists the regions of every enabled OpenStack entry.
 
-    logging.info(
-        "No cloud provided. Retrieving OpenStack config from the database..."
-    )
+    :return: One configuration per region, its 'region' being
+        '<entry id>/<region name>', ordered by entry id.
+    """
     database = sqlite3_wrapper.get_db()
 
     try:
-        openstack_entry = database.execute(
-            "SELECT * FROM openstack WHERE enabled = 1"
-        ).fetchone()
+        openstack_entries = database.execute(
+            "SELECT * FROM openstack WHERE enabled = 1 ORDER BY id"
+        ).fetchall()
     except Exception as e:
         logging.error(
-            f"Failed to retrieve OpenStack entry from the database: {e}"
+            f"Failed to retrieve OpenStack entries from the database: {e}"
         )
-        return None
+        return []
+
+    regions = []
+    for openstack_entry in openstack_entries:
+        openstack_config = dict(openstack_entry)
+        region_names = [
+            region_name.strip()
+            for region_name in (openstack_config["region_name"] or "").split(",")
+            if region_name.strip()
+        ] or ["RegionOne"]
+        for region_name in region_names:
+            regions.append(dict(
+                openstack_config,
+                region_name=region_name,
+                region=f"{openstack_config['id']}/{region_name}"
+            ))
+    return regions
 
-    if not openstack_entry:
-        logging.warning("No enabled OpenStack entry found in the database.")
-        return None
 
-    openstack_config = dict(openstack_entry)
+def connect_region(openstack_config: dict) -> Optional[
+    openstack.connection.Connection]:
+    """
+    Connects to one region, reusing the connection as long as the region's
+    configuration is unchanged.
+
+    :param openstack_config: The configuration of the region, as returned
+        by list_regions.
+    :return: OpenStack Connection object if successful, None otherwise.
+    """
+    with conns_cache['lock']:
+        cached = conns_cache['regions'].get(openstack_config['region'])
+    if cached is not None and cached[0] == openstack_config:
+        return cached[1]
+
     logging.info(
         f"Connecting to OpenStack with config: {openstack_config['auth_url']}"
+        f" ({openstack_config['region_name']})"
     )
-
     try:
-        return openstack.connect(
+        connection = openstack.connect(
             auth_url=openstack_config["auth_url"],
             project_id=openstack_config["project_id"],
             project_name=openstack_config["project_name"],
@@ -68,3 +91,41 @@ def connect(cloud: Optional[str] = None) -> Optional[
     except Exception as e:
         logging.error(f"Failed to connect to OpenStack: {e}")
         return None
+
+    with conns_cache['lock']:
+        conns_cache['regions'][openstack_config['region']] = (
+            openstack_config, connection
+        )
+    return connection
+
+
+def connect(cloud: Optional[str] = None) -> Optional[
+    openstack.connection.Connection]:
+    """
+    Connects to OpenStack. If a cloud is provided, connects using the
+    'clouds.yaml' configuration. Otherwise, connects to the first region
+    of the enabled entries in the database.
+
+    :param cloud: Optional name of the cloud in 'clouds.yaml' to connect to.
+    :return: OpenStack Connection object if successful, None otherwise.
+    """
+    if cloud:
+        with conns_cache['lock']:
+            connection = conns_cache['clouds'].get(cloud)
+        if connection is None:
+            logging.info(
+                f"Connecting to OpenStack using cloud: {cloud}"
+            )
+            connection = openstack.connect(cloud=cloud)
+            with conns_cache['lock']:
+                conns_cache['clouds'][cloud] = connection
+        return connection
+
+    logging.info(
+        "No cloud provided. Retrieving OpenStack config from the database..."
+    )
+    regions = list_regions()
+    if not regions:
+        logging.warning("No enabled OpenStack entry found in the database.")
+        return None
+    return connect_region(regions[0])
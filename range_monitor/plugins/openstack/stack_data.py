@@ -6,8 +6,11 @@ import logging
 import requests
 from datetime import datetime
 from openstack import connection
+from . import parse
 from . import stack_conn
+from range_monitor import profiling
 
+@profiling.traced
 def get_activity_info(get_active=True):
     """
     Retrieves active connections from OpenStack.
@@ -33,6 +36,7 @@ def get_activity_info(get_active=True):
     return active_connections
 
 
+@profiling.traced
 def get_active_connections():
     """
     Retrieves a list of active connections.
@@ -49,6 +53,7 @@ def get_active_connections():
         })
     return active_connections
 
+@profiling.traced
 def get_projects_data():
     """
     Retrieves a list of projects (tenants) in OpenStack.
@@ -63,6 +68,7 @@ def get_projects_data():
 
     return projects
 
+@profiling.traced
 def get_instance_history(instance_id):
     """
     Retrieves the activity history of a specific instance from OpenStack's telemetry service.
@@ -93,6 +99,7 @@ def get_instance_history(instance_id):
 
     return history
 
+@profiling.traced
 def get_instances_summary():
     """
     Retrieves the summary of instances in OpenStack.
@@ -114,6 +121,7 @@ def get_instances_summary():
         "total_instances": total_instances
     }
 
+@profiling.traced
 def get_connection_history(conn_identifier):
     """
     Returns the connection history for a given connection identifier.
@@ -150,20 +158,22 @@ def get_connection_history(conn_identifier):
         logging.error(f"Error fetching connection history: {e}")
         return [] 
       
+@profiling.traced
 def get_networks_data():
     """
     Retrieves a list of networks in OpenStack.
 
     Returns:
-        list: A list of dictionaries, each representing a network.
+        list: A list of Network records, each representing a network.
     """
 
     conn = stack_conn.openstack_connect()
 
-    networks = [network.to_dict() for network in conn.network.networks()]
+    networks = [parse.compact(network, parse.Network) for network in conn.network.networks()]
 
     return networks
 
+@profiling.traced
 def get_network_details(network_id):
     """
     Retrieves details of a specific network in OpenStack.
@@ -180,6 +190,7 @@ def get_network_details(network_id):
 
     return network.to_dict()
 
+@profiling.traced
 def get_networks_summary():
     """
     Retrieves the summary of networks in OpenStack.
@@ -201,6 +212,7 @@ def get_networks_summary():
         "total_networks": total_networks
     }
 
+@profiling.traced
 def get_volume_details(volume_id):
     """
     Retrieves details of a specific volume in OpenStack.
@@ -217,6 +229,7 @@ def get_volume_details(volume_id):
 
     return volume.to_dict()
 
+@profiling.traced
 def get_performance_data():
     """
     Retrieves performance data from OpenStack.
@@ -250,6 +263,7 @@ def get_performance_data():
         logging.error(f"Error fetching performance data: {e}")
         return []
 
+@profiling.traced
 def get_connections_graph_data():
     """
     Retrieves connections graph data from OpenStack.
@@ -281,6 +295,7 @@ def get_connections_graph_data():
         logging.error(f"Error fetching connections graph data: {e}")
         return []
 #========================================+
+@profiling.traced
 def get_topology_data():
     """
     Retrieves topology data from OpenStack.
@@ -319,6 +334,7 @@ def get_topology_data():
         return {}
 
 ############
+@profiling.traced
 def get_instance_details(instance_name):
     """
     Retrieves details for a specific instance.
@@ -349,6 +365,7 @@ def get_instance_details(instance_name):
 
 ############
 
+@profiling.traced
 def get_cpu_usage():
     """
     Retrieves CPU usage data from OpenStack.
@@ -387,6 +404,7 @@ def get_cpu_usage():
         logging.error(f"Error fetching CPU usage data: {e}")
         return []
 
+@profiling.traced
 def get_memory_usage():
     """
     Retrieves memory usage data from OpenStack.
@@ -0,0 +1,226 @@
+"""
+Inventory of every enabled OpenStack region.
+
+The regions are collected concurrently and each one is waited for at most
+OPENSTACK_TIMEOUT seconds. Every resource is tagged with its 'region', and
+a region that fails or times out only loses its own part of the page: its
+last good inventory, kept in the snapshot store, is served marked stale
+until it answers again. Inventories are reused for OPENSTACK_POLL_TTL
+seconds and concurrent requests share the collection of a region in
+flight, so a hung region holds one thread. An inventory restored from disk at startup is
+served without waiting while the region is collected in the background.
+"""
+
+import logging
+import time
+from concurrent.futures import TimeoutError as FutureTimeout
+from flask import current_app
+from range_monitor import profiling
+from range_monitor import snapshots
+from . import parse
+from . import stack_conn
+
+
+@profiling.traced
+def poll(key: str, func, ttl: float = None) -> list:
+    """
+    Runs a function against every enabled region concurrently.
+
+    Parameters:
+        key (str): The name of the data, under which the last good result
+            of every region is kept as the 'openstack.<key>' snapshot.
+        func (callable): Called with the connection of a region.
+        ttl (float, optional): Seconds a result is reused, defaults to
+            OPENSTACK_POLL_TTL.
+
+    Returns:
+        list: One dictionary per region with its 'region', 'status' ('ok',
+            'timeout', 'error' or 'restored'), the 'error', whether the
+            'value' is 'stale', the 'value', None if the region never
+            answered, and the 'version' of its snapshot.
+    """
+    regions = stack_conn.list_regions()
+    if not regions:
+        return []
+
+    timeout = current_app.config.get('OPENSTACK_TIMEOUT', 30)
+    ttl = current_app.config.get('OPENSTACK_POLL_TTL', 10) if ttl is None else ttl
+
+    def loader(openstack_config):
+        def load(source):
+            connection = stack_conn.connect_region(openstack_config)
+            if connection is None:
+                raise ConnectionError(
+                    f"Failed to connect to {openstack_config['auth_url']}"
+                )
+            return func(connection)
+        return load
+
+    lasts = [
+        snapshots.store.peek(f'openstack.{key}', openstack_config['region'])
+        for openstack_config in regions
+    ]
+    futures = [
+        (openstack_config, snapshots.store.load_async(
+            f'openstack.{key}', openstack_config['region'],
+            loader(openstack_config), ttl
+        ))
+        for openstack_config in regions
+    ]
+    deadline = time.time() + timeout
+    results = []
+    for (openstack_config, future), last in zip(futures, lasts):
+        # an inventory restored at startup is served without waiting
+        restored = last is not None and last.stale
+        result = {
+            'region': openstack_config['region'],
+            'status': 'ok',
+            'error': None,
+            'stale': False,
+            'version': None,
+        }
+        try:
+            snapshot = future.result(
+                timeout=0 if restored else max(0, deadline - time.time())
+            )
+            result['value'] = snapshot.value
+            result['version'] = snapshot.version
+        except FutureTimeout:
+            if restored:
+                result['status'] = 'restored'
+            else:
+                result['status'] = 'timeout'
+                result['error'] = f"No answer within {timeout} seconds"
+        except Exception as e:
+            logging.error(f"OpenStack region {openstack_config['region']} failed: {e}")
+            result['status'] = 'error'
+            result['error'] = str(e)
+        if result['status'] != 'ok':
+            result['stale'] = last is not None
+            result['value'] = last.value if last is not None else None
+            result['version'] = last.version if last is not None else None
+        results.append(result)
+    # slow regions finish in the background, shared with the next polls
+    return results
+
+
+def status_of(results: list) -> list:
+    """
+    Returns the status of every polled region, without the values.
+    """
+    return [
+        {key: value for key, value in result.items() if key != 'value'}
+        for result in results
+    ]
+
+
+def load_inventory(connection) -> dict:
+    """
+    Lists the servers and networks of one region.
+
+    Parameters:
+        connection (openstack.connection.Connection): The region's connection.
+
+    Returns:
+        dict: The 'servers' and 'networks' as Server and Network records.
+    """
+    return {
+        'servers': [
+            parse.compact(server, parse.Server)
+            for server in connection.compute.servers()
+        ],
+        'networks': [
+            parse.compact(network, parse.Network)
+            for network in connection.network.networks()
+        ],
+    }
+
+
+def poll_inventory() -> list:
+    """
+    Polls the servers and networks of every region, see poll.
+    """
+    return poll('inventory', load_inventory)
+
+
+@profiling.traced
+def get_inventory(results: list = None) -> dict:
+    """
+    Returns the servers and networks of every region.
+
+    Parameters:
+        results (list, optional): The results of poll_inventory, polled
+            when not given.
+
+    Returns:
+        dict: The 'servers' and 'networks' tagged with their 'region', and
+            'regions', the status of every region.
+    """
+    results = poll_inventory() if results is None else results
+    inventory = {'servers': [], 'networks': [], 'regions': status_of(results)}
+    for result in results:
+        for kind in ('servers', 'networks'):
+            for resource in (result['value'] or {}).get(kind, []):
+                # tag a copy, the snapshot is shared
+                tagged = resource.copy()
+                tagged['region'] = result['region']
+                inventory[kind].append(tagged)
+    return inventory
+
+
+def summarize(resources: list) -> dict:
+    """
+    Counts the active resources.
+
+    Parameters:
+        resources (list): Servers or networks.
+
+    Returns:
+        dict: The 'active' and 'total' counts.
+    """
+    return {
+        'active': sum(1 for resource in resources if resource.get('status') == 'ACTIVE'),
+        'total': len(resources),
+    }
+
+
+@profiling.traced
+def get_overview(results: list = None) -> dict:
+    """
+    Returns the instance and network counts across regions and per region.
+
+    Parameters:
+        results (list, optional): The results of poll_inventory, polled
+            when not given.
+
+    Returns:
+        dict: The 'instances_summary' and 'networks_summary' of every
+            region added up, the counts of every region in 'regions'.
+    """
+    inventory = get_inventory(results)
+    instances = summarize(inventory['servers'])
+    networks = summarize(inventory['networks'])
+    regions = []
+    for region in inventory['regions']:
+        regions.append(dict(
+            region,
+            instances=summarize([
+                server for server in inventory['servers']
+                if server['region'] == region['region']
+            ]),
+            networks=summarize([
+                network for network in inventory['networks']
+                if network['region'] == region['region']
+            ]),
+        ))
+    return {
+        'instances_summary': {
+            'active_instances': instances['active'],
+            'total_instances': instances['total'],
+        },
+        'networks_summary': {
+            'active_networks': networks['active'],
+            'total_networks': networks['total'],
+        },
+        'regions': regions,
+    }
@@ -1,8 +1,22 @@
 document.addEventListener('DOMContentLoaded', function () {
+    // ETag of the last overview received, sent back in If-None-Match
+    let overviewETag = null;
+
     function updateOverviewData() {
-        fetch('/openstack/api/overview_data')
-            .then(response => response.json())
+        const headers = overviewETag ? { 'If-None-Match': overviewETag } : {};
+        fetch('/openstack/api/overview_data', { headers })
+            .then(response => {
+                if (response.status === 304) {
+                    // nothing changed, keep the overview on the page
+                    return null;
+                }
+                overviewETag = response.headers.get('ETag');
+                return response.json();
+            })
             .then(data => {
+                if (data === null) {
+                    return;
+                }
                 console.log("Updated Overview Data:", data);
 
                 // Update the DOM elements with new data
@@ -10,6 +24,25 @@ document.addEventListener('DOMContentLoaded', function () {
                 document.getElementById('totalInstances').textContent = data.instances_summary.total_instances;
                 document.getElementById('activeNetworks').textContent = data.networks_summary.active_networks;
                 document.getElementById('totalNetworks').textContent = data.networks_summary.total_networks;
+
+                const regions = document.getElementById('regions');
+                if (regions) {
+                    regions.replaceChildren(...(data.regions || []).map(region => {
+                        const card = document.createElement('div');
+                        card.className = 'card';
+                        const title = document.createElement('h2');
+                        title.textContent = region.region;
+                        const status = document.createElement('p');
+                        status.textContent = region.status === 'ok'
+                            ? 'status: ok'
+                            : `status: ${region.status}${region.stale ? ' (stale)' : ''}: ${region.error}`;
+                        const counts = document.createElement('p');
+                        counts.textContent = `instances: ${region.instances.active} / ${region.instances.total}`
+                            + `, networks: ${region.networks.active} / ${region.networks.total}`;
+                        card.append(title, status, counts);
+                        return card;
+                    }));
+                }
             })
             .catch(error => console.error("Error updating overview data:", error));
     }
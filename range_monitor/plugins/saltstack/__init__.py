@@ -1,20 +1,41 @@
 """
 Saltstack plugin for Range Monitor.
 """
-from flask import Blueprint, render_template, jsonify, request
+from flask import Blueprint, Response, abort, current_app, render_template, jsonify, request, stream_with_context
+from range_monitor import responses
 from range_monitor.auth import login_required
+from . import salt_alerts
 from . import salt_call
 from . import salt_conn
-import datetime
+from . import salt_events
+from . import salt_masters
+from . import salt_presence
+from . import salt_sensors
+import time
 
 bp = Blueprint('salt',
                 __name__,
                 template_folder='./templates',
                 static_folder='./static')
 
-salt_cache = {
-    'hostname': None
-}
+@bp.record_once
+def start_event_subscriber(state):
+    """
+    Follows the salt-api event stream when SALT_EVENTS is enabled.
+    """
+    salt_events.init_app(state.app)
+
+
+@bp.before_request
+def select_master():
+    """
+    Serves the page or data of the enabled salt master given as ?master=,
+    the first enabled master by default.
+    """
+    hostname = request.args.get('master')
+    if hostname and salt_call.select_master(hostname) is None:
+        abort(404)
+
 
 @bp.route('/')
 @login_required
@@ -25,15 +46,13 @@ def home():
     Returns:
     str: The rendered HTML template for displaying the active minions.
     """
-    if salt_cache['hostname'] == None:
-      data_source = salt_call.salt_conn()
-      salt_cache['hostname'] = data_source['hostname']
+    hostname = salt_call.salt_conn()['hostname']
     minion_data = salt_conn.get_all_minions()
     if minion_data == False:
         return render_template('salt/salt_error.html')
     return render_template(
         'salt/minions.html',
-        hostname = salt_cache['hostname'],
+        hostname = hostname,
         json_data=minion_data,
     )
 
@@ -47,12 +66,10 @@ def minion_graph():
     Returns:
         str: The rendered HTML template for displaying accepted minions.
     """
-    if salt_cache['hostname'] == None:
-      data_source = salt_call.salt_conn()
-      salt_cache['hostname'] = data_source['hostname']
+    hostname = salt_call.salt_conn()['hostname']
     return render_template(
         'salt/minion_graph.html', 
-        hostname = salt_cache['hostname'])
+        hostname = hostname)
 
 
 @bp.route('/jobs', methods=['GET'])
@@ -64,15 +81,13 @@ def jobs():
     Returns:
         str: The rendered HTML template for displaying recent jobs
     """
-    if salt_cache['hostname'] == None:
-      data_source = salt_call.salt_conn()
-      salt_cache['hostname'] = data_source['hostname']
+    hostname = salt_call.salt_conn()['hostname']
     json_data = salt_conn.get_all_jobs()
     if json_data == False:
       return render_template('salt/salt_error.html')
     return render_template(
         'salt/jobs.html',
-        hostname = salt_cache['hostname'], 
+        hostname = hostname, 
         json_data = json_data
     )
 
@@ -126,8 +141,235 @@ def minion_data():
             - x (list): list of all minion types
             - y (lsit): number of minions for each type
     """
-    data = salt_conn.get_minion_count()
-    return jsonify(data)
+    snapshot = salt_conn.get_minion_count_snapshot()
+    if snapshot == False:
+      return jsonify(snapshot)
+    return responses.cached_json(
+      f'salt.minion_count.{snapshot.source}',
+      snapshot.version,
+      lambda: snapshot.value
+    )
+
+
+@bp.route('/api/masters')
+@login_required
+def api_masters():
+    """
+    Retrieve the enabled salt masters
+
+    Args: none
+
+    Returns:
+        dict: { masters: [{hostname, endpoint, events}]}, events being
+            whether the master's event stream is followed live
+    """
+    return jsonify({'masters': salt_masters.list_masters()})
+
+
+@bp.route('/api/masters/minions')
+@login_required
+def api_masters_minions():
+    """
+    Retrieve the minions of every salt master, collected concurrently
+
+    Args: none
+
+    Returns:
+        dict: { values: { master: minions by role},
+                masters: [{master, status, stale}]}
+    """
+    results = salt_masters.poll_minions()
+    return responses.cached_json(
+      'salt.masters.minions', responses.version_of(results),
+      lambda: salt_masters.get_minions(results=results)
+    )
+
+
+@bp.route('/api/masters/jobs')
+@login_required
+def api_masters_jobs():
+    """
+    Retrieve the jobs of every salt master, collected concurrently
+
+    Args: none
+
+    Returns:
+        dict: { values: { master: jobs by target},
+                masters: [{master, status, stale}]}
+    """
+    results = salt_masters.poll_jobs()
+    return responses.cached_json(
+      'salt.masters.jobs', responses.version_of(results),
+      lambda: salt_masters.get_jobs(results=results)
+    )
+
+
+@bp.route('/api/masters/sensors')
+@login_required
+def api_masters_sensors():
+    """
+    Retrieve the physical node readings of every salt master, collected
+    concurrently
+
+    Args: none
+
+    Returns:
+        dict: { values: { master: { minion_id: { sensor: {value, unit}}}},
+                masters: [{master, status, stale}]}
+    """
+    results = salt_masters.poll_sensors()
+    return responses.cached_json(
+      'salt.masters.sensors', responses.version_of(results),
+      lambda: salt_masters.get_sensors(results=results)
+    )
+
+
+@bp.route('/api/masters/minion_data')
+@login_required
+def api_masters_minion_data():
+    """
+    Retrieve the up minions of every salt master counted by role
+
+    Args: none
+
+    Returns:
+        dict: { x: roles, y: counts added up across masters,
+                values: { master: {x, y}},
+                masters: [{master, status, stale}]}
+    """
+    results = salt_masters.poll_minion_count()
+    return responses.cached_json(
+      'salt.masters.minion_count', responses.version_of(results),
+      lambda: salt_masters.get_minion_count(results=results)
+    )
+
+
+@bp.route('/api/presence')
+@login_required
+def api_presence():
+    """
+    Retrieve minion availability from the recorded manage.up transitions
+
+    Args:
+        since (Optional[float]): start of the window in seconds since the
+            epoch, defaults to 24 hours ago
+        until (Optional[float]): end of the window, defaults to now
+
+    Returns:
+        dict: { minions: { minion_id: {role, up, availability, transitions, flapping}},
+                roles: { role: {minions, up, availability, flapping}}}
+    """
+    hostname = salt_call.salt_conn()['hostname']
+    since = request.args.get('since', time.time() - 86400, type=float)
+    until = request.args.get('until', type=float)
+    return jsonify(salt_presence.get_availability(hostname, since, until))
+
+
+@bp.route('/api/state_runs')
+@login_required
+def api_state_runs():
+    """
+    Retrieve the results of the latest state runs seen on the event stream
+
+    Args: none
+
+    Returns:
+        dict: { jid: {function, minions: { minion_id: {succeeded, failed, changed}}}},
+            empty when the event subscriber is not running
+    """
+    data_source = salt_call.salt_conn()
+    state = salt_events.get_state(data_source['hostname']) if data_source else None
+    if state is None:
+      return jsonify({})
+    return jsonify(state.recent_state_runs())
+
+
+@bp.route('/api/sensors')
+@login_required
+def api_sensors():
+    """
+    Retrieve the latest IPMI readings of the physical nodes
+
+    Args: none
+
+    Returns:
+        dict: { sensors: { sensor: unit},
+                nodes: { minion_id: { sensor: {value, unit}}}}
+    """
+    readings = salt_sensors.get_readings()
+    if readings is False:
+      return jsonify({'error': 'Unable to read the physical node sensors'}), 502
+    return jsonify({
+        'sensors': salt_sensors.list_sensors(readings),
+        'nodes': readings
+    })
+
+
+@bp.route('/api/sensors/<string:sensor>/trend')
+@login_required
+def api_sensor_trend(sensor):
+    """
+    Retrieve the stored samples of one sensor
+
+    Args:
+        sensor (str): sensor name, e.g. cpu_temp or fan1
+        since (Optional[float]): start of the window in seconds since the
+            epoch, defaults to an hour ago
+        until (Optional[float]): end of the window, defaults to now
+        node (Optional[str]): only the samples of this physical node
+
+    Returns:
+        dict: { unit: unit, nodes: { minion_id: [[time, value], ...]}}
+    """
+    since = request.args.get('since', time.time() - 3600, type=float)
+    until = request.args.get('until', type=float)
+    node = request.args.get('node')
+    return jsonify(salt_sensors.get_trend(sensor, since, until, node))
+
+
+@bp.route('/api/alerts')
+@login_required
+def api_alerts():
+    """
+    Retrieve the active sensor alerts of the physical nodes
+
+    Args: none
+
+    Returns:
+        dict: { alerts: [{source, node, sensor, kind, unit, value, since, last, ...}]}
+            kind is 'threshold' (with its limit) or 'deviation' (with the
+            mean and distance in standard deviations)
+    """
+    data_source = salt_call.salt_conn()
+    return jsonify({
+        'alerts': salt_alerts.get_engine().get_active(data_source['hostname'])
+    })
+
+
+@bp.route('/api/alerts/stream')
+@login_required
+def api_alerts_stream():
+    """
+    Stream sensor alerts as server-sent events
+
+    Args:
+        Last-Event-ID (Optional[header]): id of the last change received,
+            resumes the stream after it
+
+    Returns:
+        Response: text/event-stream of an 'active' event with the active
+            alerts, then 'raised' and 'cleared' events
+    """
+    data_source = salt_call.salt_conn()
+    last_id = request.headers.get('Last-Event-ID', type=int)
+    interval = current_app.config.get('SALT_SENSORS_INTERVAL', 5)
+    return Response(
+        stream_with_context(salt_alerts.stream(
+            data_source['hostname'], last_id, salt_sensors.get_readings, interval
+        )),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache'}
+    )
 
 
 @bp.route('/api/cpu_temp')
@@ -142,21 +384,7 @@ def api_cpu():
         dict: A dictionary containing the temperature data in this format:
             { minion_id: cpu_temperature}
     """
-    if salt_cache['hostname'] == None:
-      data_source = salt_call.salt_conn()
-      salt_cache['hostname'] = data_source['hostname']
-    data = {}
-    nodes = salt_conn.get_physical_nodes()
-    # nodes are the list of all physical nodes
-    # loop through nodes and call get_cpu_temp on each minion id
-    for node in nodes:
-      temp = salt_conn.get_cpu_temp(node)
-      if temp == None:
-        continue
-      time = datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
-      salt_call.insert_temp_data(salt_cache['hostname'], node, "cpu", temp, time)
-      data[node] = temp
-    return jsonify(data)
+    return jsonify(salt_sensors.get_sensor('cpu_temp') or {})
 
 
 @bp.route('/api/system_temp')
@@ -171,21 +399,23 @@ def api_system():
         dict: A dictionary containing the temperature data in this format:
             { minion_id: system_temperature}
     """
-    if salt_cache['hostname'] == None:
-      data_source = salt_call.salt_conn()
-      salt_cache['hostname'] = data_source['hostname']
-    data = {}
-    nodes = salt_conn.get_physical_nodes()
-    # nodes are the list of all physical nodes
-    # loop through nodes and call get_system_temp on each minion id
-    for node in nodes:
-      temp = salt_conn.get_system_temp(node)
-      if temp == None:
-        continue
-      time = datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
-      salt_call.insert_temp_data(salt_cache['hostname'], node, "system", temp, time)
-      data[node] = temp
-    return jsonify(data)
+    return jsonify(salt_sensors.get_sensor('system_temp') or {})
+
+
+@bp.route('/sensors', methods=['GET'])
+@login_required
+def sensors():
+    """
+    Sensor trends route
+
+    Args:
+        sensor (Optional[str]): sensor shown first, defaults to cpu_temp
+
+    Returns:
+        str: The rendered HTML template for displaying a line graph of the sensor trends.
+    """
+    return render_sensor_trends(request.args.get('sensor', 'cpu_temp'), 'Sensor Trends')
+
 
 @bp.route('/cpu_temp', methods=['GET'])
 @login_required
@@ -196,12 +426,8 @@ def cpu_temp():
     Returns:
         str: The rendered HTML template for displaying a line graph of the cpu temperature trends.
     """
-    if salt_cache['hostname'] == None:
-      data_source = salt_call.salt_conn()
-      salt_cache['hostname'] = data_source['hostname']
-    return render_template(
-        'salt/cpu_temp.html', 
-        hostname = salt_cache['hostname'])
+    return render_sensor_trends('cpu_temp', 'CPU Temperatures')
+
 
 @bp.route('/system_temp', methods=['GET'])
 @login_required
@@ -212,15 +438,39 @@ def system_temp():
     Returns:
         str: The rendered HTML template for displaying a line graph of the system temperature trends.
     """
-    if salt_cache['hostname'] == None:
-      data_source = salt_call.salt_conn()
-      salt_cache['hostname'] = data_source['hostname']
+    return render_sensor_trends('system_temp', 'System Temperatures')
+
+
+def render_sensor_trends(sensor, title):
+    """
+    Renders the sensor trends chart with a sensor preselected
+
+    Args:
+        sensor (str): sensor name
+        title (str): page title
+
+    Returns:
+        str: The rendered HTML template.
+    """
+    hostname = salt_call.salt_conn()['hostname']
     return render_template(
-        'salt/system_temp.html', 
-        hostname = salt_cache['hostname'])
+        'salt/sensor_trends.html',
+        hostname = hostname,
+        sensor = sensor,
+        title = title)
 
 @bp.route('/check_data')
 @login_required
 def check_data():
-    rows = salt_call.check_db()
+    """
+    Retrieve the latest stored sensor samples
+
+    Args:
+        limit (Optional[int]): number of samples, at most 1000, default 100
+
+    Returns:
+        list: the samples, newest first
+    """
+    limit = min(max(request.args.get('limit', 100, type=int), 1), 1000)
+    rows = salt_call.check_db(limit)
     return jsonify(rows)
\ No newline at end of file
@@ -1,5 +1,11 @@
+import re
+import sys
+import threading
+from bisect import insort
+from calendar import timegm
 from datetime import datetime
 from collections import defaultdict
+from range_monitor.records import Record
 """
 helper functions for json manipulation
 """
@@ -35,18 +41,196 @@ def sort_jobs_by_time(grouped_jobs):
 
     Returns: nested dictionary of targets and their corresponding jobs in chronological order
     """
+    # a job is shared by all of its targets, so parse each StartTime once
+    start_times = {}
+    for jobs in grouped_jobs.values():
+        for job_id, job_details in jobs.items():
+            if job_id not in start_times:
+                start_times[job_id] = parse_start_time(job_details['StartTime'])
+
     sorted_jobs = {}
     for target, jobs in grouped_jobs.items():
         sorted_jobs[target] = dict(
             sorted(
                 jobs.items(),
-                key=lambda x: datetime.strptime(x[1]['StartTime'], "%Y, %b %d %H:%M:%S.%f"),
+                key=lambda x: start_times[x[0]],
                 reverse=True
             )
         )
     return sorted_jobs
 
 
+MONTHS = {
+    month: index
+    for index, month in enumerate(
+        ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
+         'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'), 1
+    )
+}
+
+
+def parse_start_time(start_time):
+    """
+    Args: StartTime of a job, e.g. "2024, Jun 10 14:07:00.123456"
+
+    Returns: the start time as seconds since the epoch, in master time
+    """
+    try:
+        # strptime dominates ingest of large job caches, split by hand
+        date, clock = start_time.rsplit(' ', 1)
+        year, month_day = date.split(', ')
+        month, day = month_day.split(' ')
+        hour, minute, second = clock.split(':')
+        return timegm((
+            int(year), MONTHS[month], int(day), int(hour), int(minute), 0
+        )) + float(second)
+    except (KeyError, ValueError):
+        parsed = datetime.strptime(start_time, "%Y, %b %d %H:%M:%S.%f")
+        return timegm(parsed.timetuple()) + parsed.microsecond / 1e6
+
+
+def intern(value):
+    """
+    Args: a value repeated across many minions or jobs
+
+    Returns: the interned value if it is a string, else the value
+    """
+    return sys.intern(value) if type(value) is str else value
+
+
+class JobRecord:
+    """
+    A job of the job cache with its StartTime parsed once. The function,
+    user and minion ids are interned, as they repeat across jobs.
+
+    Args: job id, job details as returned by jobs.list_jobs, and
+        optionally the already parsed start time
+    """
+
+    __slots__ = (
+        'jid', 'function', 'arguments', 'target', 'start_time', 'user', 'epoch'
+    )
+
+    def __init__(self, jid, details, epoch=None):
+        target = details.get('Target', [])
+        self.jid = jid
+        self.function = intern(details.get('Function'))
+        self.arguments = details.get('Arguments', [])
+        self.target = (
+            [intern(minion_id) for minion_id in target]
+            if isinstance(target, list) else intern(target)
+        )
+        self.start_time = details.get('StartTime')
+        self.user = intern(details.get('User'))
+        self.epoch = (
+            epoch if epoch is not None
+            else parse_start_time(self.start_time)
+        )
+
+    @property
+    def targets(self):
+        """
+        Returns: list of the job's targets
+        """
+        if isinstance(self.target, str):
+            return [self.target]
+        return list(self.target)
+
+    def to_dict(self):
+        """
+        Returns: the job details in the jobs.list_jobs format
+        """
+        return {
+            'Function': self.function,
+            'Arguments': self.arguments,
+            'Target': self.target,
+            'StartTime': self.start_time,
+            'User': self.user,
+        }
+
+
+class JobTimeline:
+    """
+    Jobs grouped by target, each target kept sorted by start time on
+    insert so the latest jobs are served without re-sorting. Shared by the
+    request threads and the event subscriber, every access holds its lock.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.by_target = {}
+        self.jids = set()
+        self.first_jid = None
+        self.last_jid = ''
+
+    def __len__(self):
+        with self.lock:
+            return len(self.jids)
+
+    def add(self, record):
+        """
+        Args: JobRecord to insert, ignored if its JID is already present
+        """
+        with self.lock:
+            if record.jid in self.jids:
+                return
+            self.jids.add(record.jid)
+            self.last_jid = max(self.last_jid, record.jid)
+            if self.first_jid is None or record.jid < self.first_jid:
+                self.first_jid = record.jid
+            key = (record.epoch, record.jid, record)
+            for target in record.targets:
+                jobs = self.by_target.setdefault(target, [])
+                # jobs mostly arrive in order, skip the bisect for appends
+                if not jobs or jobs[-1][:2] <= key[:2]:
+                    jobs.append(key)
+                else:
+                    insort(jobs, key, key=lambda item: item[:2])
+
+    def prune(self, cutoff):
+        """
+        Args: JID before which jobs are removed
+        """
+        with self.lock:
+            if self.first_jid is None or self.first_jid >= cutoff:
+                return
+            self.jids = {jid for jid in self.jids if jid >= cutoff}
+            self.first_jid = min(self.jids, default=None)
+            for target in list(self.by_target):
+                jobs = [item for item in self.by_target[target] if item[1] >= cutoff]
+                if jobs:
+                    self.by_target[target] = jobs
+                else:
+                    del self.by_target[target]
+
+    def latest(self, target, limit=None):
+        """
+        Args: target, maximum number of jobs
+
+        Returns: list of the target's JobRecords, newest first
+        """
+        with self.lock:
+            jobs = self.by_target.get(target, [])
+            start = len(jobs) - limit if limit else 0
+            return [item[2] for item in reversed(jobs[max(start, 0):])]
+
+    def grouped(self, limit=None):
+        """
+        Args: maximum number of jobs per target
+
+        Returns: nested dictionary of targets and their jobs, newest first,
+            in the format of sort_jobs_by_time
+        """
+        with self.lock:
+            return {
+                target: {
+                    record.jid: record.to_dict()
+                    for record in self.latest(target, limit)
+                }
+                for target in sorted(self.by_target)
+            }
+
+
 def clean_jobs(data):
     """
     Args: jobs_data in simplified format
@@ -72,17 +256,29 @@ def clean_jobs(data):
     return cleaned_data
 
 
-def clean_minion_data(data):
+class Minion(Record):
     """
-    Args: minion_data in simplified format
+    The grains of a minion, the default SALT_MINION_GRAINS in slots and
+    any other configured grain in a dictionary.
+    """
+
+    __slots__ = ('id', 'virtual', 'uuid', 'build_phase', 'role', 'fqdn_ip4')
+    INTERNED = frozenset({'virtual', 'build_phase', 'role'})
 
-    Returns: dictionary of requested keys from minion grains.items() call
+
+def clean_minion_data(data, keys=None):
     """
-    keys = ['id', 'virtual', 'uuid', 'build_phase', 'role', 'fqdn_ip4']
+    Args: minion_data in simplified format, grains to keep
+
+    Returns: dictionary of Minion records with the requested keys from
+        minion grains.items() call
+    """
+    if keys is None:
+        keys = ['id', 'virtual', 'uuid', 'build_phase', 'role', 'fqdn_ip4']
     if not data:
         return False
     return {
-        minion_id: {key: grain_data[key] for key in keys if key in grain_data}
+        minion_id: Minion({key: grain_data[key] for key in keys if key in grain_data})
         for minion_id, grain_data in data.items()
     }
 
@@ -138,4 +334,53 @@ def count_roles(data, hostname):
     
     x = list(role_counts.keys())
     y = list(role_counts.values())
-    return {'x': x, 'y': y}
\ No newline at end of file
+    return {'x': x, 'y': y}
+
+
+"""
+units of IPMI readings, as reported by the ipmi grain, and their symbols
+"""
+IPMI_UNITS = {
+    'degrees c': 'C',
+    'degrees f': 'F',
+    'rpm': 'RPM',
+    'watts': 'W',
+    'volts': 'V',
+    'amps': 'A',
+    'percent': '%',
+}
+
+IPMI_READING = re.compile(r'^\s*(-?\d+(?:\.\d+)?)(?:\s*([A-Za-z%][A-Za-z% ]*?))?\s*$')
+
+
+def parse_ipmi_reading(reading):
+    """
+    Args: an ipmi grain value, e.g. "45 degrees C" or "1.02 Volts"
+
+    Returns: (value, unit) tuple, None if the value is not a numeric reading
+    """
+    if isinstance(reading, (int, float)) and not isinstance(reading, bool):
+        return float(reading), ''
+    if not isinstance(reading, str):
+        return None
+    match = IPMI_READING.match(reading)
+    if not match:
+        return None
+    unit = match.group(2) or ''
+    return float(match.group(1)), IPMI_UNITS.get(unit.lower(), unit)
+
+
+def parse_ipmi_sensors(ipmi):
+    """
+    Args: the ipmi grain of a minion
+
+    Returns: list of (sensor, unit, value) tuples for every numeric reading
+    """
+    if not isinstance(ipmi, dict):
+        return []
+    samples = []
+    for sensor, reading in ipmi.items():
+        parsed = parse_ipmi_reading(reading)
+        if parsed is not None:
+            samples.append((sensor, parsed[1], parsed[0]))
+    return samples
@@ -0,0 +1,255 @@
+"""
+Streaming anomaly detection on the physical node sensor readings.
+
+Every sample collected by salt_sensors updates an exponentially weighted
+mean and variance kept in memory per (master, node, sensor), so a sample
+costs O(1) and the stored samples are never scanned again. A sample raises
+an alert when it crosses the sensor's SALT_SENSOR_THRESHOLDS limit or
+deviates more than SALT_ANOMALY_SIGMA standard deviations from the mean;
+the alert clears with the first normal sample. Alert changes are kept in a
+short log that the alerts stream follows.
+"""
+
+import json
+import math
+import threading
+import time
+from collections import deque
+from flask import current_app
+
+"""
+default upper limits of the sensors, in their own unit
+"""
+DEFAULT_THRESHOLDS = {
+    'cpu_temp': 85,
+    'system_temp': 70,
+    'inlet_temp': 40,
+}
+
+alerts_cache = {
+    'engine': None
+}
+
+
+class SensorState:
+    """
+    Exponentially weighted mean and variance of one sensor.
+
+    Args: smoothing factor of the averages
+    """
+
+    __slots__ = ('alpha', 'count', 'mean', 'variance')
+
+    def __init__(self, alpha):
+        self.alpha = alpha
+        self.count = 0
+        self.mean = 0.0
+        self.variance = 0.0
+
+    def deviation(self, value, min_relative):
+        """
+        Args: sample, smallest standard deviation relative to the mean
+
+        Returns: distance of the sample to the mean, in standard deviations
+        """
+        std = max(math.sqrt(self.variance), abs(self.mean) * min_relative, 1e-9)
+        return abs(value - self.mean) / std
+
+    def update(self, value):
+        """
+        Args: sample
+        """
+        self.count += 1
+        if self.count == 1:
+            self.mean = value
+            return
+        diff = value - self.mean
+        increment = self.alpha * diff
+        self.mean += increment
+        self.variance = (1 - self.alpha) * (self.variance + diff * increment)
+
+
+class AlertEngine:
+    """
+    Per sensor state, active alerts and the log of alert changes.
+
+    Args: sensor limits, alert distance in standard deviations, samples
+        needed before deviations are flagged, smoothing factor, smallest
+        standard deviation relative to the mean, number of changes kept
+        for the stream
+    """
+
+    def __init__(self, thresholds, sigma=4.0, warmup=10, alpha=0.1,
+                 min_relative=0.02, history=1000):
+        self.thresholds = thresholds
+        self.sigma = sigma
+        self.warmup = warmup
+        self.alpha = alpha
+        self.min_relative = min_relative
+        self.states = {}
+        self.active = {}
+        self.changes = deque(maxlen=history)
+        self.sequence = 0
+        self.condition = threading.Condition()
+
+    def observe(self, source, node, sensor, unit, value, now=None):
+        """
+        Args: hostname of the salt master, node, sensor, unit and value of
+            a sample, time of the sample
+
+        Returns: list of the alert changes caused by the sample
+        """
+        now = time.time() if now is None else now
+        key = (source, node, sensor)
+        with self.condition:
+            state = self.states.get(key)
+            if state is None:
+                state = self.states[key] = SensorState(self.alpha)
+
+            limit = self.thresholds.get(sensor)
+            breached = limit is not None and value >= limit
+            deviation = None
+            if state.count >= self.warmup:
+                deviation = state.deviation(value, self.min_relative)
+            deviates = deviation is not None and deviation >= self.sigma
+
+            changes = [
+                self._set(key, 'threshold', breached, now, {
+                    'unit': unit, 'value': value, 'limit': limit
+                }),
+                self._set(key, 'deviation', deviates, now, {
+                    'unit': unit, 'value': value, 'mean': round(state.mean, 3),
+                    'sigma': round(deviation, 2) if deviation is not None else None
+                }),
+            ]
+            state.update(value)
+            changes = [change for change in changes if change is not None]
+            if changes:
+                self.condition.notify_all()
+            return changes
+
+    def _set(self, key, kind, raised, now, details):
+        """
+        Raises, updates or clears one alert, recording raises and clears.
+
+        Returns: the recorded change, None if the alert did not change state
+        """
+        alert_key = key + (kind,)
+        alert = self.active.get(alert_key)
+        if raised and alert is not None:
+            alert.update(details, last=now)
+            return None
+        if not raised and alert is None:
+            return None
+
+        if raised:
+            source, node, sensor = key
+            alert = self.active[alert_key] = dict(
+                details, source=source, node=node, sensor=sensor,
+                kind=kind, since=now, last=now
+            )
+        else:
+            alert = self.active.pop(alert_key)
+        self.sequence += 1
+        change = {
+            'id': self.sequence,
+            'event': 'raised' if raised else 'cleared',
+            'alert': dict(alert, last=now),
+        }
+        self.changes.append(change)
+        return change
+
+    def get_active(self, source=None):
+        """
+        Args: hostname of the salt master, None for every master
+
+        Returns: list of the active alerts, oldest first
+        """
+        with self.condition:
+            alerts = [
+                dict(alert) for alert in self.active.values()
+                if source is None or alert['source'] == source
+            ]
+        return sorted(alerts, key=lambda alert: alert['since'])
+
+    def can_resume(self, last_id):
+        """
+        Args: id of the last change a client saw
+
+        Returns: True if every change after last_id is still kept, False
+            for an id of a previous process or older than the history
+        """
+        with self.condition:
+            if last_id is None or last_id > self.sequence:
+                return False
+            return not self.changes or last_id >= self.changes[0]['id'] - 1
+
+    def changes_since(self, last_id, timeout=None):
+        """
+        Args: id of the last change seen, seconds to wait for a new one
+
+        Returns: list of the changes newer than last_id
+        """
+        with self.condition:
+            if self.sequence <= last_id and timeout:
+                self.condition.wait(timeout)
+            return [change for change in self.changes if change['id'] > last_id]
+
+
+def get_engine():
+    """
+    Returns: the process wide AlertEngine, configured by
+        SALT_SENSOR_THRESHOLDS, SALT_ANOMALY_SIGMA, SALT_ANOMALY_WARMUP and
+        SALT_ANOMALY_ALPHA
+    """
+    engine = alerts_cache.get('engine')
+    if engine is None:
+        config = current_app.config
+        engine = alerts_cache['engine'] = AlertEngine(
+            dict(DEFAULT_THRESHOLDS, **config.get('SALT_SENSOR_THRESHOLDS', {})),
+            config.get('SALT_ANOMALY_SIGMA', 4.0),
+            config.get('SALT_ANOMALY_WARMUP', 10),
+            config.get('SALT_ANOMALY_ALPHA', 0.1)
+        )
+    return engine
+
+
+def format_event(change):
+    """
+    Args: alert change
+
+    Returns: the change as a text/event-stream message
+    """
+    return (
+        f"id: {change['id']}\n"
+        f"event: {change['event']}\n"
+        f"data: {json.dumps(change['alert'])}\n\n"
+    )
+
+
+def stream(source, last_id, poll, interval):
+    """
+    Args: hostname of the salt master, id of the last change the client
+        saw, callable collecting new readings, seconds between collections
+
+    Returns: generator of text/event-stream messages, the active alerts
+        first on a new connection, or when the changes since last_id are
+        lost, then every raise and clear
+    """
+    engine = get_engine()
+    while True:
+        if not engine.can_resume(last_id):
+            last_id = engine.sequence
+            yield (
+                f"id: {last_id}\nevent: active\n"
+                f"data: {json.dumps(engine.get_active(source))}\n\n"
+            )
+        # watching the stream keeps the readings, and the alerts, current
+        poll()
+        changes = engine.changes_since(last_id, interval)
+        for change in changes:
+            last_id = change['id']
+            if change['alert']['source'] == source:
+                yield format_event(change)
+        if not changes:
+            yield ": keep-alive\n\n"
@@ -1,27 +1,95 @@
 import requests
 import json
+import time
+from flask import g
 from range_monitor.db import get_db
+from range_monitor import profiling
 
-def salt_conn():
+def list_masters():
+    """
+    Returns the enabled saltstack data sources, masters and syndics alike,
+    ordered by id.
+    """
     db = get_db()
-    salt_entry = db.execute(
+    salt_entries = db.execute(
         'SELECT s.*'
         ' FROM saltstack s'
         ' WHERE s.enabled = 1'
-    ).fetchone()
+        ' ORDER BY s.id'
+    ).fetchall()
+    return [
+        {
+            key: salt_entry[key]
+            for key in salt_entry.keys()
+        }
+        for salt_entry in salt_entries
+    ]
 
-    if not salt_entry:
-        return None
-    salt_data = {
-        key: salt_entry[key]
-        for key in salt_entry.keys()
-    }
-    return salt_data
+def salt_conn():
+    """
+    Returns the saltstack data source in use, read once per request: the
+    one selected with use_master or else the first enabled one.
+    """
+    if 'salt_data_source' in g:
+        return g.salt_data_source
+
+    masters = list_masters()
+    g.salt_data_source = masters[0] if masters else None
+    return g.salt_data_source
+
+def use_master(data_source):
+    """
+    Makes salt_conn return the given data source for the rest of the
+    app context.
+    """
+    g.salt_data_source = data_source
+
+def select_master(hostname):
+    """
+    Uses the enabled data source of a salt master, by hostname.
+
+    Returns: the data source, None if no enabled master has the hostname
+    """
+    data_source = next(
+        (master for master in list_masters() if master['hostname'] == hostname),
+        None
+    )
+    if data_source is not None:
+        use_master(data_source)
+    return data_source
+
+def for_master(loader):
+    """
+    Wraps a snapshot loader called with the hostname of a salt master so
+    it runs against that master, also from a background refresh where
+    nothing is selected yet.
+    """
+    def load(hostname):
+        data_source = g.get('salt_data_source')
+        if data_source is None or data_source['hostname'] != hostname:
+            select_master(hostname)
+        return loader(hostname)
+    return load
+
+def api_url(url):
+    """
+    Returns the base url of salt-api for a saltstack endpoint. Bare
+    hostnames use the default 'https://<host>:8000', full urls are used as is.
+    """
+    if '://' in url:
+        return url.rstrip('/')
+    return f'https://{url}:8000'
+
+"""
+salt-api tokens per (url, username), reused until they expire
+"""
+token_cache = {}
 
+@profiling.traced
 def rest_login(username, password, url):
     try:
         login = requests.post(
-                    f'https://{url}:8000/login',
+                    f'{api_url(url)}/login',
                     verify=False,
                     json={
                         'username':username,
@@ -29,52 +97,96 @@ def rest_login(username, password, url):
                         'eauth':'pam'
                     }
                 )
-        token = json.loads(login.text)["return"][0]["token"]
+        auth = json.loads(login.text)["return"][0]
+        token = auth["token"]
         if not token: 
             raise ValueError("Authentication failed: no token recieved")
+        token_cache[(url, username)] = {
+            'token': token,
+            # salt-api reports the expiry, keep a margin for clock drift
+            'expire': auth.get('expire', time.time() + 600) - 60
+        }
         return token
     except Exception as e:
         print("Unable to authenticate", username, e)
         return False
 
-def execute_function(username, password, url, cmd, args):
+def get_token(username, password, url):
+    """
+    Returns a cached salt-api token, logging in when there is none or it
+    expired.
+    """
+    cached = token_cache.get((url, username))
+    if cached and cached['expire'] > time.time():
+        return cached['token']
+    return rest_login(username, password, url)
+
+def lowstate(cmd, args, tgt):
+    """
+    Returns the lowstate chunk calling a monitor wrapper with its args on
+    the minion of the salt master, tgt.
+    """
+    return {
+        'client': 'local',
+        'tgt': tgt,
+        'fun': cmd,
+        'arg': [args]
+    }
+
+@profiling.traced
+def execute_chunks(username, password, url, chunks):
+    """
+    Sends a list of lowstate chunks in a single salt-api request.
+
+    Returns: the salt-api response, one entry of 'return' per chunk
+    """
     try:
-        token = rest_login(username, password, url)
-        response = requests.post( 
-                    f'https://{url}:8000/',
-                    verify=False,
-                    headers= {
-                        "X-Auth-Token" : token
-                    },
-                    json = [
-                            {
-                            'client': 'local',
-                            'tgt': 'salt-dev',
-                            'fun': cmd,
-                            'arg': [args]
-                            }
-                        ]
-                )
+        for attempt in range(2):
+            token = get_token(username, password, url)
+            response = requests.post( 
+                        f'{api_url(url)}/',
+                        verify=False,
+                        headers= {
+                            "X-Auth-Token" : token
+                        },
+                        json = chunks
+                    )
+            if response.status_code != 401:
+                break
+            # the master restarted or revoked the token, log in again
+            token_cache.pop((url, username), None)
         return response.json()
     except Exception as e:
         print("Unable to execute:", e)
         return {'API ERROR': e}
-    
-def insert_temp_data(hostname, node, sensor, temp, time):
-    try: 
-      db = get_db()
-      db.execute(
-          'INSERT INTO salt_temp (hostname, node, sensor, temp, time) VALUES (?, ?, ?, ?, ?)',
-          (hostname, node, sensor, temp, time)
-      )
-      db.commit()
-    except Exception as e:
-      print("Unable to insert temp data:", e)
 
-def check_db():
+@profiling.traced
+def execute_function(username, password, url, cmd, args, tgt):
+    return execute_chunks(username, password, url, [lowstate(cmd, args, tgt)])
+
+@profiling.traced
+def execute_functions(username, password, url, calls, tgt):
+    """
+    Executes several (cmd, args) calls through one request.
+
+    Returns: list of responses shaped like execute_function's, one per call
+    """
+    data = execute_chunks(
+        username, password, url,
+        [lowstate(cmd, args, tgt) for cmd, args in calls]
+    )
+    if 'API ERROR' in data:
+        return [data for _ in calls]
+    return [{'return': [result]} for result in data['return']]
+    
+def check_db(limit=100):
+    """
+    Returns: the latest sensor samples, at most limit
+    """
     db = get_db()
     rows=db.execute(
-        'SELECT * FROM salt_temp'
+        'SELECT * FROM salt_sensors ORDER BY id DESC LIMIT ?',
+        (limit,)
     ).fetchall()
     result = [dict(row) for row in rows]
     return result
\ No newline at end of file
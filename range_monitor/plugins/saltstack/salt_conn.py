@@ -1,49 +1,118 @@
 from . import salt_call
 from . import parse
-import re
+from . import salt_jobs
+from . import salt_events
+from . import salt_presence
+from flask import current_app
+from range_monitor import profiling
+from range_monitor import snapshots
 """
 helper functions to use saltstack api
 """
+@profiling.traced
 def execute_local_cmd(cmd):
   data_source = salt_call.salt_conn()
-  return salt_call.execute_function(data_source['username'], data_source['password'], data_source['endpoint'], "monitor.salt_local_cmd", cmd)
+  return salt_call.execute_function(data_source['username'], data_source['password'], data_source['endpoint'], "monitor.salt_local_cmd", cmd, data_source['hostname'])
 
+@profiling.traced
 def execute_run_cmd(cmd):
   data_source = salt_call.salt_conn()
-  return salt_call.execute_function(data_source['username'], data_source['password'], data_source['endpoint'], "monitor.salt_run_cmd", cmd)
+  return salt_call.execute_function(data_source['username'], data_source['password'], data_source['endpoint'], "monitor.salt_run_cmd", cmd, data_source['hostname'])
+
+@profiling.traced
+def execute_run_cmds(cmds):
+  """
+  runs several runner cmds as one lowstate batch through a single request
+  returns: list of responses, one per cmd, in the format of execute_run_cmd
+  """
+  data_source = salt_call.salt_conn()
+  return salt_call.execute_functions(data_source['username'], data_source['password'], data_source['endpoint'], [("monitor.salt_run_cmd", cmd) for cmd in cmds], data_source['hostname'])
+
+@profiling.traced
+def execute_local_cmds(cmds):
+  """
+  runs several local cmds as one lowstate batch through a single request
+  returns: list of responses, one per cmd, in the format of execute_local_cmd
+  """
+  data_source = salt_call.salt_conn()
+  return salt_call.execute_functions(data_source['username'], data_source['password'], data_source['endpoint'], [("monitor.salt_local_cmd", cmd) for cmd in cmds], data_source['hostname'])
+
+class SaltAPIError(Exception):
+  """
+  raised by snapshot loaders when salt-api returns an 'API ERROR'
+  """
 
 """
-cached information for session
+grains requested per page, overridable with the SALT_MINION_GRAINS config
 """
-salt_cache = {
-  'hostname': None,
-  'physical_nodes': None
+MINION_GRAINS = {
+  'minions': ['id', 'virtual', 'uuid', 'build_phase', 'role', 'fqdn_ip4']
 }
 
+"""
+cleaned grains per minion and the last sorted result, per page
+"""
+minion_cache = {}
+
 ## MINIONS ##
-def get_all_minions():
+def get_minion_grains(page):
+  """
+  returns: list of grains the given page displays
+  """
+  grains = current_app.config.get('SALT_MINION_GRAINS', {})
+  return grains.get(page, MINION_GRAINS.get(page, MINION_GRAINS['minions']))
+
+
+@profiling.traced
+def get_all_minions(page='minions'):
   """
   called in the default route to collect all minions
-  returns: parsed, cleaned, and sorted minion data
+  returns: parsed, cleaned, and sorted minion data, reusing the cleaned
+  grains of unchanged minions and the sorted result if nothing changed
   format for salt cmd = [cmd, tgt, [args]]
   """
-  cmd = ['grains.items', '*']
+  grains = get_minion_grains(page)
+  cmd = ['grains.item', '*', grains]
   json_data = execute_local_cmd(cmd)
-  if salt_cache['hostname'] == None:
-    data_source = salt_call.salt_conn()
-    salt_cache['hostname'] = data_source['hostname']
+  hostname = salt_call.salt_conn()['hostname']
 
   if 'API ERROR' in json_data:
     print("BAD DATA SOURCE FOUND IN get_all_minions")
     return False
-  
-  minion_data = parse.simplify_response(json_data, salt_cache['hostname'])
-  minion_data = parse.clean_minion_data(minion_data)
-  minion_data = parse.sort_minions_by_role(minion_data)
 
-  return minion_data
+  minion_data = parse.simplify_response(json_data, hostname)
+  if not isinstance(minion_data, dict) or not minion_data:
+    return False
+
+  cache = minion_cache.setdefault(
+    (hostname, page),
+    {'grains': None, 'minions': {}, 'result': None, 'version': 0}
+  )
+  same_grains = cache['grains'] == grains
+  changed = not same_grains or minion_data.keys() != cache['minions'].keys()
+  minions = {}
+  for minion_id, grain_data in minion_data.items():
+    cached = cache['minions'].get(minion_id)
+    if same_grains and cached is not None and cached[0] == grain_data:
+      minions[minion_id] = cached
+      continue
+    changed = True
+    cleaned = parse.clean_minion_data({minion_id: grain_data}, grains)[minion_id]
+    minions[minion_id] = (grain_data, cleaned)
 
+  if changed or cache['result'] is None:
+    cache['grains'] = grains
+    cache['minions'] = minions
+    cache['result'] = parse.sort_minions_by_role({
+      minion_id: cleaned
+      for minion_id, (grain_data, cleaned) in minions.items()
+    })
+    cache['version'] += 1
 
+  return cache['result']
+
+
+@profiling.traced
 def get_specified_minion(minion_id):
   """
   called in the /minions/<string:minion_id> route to get advanced minion data
@@ -54,152 +123,149 @@ def get_specified_minion(minion_id):
   load_cmd = ['status.loadavg', minion_id]
   ipmi_cmd = ['grains.item', minion_id, ['ipmi']]
 
-  if salt_cache['hostname'] == None:
-    data_source = salt_call.salt_conn()
-    salt_cache['hostname'] = data_source['hostname']
+  hostname = salt_call.salt_conn()['hostname']
+
+  responses = execute_local_cmds([uptime_cmd, load_cmd, ipmi_cmd])
+  if any('API ERROR' in response for response in responses):
+    print("BAD DATA SOURCE FOUND IN get_specified_minion")
+    return False
 
-  uptime_data = execute_local_cmd(uptime_cmd)
-  uptime_data = parse.simplify_response(uptime_data, salt_cache['hostname'])
-  load_data = execute_local_cmd(load_cmd)
-  load_data = parse.simplify_response(load_data, salt_cache['hostname'])
-  ipmi_data = execute_local_cmd(ipmi_cmd)
-  ipmi_data = parse.simplify_response(ipmi_data, salt_cache['hostname'])
+  uptime_data, load_data, ipmi_data = [
+    parse.simplify_response(response, hostname)
+    for response in responses
+  ]
 
   data_list = {'uptime_data': uptime_data, 'load_data': load_data, 'ipmi_data': ipmi_data}
 
-  if 'API ERROR' in data_list:
-    print("BAD DATA SOURCE FOUND IN get_all_minions")
-    return False
-  
   return data_list
 
 
 ## JOBS ##
+@profiling.traced
 def get_all_jobs():
   """
   called in the /jobs route to collect all cached jobs
-  returns: parsed, cleaned, grouped, and sorted jobs
-  format for salt cmd = [cmd, tgt, [args]]
+  returns: cleaned jobs grouped by target, newest first, served from the
+  local job index after fetching the jobs newer than its watermark
   """
-  cmd = ('jobs.list_jobs', '')
-  jobs = execute_run_cmd(cmd)
-
-  if 'API ERROR' in jobs:
-    print("BAD DATA SOURCE FOUND IN get_all_jobs")
+  source = salt_jobs.sync_jobs()
+  if source == False:
     return False
-  
-  if salt_cache['hostname'] == None:
-    data_source = salt_call.salt_conn()
-    salt_cache['hostname'] = data_source['hostname']
-  
-  jobs = parse.simplify_response(jobs, salt_cache['hostname'])
-  jobs = parse.clean_jobs(jobs)
-  jobs = parse.group_jobs_by_target(jobs)
-  jobs = parse.sort_jobs_by_time(jobs)
-  return jobs
 
+  return salt_jobs.get_jobs_by_target(source)
+
+@profiling.traced
 def get_specified_job(job_id):
   """
   called in the /jobs/<string:job_id> route to get advanced job data
-  returns: advanced job information
+  returns: advanced job information, cached once every minion of the job
+  returned
   format for salt cmd = [cmd, tgt, [args]]
   """
-  cmd = ['jobs.lookup_jid', job_id]
-  job_data = execute_run_cmd(cmd)
-
-  if 'API ERROR' in job_data:
-    print("BAD DATA SOURCE FOUND IN get_specified_job")
-    return False
-  
-  return job_data
+  return salt_jobs.lookup_job(job_id)
 
 
 ## PHYSICAL NODES ##
+@profiling.traced
 def get_physical_nodes():
   """
-  called in the /minions/<string:minion_id> route to get advanced minion data
-  returns: json returned by salt API cmd without "{'return': [{'salt-dev':" in front
+  called by the sensor ingestion to find the minions with ipmi sensors
+  returns: list of minion ids with the 'virtual' grain set to physical, kept
+  in the snapshot store per salt master for SALT_PHYSICAL_NODES_TTL seconds
+  and refreshed in the background, False if salt-api failed
   format for salt cmd = [cmd, tgt, [args]]
   """
-  if salt_cache['hostname'] == None:
-    data_source = salt_call.salt_conn()
-    salt_cache['hostname'] = data_source['hostname']
-
-  if salt_cache['physical_nodes'] == None:
-    cmd = ['grains.item', '*', ['virtual']]
-    json_data = execute_local_cmd(cmd)
-    salt_cache['physical_nodes'] = parse.get_physical_minions(json_data, salt_cache['hostname'])
-
-    if 'API ERROR' in json_data:
-      print("BAD DATA SOURCE FOUND IN get_all_minions")
-      return False
-  
-  return salt_cache['physical_nodes']
+  data_source = salt_call.salt_conn()
+  try:
+    snapshot = snapshots.get(
+      'salt.physical_nodes',
+      data_source['hostname'],
+      salt_call.for_master(load_physical_nodes),
+      current_app.config.get('SALT_PHYSICAL_NODES_TTL', 300)
+    )
+  except SaltAPIError:
+    print("BAD DATA SOURCE FOUND IN get_physical_nodes")
+    return False
+  return snapshot.value
 
 
-def get_cpu_temp(minion_id):
+def load_physical_nodes(hostname):
   """
-  returns: cpu temperatures of all physical nodes
-  format for salt cmd = [cmd, tgt, [args]]
+  loads the physical nodes of a salt master into the snapshot store
+  returns: list of minion ids with the 'virtual' grain set to physical
   """
-  if salt_cache['hostname'] == None:
-    data_source = salt_call.salt_conn()
-    salt_cache['hostname'] = data_source['hostname']
-  pattern = r"\d{2}"
-  cmd = ['grains.item', minion_id, ['ipmi']]
-  ipmi_data = execute_local_cmd(cmd)
-
-  if 'API ERROR' in ipmi_data:
-    print("BAD DATA SOURCE FOUND IN get_cpu_temp")
-    return False
-
-  ipmi_data = parse.simplify_response(ipmi_data, salt_cache['hostname'])
-  ipmi_data = ipmi_data[minion_id]['ipmi']
-  cpu_temp = ipmi_data.get('cpu_temp')
-  match = re.search(pattern, cpu_temp)
-  if match:
-      return int(match.group())
-  return None
+  cmd = ['grains.item', '*', ['virtual']]
+  json_data = execute_local_cmd(cmd)
+  if 'API ERROR' in json_data:
+    raise SaltAPIError(json_data['API ERROR'])
+  return parse.get_physical_minions(json_data, hostname)
 
 
-def get_system_temp(minion_id):
+def invalidate_physical_nodes():
   """
-  returns: system temperatres of all physical nodes
-  format for salt cmd = [cmd, tgt, [args]]
+  drops the cached physical nodes of the enabled salt master, e.g. after
+  adding a hypervisor
   """
-  if salt_cache['hostname'] == None:
-    data_source = salt_call.salt_conn()
-    salt_cache['hostname'] = data_source['hostname']
-  pattern = r"\d{2}"
-  cmd = ['grains.item', minion_id, ['ipmi']]
-  ipmi_data = execute_local_cmd(cmd)
-
-  if 'API ERROR' in ipmi_data:
-    print("BAD DATA SOURCE FOUND IN get_system_temp")
-    return False
+  data_source = salt_call.salt_conn()
+  snapshots.invalidate('salt.physical_nodes', data_source['hostname'])
 
-  ipmi_data = parse.simplify_response(ipmi_data, salt_cache['hostname'])
-  ipmi_data = ipmi_data[minion_id]['ipmi']
-  system_temp = ipmi_data.get('system_temp')
-  match = re.search(pattern, system_temp)
-  if match:
-      return int(match.group())
-  return None
 
 ## GRAPH INFORMATION ##
+@profiling.traced
 def get_minion_count():
   """
   called in the /graph route to gather information to generate graph in javascript
   returns: json returned by salt API cmd without "{'return': [{'salt-dev':" in front
   format for salt cmd = [cmd, tgt, [args]]
   """
-  cmd = ["manage.up"]
-  minions = execute_run_cmd(cmd)
+  hostname = salt_call.salt_conn()['hostname']
+
+  state = salt_events.get_state(hostname)
+  if salt_events.is_live(hostname) and state.presence_known:
+    # presence events keep the up minions current, no need to poll
+    minions = {'return': [{hostname: state.up_minions()}]}
+  else:
+    cmd = ["manage.up"]
+    minions = execute_run_cmd(cmd)
 
-  if salt_cache['hostname'] == None:
-    data_source = salt_call.salt_conn()
-    salt_cache['hostname'] = data_source['hostname']
+  if 'API ERROR' in minions:
+    print("BAD DATA SOURCE FOUND IN get_minion_count")
+    return False
+
+  salt_presence.record(
+    hostname,
+    parse.simplify_response(minions, hostname)
+  )
 
-  data = parse.count_roles(minions, salt_cache['hostname'])
+  data = parse.count_roles(minions, hostname)
   
+  return data
+
+
+def get_minion_count_snapshot():
+  """
+  returns: the snapshot of get_minion_count for the enabled salt master,
+  reloaded in the background once older than SALT_MINION_COUNT_TTL seconds,
+  so polls in between do not reach salt-api; False if salt-api failed
+  """
+  data_source = salt_call.salt_conn()
+  try:
+    return snapshots.get(
+      'salt.minion_count',
+      data_source['hostname'],
+      salt_call.for_master(load_minion_count),
+      current_app.config.get('SALT_MINION_COUNT_TTL', 5)
+    )
+  except SaltAPIError:
+    print("BAD DATA SOURCE FOUND IN get_minion_count_snapshot")
+    return False
+
+
+def load_minion_count(hostname):
+  """
+  loads the minion count of a salt master into the snapshot store
+  """
+  data = get_minion_count()
+  if data is False:
+    raise SaltAPIError(f'unable to count the minions of {hostname}')
   return data
\ No newline at end of file
@@ -0,0 +1,394 @@
+"""
+Optional subscriber to the salt-api event stream.
+
+When SALT_EVENTS is enabled, one background thread per enabled salt master
+follows its '/events' and keeps minion presence, jobs, state-run results and
+beacon sensor readings up to date in memory. New jobs go straight into the
+job index, so the jobs page, minion graph and temperature views stop
+polling the master while the stream is live. The stream is only trusted
+while data arrived within SALT_EVENTS_MAX_SILENCE seconds: a silent stream
+is read with that timeout and reconnected, so a half-open connection
+cannot stop the polling for good.
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+import requests
+from flask import current_app
+from . import salt_call
+from . import salt_jobs
+
+"""
+event state per salt master hostname
+"""
+event_states = {}
+
+
+def parse_event_stream(lines):
+    """
+    Args: iterable of decoded lines of a text/event-stream
+
+    Returns: generator of (tag, data) tuples, data being the 'data' of the
+        salt event
+    """
+    tag = None
+    payload = []
+    for line in lines:
+        if line is None:
+            continue
+        if line == '':
+            if payload:
+                try:
+                    event = json.loads('\n'.join(payload))
+                except ValueError:
+                    event = None
+                if isinstance(event, dict):
+                    yield event.get('tag', tag), event.get('data', {})
+            tag = None
+            payload = []
+        elif line.startswith('tag:'):
+            tag = line[4:].strip()
+        elif line.startswith('data:'):
+            payload.append(line[5:].strip())
+
+
+def format_stamp(stamp):
+    """
+    Args: '_stamp' of a salt event, e.g. "2024-06-10T14:07:00.123456"
+
+    Returns: the stamp in the jobs.list_jobs StartTime format
+    """
+    try:
+        started = datetime.fromisoformat(stamp)
+    except (TypeError, ValueError):
+        started = datetime.now()
+    return started.strftime("%Y, %b %d %H:%M:%S.%f")
+
+
+class EventState:
+    """
+    Incrementally maintained view of a salt master built from its events.
+
+    Args: maximum number of jobs kept in memory
+    """
+
+    def __init__(self, max_jobs=1000):
+        self.lock = threading.Lock()
+        self.max_jobs = max_jobs
+        self.connected = False
+        self.last_event = None
+        self.presence = {}
+        self.presence_known = False
+        self.jobs = OrderedDict()
+        self.state_runs = OrderedDict()
+        self.sensors = {}
+
+    def is_live(self, max_age=None):
+        """
+        Args: seconds after which a silent stream is no longer trusted
+
+        Returns: True while the stream is connected (and received data
+            within max_age seconds)
+        """
+        if not self.connected:
+            return False
+        return max_age is None or (
+            self.last_event is not None
+            and time.time() - self.last_event < max_age
+        )
+
+    def set_presence(self, minion_id, up, stamp):
+        """
+        Records a minion going up or down, keeping when it last changed.
+        """
+        current = self.presence.get(minion_id)
+        if current is None or current['up'] != up:
+            self.presence[minion_id] = {'up': up, 'since': stamp}
+
+    def handle(self, tag, data):
+        """
+        Args: event tag and data
+
+        Returns: the new job in jobs.list_jobs format for 'salt/job/*/new'
+            events, None otherwise
+        """
+        now = time.time()
+        parts = tag.split('/') if tag else []
+        with self.lock:
+            self.last_event = now
+            match parts:
+                case ['salt', 'job', jid, 'new']:
+                    job = {
+                        'Function': data.get('fun'),
+                        'Arguments': data.get('arg', []),
+                        'Target': data.get('tgt', ''),
+                        'Target-type': data.get('tgt_type', 'glob'),
+                        'User': data.get('user'),
+                        'StartTime': format_stamp(data.get('_stamp')),
+                    }
+                    self.jobs[jid] = {
+                        'job': job,
+                        'minions': data.get('minions', []),
+                        'returns': {},
+                    }
+                    while len(self.jobs) > self.max_jobs:
+                        self.jobs.popitem(last=False)
+                    return job
+                case ['salt', 'job', jid, 'ret', minion_id]:
+                    self.set_presence(minion_id, True, now)
+                    entry = self.jobs.get(jid)
+                    if entry is not None:
+                        entry['returns'][minion_id] = {
+                            'success': data.get('success'),
+                            'retcode': data.get('retcode'),
+                        }
+                    if str(data.get('fun', '')).startswith('state.'):
+                        self.add_state_run(jid, minion_id, data)
+                case ['salt', 'minion', minion_id, 'start']:
+                    self.set_presence(minion_id, True, now)
+                case ['salt', 'presence', 'present']:
+                    self.presence_known = True
+                    present = set(data.get('present', []))
+                    for minion_id in present:
+                        self.set_presence(minion_id, True, now)
+                    for minion_id in set(self.presence) - present:
+                        self.set_presence(minion_id, False, now)
+                case ['salt', 'presence', 'change']:
+                    self.presence_known = True
+                    for minion_id in data.get('new', []):
+                        self.set_presence(minion_id, True, now)
+                    for minion_id in data.get('lost', []):
+                        self.set_presence(minion_id, False, now)
+                case ['salt', 'beacon', minion_id, *_]:
+                    self.set_presence(minion_id, True, now)
+                    readings = {
+                        key: value
+                        for key, value in data.items()
+                        if not key.startswith('_') and key != 'id'
+                    }
+                    self.sensors.setdefault(minion_id, {}).update({
+                        key: (value, now) for key, value in readings.items()
+                    })
+        return None
+
+    def add_state_run(self, jid, minion_id, data):
+        """
+        Summarizes the return of a state run: states that succeeded,
+        failed and changed something.
+        """
+        states = data.get('return')
+        summary = {'succeeded': 0, 'failed': 0, 'changed': 0}
+        if isinstance(states, dict):
+            for state in states.values():
+                if not isinstance(state, dict):
+                    continue
+                if state.get('result') is False:
+                    summary['failed'] += 1
+                else:
+                    summary['succeeded'] += 1
+                if state.get('changes'):
+                    summary['changed'] += 1
+        else:
+            summary['failed'] = 0 if data.get('success') else 1
+        self.state_runs.setdefault(jid, {})[minion_id] = summary
+        self.state_runs.move_to_end(jid)
+        while len(self.state_runs) > self.max_jobs:
+            self.state_runs.popitem(last=False)
+
+    def recent_state_runs(self, limit=50):
+        """
+        Args: maximum number of jobs
+
+        Returns: dictionary of the latest state runs, newest first, with
+            the summary of each minion's return
+        """
+        with self.lock:
+            jids = list(self.state_runs)[-limit:]
+            return {
+                jid: {
+                    'function': self.jobs.get(jid, {}).get('job', {}).get('Function'),
+                    'minions': dict(self.state_runs[jid]),
+                }
+                for jid in reversed(jids)
+            }
+
+    def up_minions(self):
+        """
+        Returns: list of the minions currently up
+        """
+        with self.lock:
+            return [
+                minion_id
+                for minion_id, presence in self.presence.items()
+                if presence['up']
+            ]
+
+    def readings(self, minion_id, max_age):
+        """
+        Args: minion id, seconds after which a reading is stale
+
+        Returns: dictionary of the fresh beacon readings of the minion, in
+            the ipmi grain format
+        """
+        oldest = time.time() - max_age
+        with self.lock:
+            return {
+                name: value
+                for name, (value, received) in self.sensors.get(minion_id, {}).items()
+                if received >= oldest
+            }
+
+
+def get_state(source):
+    """
+    Args: hostname of the salt master
+
+    Returns: the EventState of the master, None when no subscriber runs
+    """
+    return event_states.get(source)
+
+
+def is_live(source):
+    """
+    Args: hostname of the salt master
+
+    Returns: True if a connected subscriber keeps the master's state
+        current, having received data within SALT_EVENTS_MAX_SILENCE seconds
+    """
+    state = event_states.get(source)
+    return state is not None and state.is_live(
+        current_app.config.get('SALT_EVENTS_MAX_SILENCE', 120)
+    )
+
+
+def received(state, lines):
+    """
+    Args: EventState of the master, lines of its event stream
+
+    Returns: generator of the lines, recording when each one arrived so
+        keep-alives count as activity
+    """
+    for line in lines:
+        state.last_event = time.time()
+        yield line
+
+
+class EventSubscriber(threading.Thread):
+    """
+    Follows the event stream of a salt master, reconnecting with a growing
+    delay when the stream fails.
+
+    Args: Flask app, hostname of the salt master, None for the first
+        enabled one
+    """
+
+    def __init__(self, app, hostname=None):
+        super().__init__(daemon=True, name=f'salt-events-{hostname or "default"}')
+        self.app = app
+        self.hostname = hostname
+        self.stop = threading.Event()
+        self.retry = app.config.get('SALT_EVENTS_RETRY', 5)
+
+    def run(self):
+        delay = 1
+        while not self.stop.is_set():
+            try:
+                connected = self.run_once()
+            except Exception as e:
+                # e.g. an odd payload or a locked database, retried like a
+                # failed connection instead of ending the thread
+                print("Salt event subscriber failed:", repr(e))
+                connected = False
+            if connected:
+                delay = 1
+            self.stop.wait(delay)
+            delay = min(delay * 2, self.retry * 12)
+
+    def run_once(self):
+        """
+        Connects to the event stream and consumes it until it closes.
+
+        Returns: True if the stream was connected
+        """
+        with self.app.app_context():
+            if self.hostname is None:
+                data_source = salt_call.salt_conn()
+            else:
+                data_source = salt_call.select_master(self.hostname)
+            if not data_source:
+                return False
+            source = data_source['hostname']
+            url = data_source['endpoint']
+            token = salt_call.get_token(
+                data_source['username'], data_source['password'], url
+            )
+            if not token:
+                return False
+
+            state = event_states.setdefault(source, EventState(
+                self.app.config.get('SALT_EVENTS_MAX_JOBS', 1000)
+            ))
+            try:
+                response = requests.get(
+                    f'{salt_call.api_url(url)}/events',
+                    headers={'X-Auth-Token': token,
+                             'Accept': 'text/event-stream'},
+                    stream=True,
+                    verify=False,
+                    # salt-api sends keep-alives, a longer silence is a
+                    # dead connection
+                    timeout=(12, self.app.config.get('SALT_EVENTS_MAX_SILENCE', 120))
+                )
+                if response.status_code != 200:
+                    salt_call.token_cache.pop((url, data_source['username']), None)
+                    return False
+            except requests.RequestException as e:
+                print("Unable to follow salt events:", e)
+                return False
+
+            state.last_event = time.time()
+            state.connected = True
+            try:
+                # catch up on the jobs started while disconnected
+                salt_jobs.sync_jobs(force=True)
+                lines = response.iter_lines(decode_unicode=True)
+                for tag, data in parse_event_stream(received(state, lines)):
+                    job = state.handle(tag, data)
+                    if job is not None:
+                        salt_jobs.store_jobs(source, {tag.split('/')[2]: job})
+                    if self.stop.is_set():
+                        break
+            except requests.RequestException as e:
+                print("Salt event stream closed:", e)
+            finally:
+                state.connected = False
+                response.close()
+            return True
+
+
+def init_app(app):
+    """
+    Starts an event subscriber per enabled salt master when SALT_EVENTS is
+    enabled.
+
+    Args: Flask app
+
+    Returns: list of the started EventSubscribers, None when disabled
+    """
+    if not app.config.get('SALT_EVENTS'):
+        return None
+    try:
+        with app.app_context():
+            hostnames = [master['hostname'] for master in salt_call.list_masters()]
+    except Exception as e:
+        # the database is not initialized yet
+        print("Unable to list the salt masters:", e)
+        hostnames = [None]
+    subscribers = [EventSubscriber(app, hostname) for hostname in hostnames]
+    for subscriber in subscribers:
+        subscriber.start()
+    app.extensions['salt_events'] = subscribers
+    return subscribers
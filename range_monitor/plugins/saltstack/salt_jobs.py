@@ -0,0 +1,360 @@
+"""
+Local index of the salt master's job cache.
+
+Only jobs newer than the last seen JID are fetched from salt-api, cleaned
+and stored per target in SQLite, and the jobs page is served from the
+index, so its cost tracks the new jobs instead of the whole job cache.
+Jobs older than SALT_JOBS_RETENTION seconds are deleted from the index as
+new ones are stored, like the master drops them after its keep_jobs.
+Each process keeps the index as a parse.JobTimeline, catching up on the
+JIDs other processes stored since its last read.
+
+Job returns from jobs.lookup_jid are kept in a bounded LRU, permanently
+once every minion listed in the jobs.list_job metadata of the job
+returned and for SALT_JOB_RUNNING_TTL seconds until then.
+"""
+
+import json
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from datetime import datetime
+from flask import current_app
+from range_monitor.db import get_db
+from range_monitor import profiling
+from . import salt_call
+from . import salt_conn
+from . import salt_events
+from . import parse
+
+JID_FORMAT = "%Y%m%d%H%M%S%f"
+
+jobs_cache = {
+    'last_sync': {},
+    'timelines': {},
+    'results': None
+}
+_timelines_lock = threading.Lock()
+
+
+def get_watermark(source):
+    """
+    Args: hostname of the salt master
+
+    Returns: the newest JID seen on the master, None before the first sync
+    """
+    row = get_db().execute(
+        'SELECT jid FROM salt_job_watermark WHERE source = ?',
+        (source,)
+    ).fetchone()
+    return row['jid'] if row else None
+
+
+def list_jobs_cmd(watermark):
+    """
+    Args: newest JID already indexed
+
+    Returns: the jobs.list_jobs command, with a start_time hint so the
+        master can skip older jobs
+    """
+    if watermark is None:
+        return ('jobs.list_jobs', '')
+    started = datetime.strptime(watermark[:20], JID_FORMAT)
+    return ('jobs.list_jobs', '', [f"start_time={started:%Y-%m-%d %H:%M:%S}"])
+
+
+def store_jobs(source, jobs, watermark=None):
+    """
+    Args: hostname of the salt master, simplified jobs.list_jobs return,
+        newest JID already indexed
+
+    Returns: the number of jobs added to the index
+    """
+    new_jobs = {
+        jid: job
+        for jid, job in jobs.items()
+        if watermark is None or jid > watermark
+    }
+    if not new_jobs:
+        return 0
+
+    db = get_db()
+    newest = max(new_jobs)
+    records = [
+        parse.JobRecord(jid, job)
+        for jid, job in parse.clean_jobs(new_jobs).items()
+    ]
+    db.executemany(
+        'INSERT OR IGNORE INTO salt_jobs'
+        ' (source, jid, function, arguments, target, start_time,'
+        ' start_epoch, user)'
+        ' VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+        [
+            (
+                source,
+                record.jid,
+                record.function,
+                json.dumps(record.arguments),
+                json.dumps(record.target),
+                record.start_time,
+                record.epoch,
+                record.user,
+            )
+            for record in records
+        ]
+    )
+    db.executemany(
+        'INSERT OR IGNORE INTO salt_job_targets (source, target, jid)'
+        ' VALUES (?, ?, ?)',
+        [
+            (source, target, record.jid)
+            for record in records
+            for target in record.targets
+        ]
+    )
+    db.execute(
+        'INSERT INTO salt_job_watermark (source, jid) VALUES (?, ?)'
+        ' ON CONFLICT (source) DO UPDATE SET jid = excluded.jid'
+        ' WHERE excluded.jid > salt_job_watermark.jid',
+        (source, newest)
+    )
+    prune_jobs(source)
+    db.commit()
+    return len(records)
+
+
+def retention_cutoff():
+    """
+    Returns: the JID of a job started SALT_JOBS_RETENTION seconds ago,
+        older JIDs sort before it
+    """
+    retention = current_app.config.get('SALT_JOBS_RETENTION', 24 * 3600)
+    return datetime.fromtimestamp(time.time() - retention).strftime(JID_FORMAT)
+
+
+def prune_jobs(source):
+    """
+    Deletes the jobs older than SALT_JOBS_RETENTION seconds from the index,
+    the caller commits
+
+    Args: hostname of the salt master
+    """
+    cutoff = retention_cutoff()
+    db = get_db()
+    db.execute(
+        'DELETE FROM salt_job_targets WHERE source = ? AND jid < ?',
+        (source, cutoff)
+    )
+    db.execute(
+        'DELETE FROM salt_jobs WHERE source = ? AND jid < ?',
+        (source, cutoff)
+    )
+
+
+@profiling.traced
+def sync_jobs(force=False):
+    """
+    Fetches the jobs newer than the watermark, at most once every
+    SALT_JOBS_TTL seconds and not while the event stream is live
+
+    Returns: hostname of the salt master, False if salt-api failed
+    """
+    data_source = salt_call.salt_conn()
+    if not data_source:
+        return False
+    source = data_source['hostname']
+    ttl = current_app.config.get('SALT_JOBS_TTL', 10)
+    last_sync = jobs_cache['last_sync'].get(source)
+    if not force and last_sync and time.time() - last_sync < ttl:
+        return source
+    if not force and salt_events.is_live(source):
+        # the event subscriber stores new jobs as they start
+        return source
+
+    watermark = get_watermark(source)
+    jobs = salt_conn.execute_run_cmd(list_jobs_cmd(watermark))
+    if 'API ERROR' in jobs:
+        print("BAD DATA SOURCE FOUND IN sync_jobs")
+        return False
+
+    store_jobs(source, parse.simplify_response(jobs, source), watermark)
+    jobs_cache['last_sync'][source] = time.time()
+    return source
+
+
+def get_timeline(source):
+    """
+    Args: hostname of the salt master
+
+    Returns: the parse.JobTimeline of the master, updated with the jobs
+        stored since it was last read and without the pruned ones
+    """
+    with _timelines_lock:
+        timeline = jobs_cache['timelines'].get(source)
+        if timeline is None:
+            timeline = jobs_cache['timelines'][source] = parse.JobTimeline()
+
+    # one catch-up at a time, the others then find nothing newer to add
+    with timeline.lock:
+        timeline.prune(retention_cutoff())
+        rows = get_db().execute(
+            'SELECT jid, function, arguments, target, start_time, start_epoch,'
+            ' user FROM salt_jobs'
+            ' WHERE source = ? AND jid > ?'
+            ' ORDER BY start_epoch, jid',
+            (source, timeline.last_jid)
+        ).fetchall()
+        for row in rows:
+            timeline.add(parse.JobRecord(
+                row['jid'],
+                {
+                    'Function': row['function'],
+                    'Arguments': json.loads(row['arguments']),
+                    'Target': json.loads(row['target']),
+                    'StartTime': row['start_time'],
+                    'User': row['user'],
+                },
+                row['start_epoch']
+            ))
+    return timeline
+
+
+@profiling.traced
+def get_jobs_by_target(source):
+    """
+    Args: hostname of the salt master
+
+    Returns: nested dictionary of targets and their jobs, newest first,
+        limited to SALT_JOBS_PER_TARGET jobs per target when set
+    """
+    limit = current_app.config.get('SALT_JOBS_PER_TARGET')
+    return get_timeline(source).grouped(limit)
+
+
+class JobResultCache:
+    """
+    LRU of jobs.lookup_jid returns bounded by their serialized size.
+    Returns larger than compress_threshold bytes are stored compressed.
+
+    Args: byte budget, size from which returns are compressed
+    """
+
+    def __init__(self, max_bytes, compress_threshold):
+        self.max_bytes = max_bytes
+        self.compress_threshold = compress_threshold
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Args: cache key
+
+        Returns: the cached return, None if missing or expired
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            data, compressed, expires = entry
+            if expires is not None and time.time() >= expires:
+                self._remove(key)
+                return None
+            self.entries.move_to_end(key)
+        if compressed:
+            data = zlib.decompress(data)
+        return json.loads(data)
+
+    def put(self, key, value, ttl=None):
+        """
+        Args: cache key, job return, seconds to keep it or None for a
+            complete job that is kept until evicted
+        """
+        data = json.dumps(value, separators=(',', ':')).encode()
+        compressed = len(data) > self.compress_threshold
+        if compressed:
+            data = zlib.compress(data)
+        if len(data) > self.max_bytes:
+            return
+
+        expires = time.time() + ttl if ttl is not None else None
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = (data, compressed, expires)
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+
+    def clear(self):
+        """
+        Empties the cache
+        """
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def _remove(self, key):
+        data = self.entries.pop(key)[0]
+        self.size -= len(data)
+
+
+def get_result_cache():
+    """
+    Returns: the process wide JobResultCache, sized by SALT_JOB_CACHE_BYTES
+        and SALT_JOB_COMPRESS_BYTES
+    """
+    cache = jobs_cache.get('results')
+    if cache is None:
+        cache = jobs_cache['results'] = JobResultCache(
+            current_app.config.get('SALT_JOB_CACHE_BYTES', 64 * 1024 * 1024),
+            current_app.config.get('SALT_JOB_COMPRESS_BYTES', 16 * 1024)
+        )
+    return cache
+
+
+def is_complete(source, job_data, job_meta):
+    """
+    Args: hostname of the salt master, jobs.lookup_jid return,
+        jobs.list_job return
+
+    Returns: True once every minion the master published the job to
+        returned, according to the 'Minions' of the job
+    """
+    try:
+        minions = job_meta['return'][0][source]['Minions']
+        returned = job_data['return'][0][source]
+    except (KeyError, IndexError, TypeError):
+        return False
+    return bool(minions) and isinstance(returned, dict) and set(minions) <= set(returned)
+
+
+@profiling.traced
+def lookup_job(job_id):
+    """
+    Args: job id
+
+    Returns: the jobs.lookup_jid return, from the result cache when
+        possible, False if salt-api failed
+    """
+    source = salt_call.salt_conn()['hostname']
+    cache = get_result_cache()
+    key = (source, job_id)
+    job_data = cache.get(key)
+    if job_data is not None:
+        return job_data
+
+    job_data, job_meta = salt_conn.execute_run_cmds([
+        ['jobs.lookup_jid', job_id],
+        ['jobs.list_job', job_id],
+    ])
+    if 'API ERROR' in job_data:
+        print("BAD DATA SOURCE FOUND IN lookup_job")
+        return False
+
+    if is_complete(source, job_data, job_meta):
+        cache.put(key, job_data)
+    else:
+        cache.put(key, job_data, current_app.config.get('SALT_JOB_RUNNING_TTL', 5))
+    return job_data
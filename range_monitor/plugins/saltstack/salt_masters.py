@@ -0,0 +1,207 @@
+"""
+Concurrent collection from every enabled salt master.
+
+Each master, or syndic, is collected on its own thread with its own app
+context, where salt_call.use_master selects it, so the existing
+per-master collectors, caches and salt-api tokens stay independent. A
+master is waited for at most SALT_TIMEOUT seconds; a master that fails or
+times out keeps its last good result, kept in the snapshot store and
+marked stale, without holding back the others. A result restored from disk
+at startup is served without waiting while the master is collected in the
+background. Results are reused for SALT_POLL_TTL seconds and concurrent
+requests share the collection of a master in flight, so a hung master
+holds one thread. Results are keyed by the hostname of their master.
+"""
+
+import time
+from concurrent.futures import TimeoutError as FutureTimeout
+from flask import current_app
+from range_monitor import profiling
+from range_monitor import snapshots
+from . import salt_call
+from . import salt_conn
+from . import salt_events
+from . import salt_sensors
+
+
+@profiling.traced
+def poll(key, func, ttl=None):
+    """
+    Args: name of the data, under which the last good result of every
+        master is kept as the 'salt.masters.<key>' snapshot, callable
+        collecting from the selected master and returning False when
+        salt-api failed, seconds a result is reused (SALT_POLL_TTL by
+        default)
+
+    Returns: list of one dictionary per master with its 'master' hostname,
+        'status' ('ok', 'timeout', 'error' or 'restored'), whether the
+        'value' is 'stale', the 'value', None if the master never
+        answered, and the 'version' of its snapshot
+    """
+    masters = salt_call.list_masters()
+    if not masters:
+        return []
+
+    timeout = current_app.config.get('SALT_TIMEOUT', 30)
+    ttl = current_app.config.get('SALT_POLL_TTL', 5) if ttl is None else ttl
+
+    def loader(data_source):
+        def load(source):
+            salt_call.use_master(data_source)
+            value = func()
+            if value is False:
+                raise ConnectionError(f"salt-api of {source} failed")
+            return value
+        return load
+
+    lasts = [
+        snapshots.store.peek(f'salt.masters.{key}', data_source['hostname'])
+        for data_source in masters
+    ]
+    futures = [
+        (data_source, snapshots.store.load_async(
+            f'salt.masters.{key}', data_source['hostname'],
+            loader(data_source), ttl
+        ))
+        for data_source in masters
+    ]
+    deadline = time.time() + timeout
+    results = []
+    for (data_source, future), last in zip(futures, lasts):
+        # a result restored at startup is served without waiting
+        restored = last is not None and last.stale
+        result = {
+            'master': data_source['hostname'],
+            'status': 'ok',
+            'stale': False,
+            'version': None,
+        }
+        try:
+            snapshot = future.result(
+                timeout=0 if restored else max(0, deadline - time.time())
+            )
+            result['value'] = snapshot.value
+            result['version'] = snapshot.version
+        except FutureTimeout:
+            result['status'] = 'restored' if restored else 'timeout'
+        except Exception as e:
+            print(f"Salt master {data_source['hostname']} failed:", e)
+            result['status'] = 'error'
+        if result['status'] != 'ok':
+            result['stale'] = last is not None
+            result['value'] = last.value if last is not None else None
+            result['version'] = last.version if last is not None else None
+        results.append(result)
+    # slow masters finish in the background, shared with the next polls
+    return results
+
+
+def merge(results):
+    """
+    Args: poll results
+
+    Returns: dictionary of the 'values' by master hostname, and the
+        'masters' status without the values
+    """
+    return {
+        'values': {result['master']: result['value'] for result in results},
+        'masters': [
+            {key: value for key, value in result.items() if key != 'value'}
+            for result in results
+        ],
+    }
+
+
+def list_masters():
+    """
+    Returns: list of the enabled masters with their hostname, endpoint and
+        whether their event stream is live
+    """
+    return [
+        {
+            'hostname': data_source['hostname'],
+            'endpoint': data_source['endpoint'],
+            'events': salt_events.is_live(data_source['hostname']),
+        }
+        for data_source in salt_call.list_masters()
+    ]
+
+
+def poll_minions(page='minions'):
+    """
+    Args: page whose grains are collected
+
+    Returns: the poll results of get_all_minions on every master
+    """
+    return poll(f'minions.{page}', lambda: salt_conn.get_all_minions(page))
+
+
+@profiling.traced
+def get_minions(page='minions', results=None):
+    """
+    Args: page whose grains are collected, results of poll_minions,
+        polled when not given
+
+    Returns: the sorted minions of every master, see merge
+    """
+    return merge(poll_minions(page) if results is None else results)
+
+
+def poll_jobs():
+    """
+    Returns: the poll results of get_all_jobs on every master
+    """
+    return poll('jobs', salt_conn.get_all_jobs)
+
+
+@profiling.traced
+def get_jobs(results=None):
+    """
+    Args: results of poll_jobs, polled when not given
+
+    Returns: the jobs grouped by target of every master, see merge
+    """
+    return merge(poll_jobs() if results is None else results)
+
+
+def poll_sensors():
+    """
+    Returns: the poll results of get_readings on every master
+    """
+    return poll('sensors', salt_sensors.get_readings)
+
+
+@profiling.traced
+def get_sensors(results=None):
+    """
+    Args: results of poll_sensors, polled when not given
+
+    Returns: the latest physical node readings of every master, see merge
+    """
+    return merge(poll_sensors() if results is None else results)
+
+
+def poll_minion_count():
+    """
+    Returns: the poll results of get_minion_count on every master
+    """
+    return poll('minion_count', salt_conn.get_minion_count)
+
+
+@profiling.traced
+def get_minion_count(results=None):
+    """
+    Args: results of poll_minion_count, polled when not given
+
+    Returns: the up minions of every master counted by role, added up in
+        'x' and 'y' like get_minion_count, with the counts of every master
+        in 'values' and their status in 'masters'
+    """
+    merged = merge(poll_minion_count() if results is None else results)
+    counts = {}
+    for data in merged['values'].values():
+        for role, count in zip((data or {}).get('x', []), (data or {}).get('y', [])):
+            counts[role] = counts.get(role, 0) + count
+    merged['x'] = list(counts.keys())
+    merged['y'] = list(counts.values())
+    return merged
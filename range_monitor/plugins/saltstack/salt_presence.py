@@ -0,0 +1,149 @@
+"""
+Minion presence history built from successive manage.up results.
+
+Each result is diffed against the previous one and only the up/down
+transitions are stored, so availability and flapping can be computed over
+long periods without keeping every manage.up snapshot.
+"""
+
+import time
+from flask import current_app
+from range_monitor.db import get_db
+
+"""
+minions known per salt master hostname, mapped to whether they are up
+"""
+presence_cache = {}
+
+
+def role_of(minion_id):
+    """
+    Args: minion id
+
+    Returns: the role of the minion, the prefix of its id as in count_roles
+    """
+    return minion_id.split('-')[0]
+
+
+def get_known(source):
+    """
+    Args: hostname of the salt master
+
+    Returns: dictionary of the known minions and whether they are up,
+        loaded from the last transition of each minion on first use
+    """
+    known = presence_cache.get(source)
+    if known is None:
+        rows = get_db().execute(
+            'SELECT minion, up, MAX(time) FROM salt_presence'
+            ' WHERE source = ? GROUP BY minion',
+            (source,)
+        ).fetchall()
+        known = presence_cache[source] = {
+            row['minion']: bool(row['up']) for row in rows
+        }
+    return known
+
+
+def record(source, up_minions, now=None):
+    """
+    Args: hostname of the salt master, minions returned by manage.up,
+        time of the result
+
+    Returns: list of (minion, up) transitions that were recorded
+    """
+    now = time.time() if now is None else now
+    known = get_known(source)
+    up = set(up_minions)
+
+    transitions = [
+        (minion_id, True) for minion_id in up
+        if not known.get(minion_id)
+    ] + [
+        (minion_id, False) for minion_id, was_up in known.items()
+        if was_up and minion_id not in up
+    ]
+    if not transitions:
+        return transitions
+
+    db = get_db()
+    db.executemany(
+        'INSERT INTO salt_presence (source, minion, up, time)'
+        ' VALUES (?, ?, ?, ?)',
+        [(source, minion_id, int(is_up), now) for minion_id, is_up in transitions]
+    )
+    db.commit()
+    for minion_id, is_up in transitions:
+        known[minion_id] = is_up
+    return transitions
+
+
+def get_availability(source, since, until=None):
+    """
+    Args: hostname of the salt master, start and end of the window
+        (seconds since the epoch, end defaults to now)
+
+    Returns: dictionary with per minion and per role availability (percent
+        of the observed time spent up), number of transitions and whether
+        the minion is flapping, i.e. changed state at least
+        SALT_FLAP_THRESHOLD times in the window
+    """
+    now = time.time()
+    until = now if until is None else min(until, now)
+    threshold = current_app.config.get('SALT_FLAP_THRESHOLD', 4)
+    db = get_db()
+
+    # state of every minion when the window opens
+    timelines = {
+        row['minion']: [(since, bool(row['up']))]
+        for row in db.execute(
+            'SELECT minion, up, MAX(time) FROM salt_presence'
+            ' WHERE source = ? AND time < ? GROUP BY minion',
+            (source, since)
+        ).fetchall()
+    }
+    transitions = {}
+    for row in db.execute(
+        'SELECT minion, up, time FROM salt_presence'
+        ' WHERE source = ? AND time >= ? AND time <= ?'
+        ' ORDER BY time',
+        (source, since, until)
+    ).fetchall():
+        minion_id = row['minion']
+        if minion_id in timelines:
+            # the first appearance of a minion is not a state change
+            transitions[minion_id] = transitions.get(minion_id, 0) + 1
+        timelines.setdefault(minion_id, []).append((row['time'], bool(row['up'])))
+
+    minions = {}
+    for minion_id, timeline in timelines.items():
+        up_time = 0.0
+        for (start, is_up), (end, _) in zip(timeline, timeline[1:] + [(until, None)]):
+            if is_up:
+                up_time += end - start
+        observed = until - timeline[0][0]
+        count = transitions.get(minion_id, 0)
+        minions[minion_id] = {
+            'role': role_of(minion_id),
+            'up': timeline[-1][1],
+            'availability': round(100 * up_time / observed, 2) if observed > 0 else None,
+            'transitions': count,
+            'flapping': count >= threshold,
+        }
+
+    roles = {}
+    for minion_id, minion in minions.items():
+        role = roles.setdefault(minion['role'], {
+            'minions': 0, 'up': 0, 'flapping': [], 'availability': []
+        })
+        role['minions'] += 1
+        role['up'] += minion['up']
+        if minion['flapping']:
+            role['flapping'].append(minion_id)
+        if minion['availability'] is not None:
+            role['availability'].append(minion['availability'])
+    for role in roles.values():
+        samples = role['availability']
+        role['availability'] = round(sum(samples) / len(samples), 2) if samples else None
+
+    return {'minions': minions, 'roles': dict(sorted(roles.items()))}
@@ -0,0 +1,165 @@
+"""
+IPMI sensor ingestion for the physical nodes of a salt master.
+
+Every numeric reading of the ipmi grain is parsed into a typed
+(node, sensor, unit, value) sample. One salt-api request collects the
+ipmi grain of the physical nodes at most once every SALT_SENSORS_INTERVAL
+seconds, however many dashboards poll, and the samples are bulk written to
+the 'salt_sensors' table that serves the sensor trends and fed to the
+salt_alerts anomaly detector. Samples older than SALT_SENSORS_RETENTION
+seconds are deleted as new ones are written.
+"""
+
+import time
+from flask import current_app
+from range_monitor.db import get_db
+from range_monitor import profiling
+from range_monitor import snapshots
+from . import salt_alerts
+from . import salt_call
+from . import salt_conn
+from . import salt_events
+from . import parse
+
+
+@profiling.traced
+def collect(hostname):
+    """
+    Args: hostname of the salt master
+
+    Returns: dictionary of the readings of every physical node,
+        { node: { sensor: {'value': value, 'unit': unit}}}, after storing
+        them as samples
+    """
+    nodes = salt_conn.get_physical_nodes()
+    if nodes is False:
+        raise salt_conn.SaltAPIError('unable to list the physical nodes')
+
+    ipmi = {}
+    # nodes whose ipmi beacon reports on the event stream are not polled
+    state = salt_events.get_state(hostname)
+    if salt_events.is_live(hostname):
+        max_age = current_app.config.get('SALT_EVENTS_SENSOR_AGE', 120)
+        for node in nodes:
+            readings = state.readings(node, max_age)
+            if readings:
+                ipmi[node] = readings
+
+    polled = [node for node in nodes if node not in ipmi]
+    if polled:
+        # one chunk per node, only the physical nodes are asked
+        responses = salt_conn.execute_local_cmds([
+            ['grains.item', node, ['ipmi']] for node in polled
+        ])
+        for node, json_data in zip(polled, responses):
+            if 'API ERROR' in json_data:
+                raise salt_conn.SaltAPIError(json_data['API ERROR'])
+            grains = parse.simplify_response(json_data, hostname)
+            ipmi[node] = grains.get(node, {}).get('ipmi')
+
+    now = time.time()
+    readings = {}
+    rows = []
+    for node, node_ipmi in ipmi.items():
+        for sensor, unit, value in parse.parse_ipmi_sensors(node_ipmi):
+            readings.setdefault(node, {})[sensor] = {'value': value, 'unit': unit}
+            rows.append((hostname, node, sensor, unit, value, now))
+
+    engine = salt_alerts.get_engine()
+    for row in rows:
+        engine.observe(*row)
+
+    if rows:
+        db = get_db()
+        db.executemany(
+            'INSERT INTO salt_sensors (hostname, node, sensor, unit, value, time)'
+            ' VALUES (?, ?, ?, ?, ?, ?)',
+            rows
+        )
+        retention = current_app.config.get('SALT_SENSORS_RETENTION', 7 * 86400)
+        db.execute(
+            'DELETE FROM salt_sensors WHERE hostname = ? AND time < ?',
+            (hostname, now - retention)
+        )
+        db.commit()
+    return readings
+
+
+def get_readings():
+    """
+    Returns: the latest readings of every physical node of the enabled salt
+        master, collected at most once every SALT_SENSORS_INTERVAL seconds,
+        False if salt-api failed
+    """
+    data_source = salt_call.salt_conn()
+    try:
+        snapshot = snapshots.get(
+            'salt.sensors',
+            data_source['hostname'],
+            salt_call.for_master(collect),
+            current_app.config.get('SALT_SENSORS_INTERVAL', 5)
+        )
+    except salt_conn.SaltAPIError as e:
+        print("BAD DATA SOURCE FOUND IN get_readings:", e)
+        return False
+    return snapshot.value
+
+
+def get_sensor(sensor):
+    """
+    Args: sensor name, e.g. cpu_temp
+
+    Returns: dictionary of the latest reading of the sensor per node,
+        False if salt-api failed
+    """
+    readings = get_readings()
+    if readings is False:
+        return False
+    return {
+        node: node_readings[sensor]['value']
+        for node, node_readings in readings.items()
+        if sensor in node_readings
+    }
+
+
+def list_sensors(readings):
+    """
+    Args: latest readings as returned by get_readings
+
+    Returns: dictionary of every sensor name and its unit, sorted by name
+    """
+    sensors = {}
+    for node_readings in readings.values():
+        for sensor, reading in node_readings.items():
+            sensors.setdefault(sensor, reading['unit'])
+    return dict(sorted(sensors.items()))
+
+
+@profiling.traced
+def get_trend(sensor, since, until=None, node=None):
+    """
+    Args: sensor name, start and end of the window in seconds since the
+        epoch, optional node to restrict the trend to
+
+    Returns: dictionary with the unit of the sensor and its samples per
+        node, { 'unit': unit, 'nodes': { node: [[time, value], ...]}}
+    """
+    data_source = salt_call.salt_conn()
+    query = (
+        'SELECT node, unit, value, time FROM salt_sensors'
+        ' WHERE hostname = ? AND sensor = ? AND time >= ?'
+    )
+    params = [data_source['hostname'], sensor, since]
+    if until is not None:
+        query += ' AND time <= ?'
+        params.append(until)
+    if node is not None:
+        query += ' AND node = ?'
+        params.append(node)
+
+    unit = None
+    nodes = {}
+    for row in get_db().execute(query + ' ORDER BY time', params).fetchall():
+        unit = row['unit']
+        nodes.setdefault(row['node'], []).append([row['time'], row['value']])
+    return {'unit': unit, 'nodes': nodes}
@@ -29,10 +29,24 @@ let saltChart = new Chart(ctx, {
 });
 
 
-function updateGraph() {
-  fetch('api/minion_data')
-    .then(response => response.json())
+// ETag of the last counts received, sent back in If-None-Match
+let minionETag = null;
+
+function updateGraph(force = false) {
+  const headers = minionETag && !force ? { 'If-None-Match': minionETag } : {};
+  fetch('api/minion_data', { headers })
+    .then(response => {
+      if (response.status === 304) {
+        // the counts did not change, the chart is up to date
+        return null;
+      }
+      minionETag = response.headers.get('ETag');
+      return response.json();
+    })
     .then(data => {
+      if (data === null) {
+        return;
+      }
       const xvalue = data.x;
       const yvalue = data.y;
       const bgColors = [];
@@ -62,7 +76,8 @@ function setChartType(newType) {
     },
     options: getChartOptions(newType)
   });
-  updateGraph();
+  // the new chart starts empty, fetch the counts even if unchanged
+  updateGraph(true);
 }
 
 function getChartOptions(chartType){
@@ -0,0 +1,204 @@
+const sensorsEndpoint = '/saltstack/api/sensors';
+const alertsStream = '/saltstack/api/alerts/stream';
+const trendEndpoint = sensor => `/saltstack/api/sensors/${encodeURIComponent(sensor)}/trend`;
+const updateInterval = 5000;
+const historySeconds = 3600;
+
+
+const sensorSelect = document.getElementById('sensor');
+let currentSensor = sensorSelect.dataset.sensor;
+
+const machineColors = {
+  compute: 'rgba(255, 99, 132, 1)',
+  controller: 'rgba(54, 162, 235, 1)',
+  controllerv2: 'rgba(0, 243, 255, 1)',
+  storage: 'rgba(235, 242, 0, 1)'
+};
+const dashStyles = {
+  compute: [5, 2, 5, 10],
+  controller: [3, 3],
+  controllerv2: [5, 5],
+  storage: [10, 5, 2, 5]
+};
+
+const ctx = document.getElementById('sensorChart').getContext('2d');
+const sensorChart = new Chart(ctx, {
+  type: 'line',
+  data: {
+    datasets: []
+  },
+  options: {
+    responsive: true,
+    maintainAspectRatio: false,
+    plugins: {
+      legend: {
+        display: false
+      },
+      tooltip: {
+        enabled: true,
+        intersect: false,
+        mode: 'nearest',
+        position: 'nearest'
+      }
+    },
+    scales: {
+      x: {
+        type: 'time',
+        time: {
+          tooltipFormat: 'HH:mm:ss',
+          unit: 'minute'
+        },
+        ticks: {
+          color: 'white'
+        }
+      },
+      y: {
+        title: {
+          display: true,
+          color: 'white',
+          text: ''
+        },
+        ticks: {
+          color: 'white'
+        }
+      }
+    }
+  }
+});
+
+function getDataset(minionId) {
+  let dataset = sensorChart.data.datasets.find(ds => ds.label === minionId);
+  if (!dataset) {
+    const machineType = minionId.split('-')[0];
+    dataset = {
+      label: minionId,
+      data: [],
+      pointRadius: 0,
+      pointHoverRadius: 0,
+      borderColor: machineColors[machineType] || 'rgba(128, 128, 128, 1)',
+      borderDash: dashStyles[machineType] || [],
+      fill: false
+    };
+    sensorChart.data.datasets.push(dataset);
+  }
+  return dataset;
+}
+
+function setUnit(unit) {
+  sensorChart.options.scales.y.title.text = unit ? `${currentSensor} (${unit})` : currentSensor;
+}
+
+async function loadTrend() {
+  try {
+    const since = Date.now() / 1000 - historySeconds;
+    const response = await fetch(`${trendEndpoint(currentSensor)}?since=${since}`);
+    if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
+    const trend = await response.json();
+
+    sensorChart.data.datasets = [];
+    Object.entries(trend.nodes).forEach(([minionId, samples]) => {
+      getDataset(minionId).data = samples.map(([time, value]) => ({ x: time * 1000, y: value }));
+    });
+    setUnit(trend.unit);
+    sensorChart.update();
+  } catch (error) {
+    console.error('Failed to fetch trend:', error);
+  }
+}
+
+function updateSensorList(sensors) {
+  Object.keys(sensors).forEach(sensor => {
+    if (![...sensorSelect.options].some(option => option.value === sensor)) {
+      sensorSelect.add(new Option(sensor, sensor));
+    }
+  });
+}
+
+async function fetchAndUpdate() {
+  try {
+    const response = await fetch(sensorsEndpoint);
+    if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
+    const data = await response.json();
+    const currentTime = Date.now();
+    const oldest = currentTime - historySeconds * 1000;
+
+    updateSensorList(data.sensors);
+    setUnit(data.sensors[currentSensor]);
+    Object.entries(data.nodes).forEach(([minionId, readings]) => {
+      const reading = readings[currentSensor];
+      if (!reading) return;
+      const dataset = getDataset(minionId);
+      dataset.data.push({ x: currentTime, y: reading.value });
+      while (dataset.data.length && dataset.data[0].x < oldest) {
+        dataset.data.shift();
+      }
+    });
+    sensorChart.update();
+  } catch (error) {
+    console.error('Failed to fetch data:', error);
+  }
+}
+
+sensorSelect.addEventListener('change', () => {
+  currentSensor = sensorSelect.value;
+  history.replaceState(null, '', `/saltstack/sensors?sensor=${encodeURIComponent(currentSensor)}`);
+  loadTrend();
+});
+
+document.getElementById('all').addEventListener('click', showAll);
+document.getElementById('storage').addEventListener('click', () => filterChart('storage-'));
+document.getElementById('compute').addEventListener('click', () => filterChart('compute-'));
+document.getElementById('controller').addEventListener('click', () => filterChart('controller-'));
+document.getElementById('controller_v2').addEventListener('click', () => filterChart('controllerv2-'));
+
+function filterChart(type) {
+  sensorChart.data.datasets.forEach(dataset => {
+    dataset.hidden = !dataset.label.startsWith(type);
+  });
+  sensorChart.update();
+}
+
+function showAll() {
+  sensorChart.data.datasets.forEach(dataset => {
+    dataset.hidden = false;
+  });
+  sensorChart.update();
+}
+
+const alertList = document.getElementById('alerts');
+const activeAlerts = {};
+
+function alertKey(alert) {
+  return `${alert.node}/${alert.sensor}/${alert.kind}`;
+}
+
+function renderAlerts() {
+  alertList.replaceChildren(...Object.values(activeAlerts).map(alert => {
+    const item = document.createElement('li');
+    const detail = alert.kind === 'threshold'
+      ? `above ${alert.limit} ${alert.unit}`
+      : `${alert.sigma} sigma from ${alert.mean} ${alert.unit}`;
+    item.textContent = `${alert.node} ${alert.sensor}: ${alert.value} ${alert.unit} (${detail})`;
+    return item;
+  }));
+}
+
+const alertSource = new EventSource(alertsStream);
+alertSource.addEventListener('active', event => {
+  Object.keys(activeAlerts).forEach(key => delete activeAlerts[key]);
+  JSON.parse(event.data).forEach(alert => { activeAlerts[alertKey(alert)] = alert; });
+  renderAlerts();
+});
+alertSource.addEventListener('raised', event => {
+  const alert = JSON.parse(event.data);
+  activeAlerts[alertKey(alert)] = alert;
+  renderAlerts();
+});
+alertSource.addEventListener('cleared', event => {
+  delete activeAlerts[alertKey(JSON.parse(event.data))];
+  renderAlerts();
+});
+
+
+loadTrend();
+setInterval(fetchAndUpdate, updateInterval);
@@ -0,0 +1,373 @@
+"""
+Opt-in request profiling for the Range Monitor application.
+
+A profile is a tree of timed spans (route -> plugin data function ->
+SQLite query / template render / upstream HTTP call / JSON encoding).
+Profiling is enabled per request with the 'X-Profile' header, honored for
+logged in users only, per session with the admin toggle, or for a random
+sample of requests through PROFILE_SAMPLE_RATE. Only logged in users get
+the profile headers of their responses.
+"""
+
+import functools
+import random
+import sqlite3
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock
+from urllib.parse import urlsplit
+
+import requests
+from flask import (
+    current_app, g, request, session, template_rendered, before_render_template
+)
+
+_current_span = ContextVar('current_span', default=None)
+
+_profiles = OrderedDict()
+_profiles_lock = Lock()
+
+
+class Span:
+    """
+    A single timed operation inside a profile.
+
+    Parameters:
+        name (str): The name of the operation.
+        kind (str): The kind of operation ('route', 'function', 'sql',
+            'template', 'http' or 'serialize').
+    """
+
+    def __init__(self, name: str, kind: str):
+        self.name = name
+        self.kind = kind
+        self.start = time.perf_counter()
+        self.end = None
+        self.children = []
+
+    @property
+    def duration_ms(self) -> float:
+        """
+        Returns the duration of the span in milliseconds.
+        """
+        end = self.end if self.end is not None else time.perf_counter()
+        return (end - self.start) * 1000
+
+    def count(self, kind: str) -> int:
+        """
+        Counts the spans of the given kind below this span.
+
+        Parameters:
+            kind (str): The kind of span to count.
+
+        Returns:
+            int: The number of matching descendant spans.
+        """
+        return sum(
+            (child.kind == kind) + child.count(kind)
+            for child in self.children
+        )
+
+    def total(self, kind: str) -> float:
+        """
+        Sums the duration of the outermost spans of the given kind below
+        this span.
+
+        Parameters:
+            kind (str): The kind of span to sum.
+
+        Returns:
+            float: The total duration in milliseconds.
+        """
+        return sum(
+            child.duration_ms if child.kind == kind else child.total(kind)
+            for child in self.children
+        )
+
+    def to_dict(self, origin: float = None) -> dict:
+        """
+        Converts the span tree into a JSON serializable dictionary.
+
+        Parameters:
+            origin (float, optional): The start time of the root span.
+
+        Returns:
+            dict: The span and its children.
+        """
+        origin = self.start if origin is None else origin
+        return {
+            'name': self.name,
+            'kind': self.kind,
+            'offset_ms': round((self.start - origin) * 1000, 3),
+            'duration_ms': round(self.duration_ms, 3),
+            'children': [child.to_dict(origin) for child in self.children],
+        }
+
+
+@contextmanager
+def span(name: str, kind: str = 'function'):
+    """
+    Times the enclosed block as a child of the current span.
+
+    Does nothing when the current request is not being profiled.
+
+    Parameters:
+        name (str): The name of the operation.
+        kind (str): The kind of operation.
+    """
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+
+    child = Span(name, kind)
+    parent.children.append(child)
+    token = _current_span.set(child)
+    try:
+        yield child
+    finally:
+        child.end = time.perf_counter()
+        _current_span.reset(token)
+
+
+def traced(func):
+    """
+    Decorator that records a span for every call of the wrapped function
+    while the current request is being profiled.
+
+    Parameters:
+        func: The function to be wrapped.
+
+    Returns:
+        The wrapped function.
+    """
+    name = f"{func.__module__.rsplit('.', 1)[-1]}.{func.__qualname__}"
+
+    @functools.wraps(func)
+    def wrapped(*args, **kwargs):
+        if _current_span.get() is None:
+            return func(*args, **kwargs)
+        with span(name):
+            return func(*args, **kwargs)
+
+    return wrapped
+
+
+def is_active() -> bool:
+    """
+    Returns True if the current request is being profiled.
+    """
+    return _current_span.get() is not None
+
+
+def list_profiles() -> list:
+    """
+    Lists the stored profiles, oldest first.
+
+    Returns:
+        list: The stored profiles.
+    """
+    with _profiles_lock:
+        return list(_profiles.values())
+
+
+def get_profile(profile_id: str):
+    """
+    Retrieves a stored profile.
+
+    Parameters:
+        profile_id (str): The identifier of the profile.
+
+    Returns:
+        dict: The stored profile or None if it was evicted or never existed.
+    """
+    with _profiles_lock:
+        return _profiles.get(profile_id)
+
+
+def _store_profile(profile_id: str, profile: dict):
+    """
+    Stores a finished profile, evicting the oldest ones past PROFILE_HISTORY.
+    """
+    limit = current_app.config['PROFILE_HISTORY']
+    with _profiles_lock:
+        _profiles[profile_id] = profile
+        while len(_profiles) > limit:
+            _profiles.popitem(last=False)
+
+
+def _logged_in() -> bool:
+    """
+    Returns True if the current request comes from a logged in user,
+    loading the user ahead of the auth blueprint when needed.
+    """
+    if 'user' not in g:
+        from .auth import load_logged_in_user
+        load_logged_in_user()
+    return g.user is not None
+
+
+def _should_profile() -> bool:
+    """
+    Decides whether the current request should be profiled.
+    """
+    if session.get('profile'):
+        return True
+    if request.headers.get('X-Profile', '').lower() in ('1', 'true', 'yes'):
+        # any client can send the header, only logged in users are profiled
+        return _logged_in()
+    sample_rate = current_app.config['PROFILE_SAMPLE_RATE']
+    return sample_rate > 0 and random.random() < sample_rate
+
+
+def _start_profile():
+    """
+    Opens the root span of the request when profiling is enabled.
+    """
+    if not current_app.config['PROFILE_ENABLED'] or not _should_profile():
+        return
+    root = Span(request.endpoint or request.path, 'route')
+    g.profile_root = root
+    _current_span.set(root)
+
+
+def _finish_profile(response):
+    """
+    Closes the root span, stores the profile and exposes it in the
+    response headers.
+    """
+    root = g.pop('profile_root', None)
+    if root is None:
+        return response
+
+    _current_span.set(None)
+    root.end = time.perf_counter()
+
+    profile_id = uuid.uuid4().hex
+    _store_profile(profile_id, {
+        'id': profile_id,
+        'method': request.method,
+        'path': request.full_path.rstrip('?'),
+        'status': response.status_code,
+        'created': time.time(),
+        'spans': root.to_dict(),
+    })
+
+    if not _logged_in():
+        # sampled anonymous requests are stored without exposing timings
+        return response
+    response.headers['X-Profile-Id'] = profile_id
+    response.headers['X-Upstream-Calls'] = str(root.count('http'))
+    response.headers['Server-Timing'] = ', '.join(
+        f"{kind};dur={root.total(kind):.3f}"
+        for kind in ('http', 'sql', 'template', 'serialize')
+    ) + f", total;dur={root.duration_ms:.3f}"
+    return response
+
+
+def _discard_profile(exc=None):
+    """
+    Drops the profile of a request that never produced a response.
+    """
+    if g.pop('profile_root', None) is not None:
+        _current_span.set(None)
+
+
+def _template_started(sender, template, context, **extra):
+    """
+    Opens a span when Jinja starts rendering a template.
+    """
+    parent = _current_span.get()
+    if parent is None:
+        return
+    child = Span(template.name or 'template', 'template')
+    parent.children.append(child)
+    g.setdefault('profile_templates', []).append(
+        (child, _current_span.set(child))
+    )
+
+
+def _template_finished(sender, template, context, **extra):
+    """
+    Closes the span opened by _template_started.
+    """
+    pending = g.get('profile_templates')
+    if not pending:
+        return
+    child, token = pending.pop()
+    child.end = time.perf_counter()
+    _current_span.reset(token)
+
+
+def _patch_requests():
+    """
+    Wraps requests.Session.send so that every upstream HTTP call made by
+    the plugins (guacamole, salt-api, openstacksdk) is recorded as a span.
+    """
+    send = requests.Session.send
+    if getattr(send, '_profiled', False):
+        return
+
+    @functools.wraps(send)
+    def profiled_send(self, req, **kwargs):
+        if _current_span.get() is None:
+            return send(self, req, **kwargs)
+        url = urlsplit(req.url)
+        with span(f"{req.method} {url.netloc}{url.path}", 'http'):
+            return send(self, req, **kwargs)
+
+    profiled_send._profiled = True
+    requests.Session.send = profiled_send
+
+
+def init_app(app):
+    """
+    Registers the profiling hooks on the app.
+
+    Parameters:
+        app (object): The Flask app instance.
+
+    Returns:
+        None
+    """
+    app.config.setdefault('PROFILE_ENABLED', True)
+    app.config.setdefault('PROFILE_SAMPLE_RATE', 0.0)
+    app.config.setdefault('PROFILE_HISTORY', 100)
+
+    app.before_request(_start_profile)
+    app.after_request(_finish_profile)
+    app.teardown_request(_discard_profile)
+    before_render_template.connect(_template_started, app)
+    template_rendered.connect(_template_finished, app)
+    _patch_requests()
+
+
+class ProfiledConnection(sqlite3.Connection):
+    """
+    SQLite connection that records a span for every statement executed
+    while the current request is being profiled.
+    """
+
+    def execute(self, sql, parameters=(), /):
+        if not is_active():
+            # skip normalizing the statement when nothing records it
+            return super().execute(sql, parameters)
+        with span(' '.join(sql.split())[:80], 'sql'):
+            return super().execute(sql, parameters)
+
+    def executemany(self, sql, parameters, /):
+        if not is_active():
+            return super().executemany(sql, parameters)
+        with span(' '.join(sql.split())[:80], 'sql'):
+            return super().executemany(sql, parameters)
+
+    def executescript(self, sql_script, /):
+        with span('executescript', 'sql'):
+            return super().executescript(sql_script)
+
+    def commit(self):
+        with span('COMMIT', 'sql'):
+            return super().commit()
@@ -0,0 +1,137 @@
+"""
+Compact records for the entities kept in snapshots.
+
+The plugins receive every connection, session, minion, server or network
+as a dictionary, and a snapshot holds thousands of them. A dictionary
+carries its own hash table; a record keeps the fields its entity usually
+has in __slots__ and only falls back to a dictionary for the others.
+String values of the fields listed in INTERNED, repeated across most
+entities (protocols, usernames, roles, statuses), are interned so every
+record shares one copy.
+
+Records are mutable mappings, so code reading them as dictionaries keeps
+working, and are serialized as dictionaries by to_json and the JSON
+provider of the app (see responses).
+"""
+
+import sys
+from collections.abc import MutableMapping
+
+
+class Record(MutableMapping):
+    """
+    Base of the slotted records. Subclasses list their fields in __slots__
+    and the fields whose string values are interned in INTERNED.
+
+    A field that was never set is missing from the mapping, like a key
+    missing from the dictionary the record was built from.
+    """
+
+    __slots__ = ('_extra',)
+    INTERNED = frozenset()
+    FIELDS = frozenset()
+    _ORDER = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._ORDER = tuple(
+            field
+            for klass in reversed(cls.__mro__)
+            for field in klass.__dict__.get('__slots__', ())
+            if field != '_extra'
+        )
+        cls.FIELDS = frozenset(cls._ORDER)
+
+    def __init__(self, data: dict = None):
+        self._extra = None
+        for key, value in (data or {}).items():
+            self[key] = value
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        """
+        Builds a record from a dictionary of an upstream API.
+
+        Parameters:
+            data (dict): The entity.
+
+        Returns:
+            Record: The record.
+        """
+        return cls(data)
+
+    def __getitem__(self, key):
+        if key in self.FIELDS:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self._extra is not None and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key in self.FIELDS:
+            if key in self.INTERNED and type(value) is str:
+                value = sys.intern(value)
+            setattr(self, key, value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __delitem__(self, key):
+        if key in self.FIELDS:
+            try:
+                delattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        elif self._extra is not None and key in self._extra:
+            del self._extra[key]
+            if not self._extra:
+                self._extra = None
+        else:
+            raise KeyError(key)
+
+    def __iter__(self):
+        for field in self._ORDER:
+            if hasattr(self, field):
+                yield field
+        if self._extra is not None:
+            yield from self._extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self.to_dict()!r})'
+
+    def __reduce__(self):
+        return type(self), (self.to_dict(),)
+
+    def copy(self):
+        """
+        Returns:
+            Record: A shallow copy of the record.
+        """
+        return type(self)(self)
+
+    def to_dict(self) -> dict:
+        """
+        Returns:
+            dict: The fields of the record.
+        """
+        return dict(self.items())
+
+
+def to_json(obj):
+    """
+    Serializes records for json.dumps(default=to_json).
+
+    Raises:
+        TypeError: The object is not a record.
+    """
+    if isinstance(obj, Record):
+        return obj.to_dict()
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
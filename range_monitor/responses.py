@@ -0,0 +1,242 @@
+"""
+JSON responses of the '/api/*' routes.
+
+Every response is encoded by JSONProvider, which uses orjson when it is
+installed and the standard library otherwise, and serializes records as
+dictionaries. Routes serving snapshot data go through cached_json: the
+body is encoded once per version of the snapshots it is built from, kept
+with its gzip variant and served as is to every poller until a snapshot
+changes. Those responses carry a strong ETag derived from the version and
+the epoch of the snapshot store, so a poller sending it back in
+If-None-Match gets an empty 304 until the data changes, including across
+restarts, which start a new epoch.
+
+The time spent encoding is recorded per endpoint in the 'serialize' spans
+of request profiles and in the counters listed under /debug/responses.
+"""
+
+import gzip
+import hashlib
+import json
+import time
+from threading import Lock
+from flask import current_app, has_request_context, request
+from flask.json.provider import DefaultJSONProvider
+from . import profiling
+from . import records
+from . import snapshots
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+response_cache = {}
+metrics = {}
+_lock = Lock()
+
+
+def record_metric(name: str, **counts):
+    """
+    Adds to the serialization counters of an endpoint.
+
+    Parameters:
+        name (str): The endpoint, or the name of the cached response.
+        counts: The amounts added to each counter.
+    """
+    with _lock:
+        counters = metrics.setdefault(name, {
+            'encoded': 0, 'encode_ms': 0.0, 'bytes': 0,
+            'cache_hits': 0, 'gzip_served': 0, 'not_modified': 0,
+        })
+        for counter, amount in counts.items():
+            counters[counter] += amount
+
+
+def encoder_name() -> str:
+    """
+    Returns:
+        str: The JSON encoder in use, 'orjson' or 'json'.
+    """
+    return 'orjson' if orjson is not None else 'json'
+
+
+class JSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider encoding with orjson when available, serializing
+    records as dictionaries and timing every encode.
+    """
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, records.Record):
+            return o.to_dict()
+        return DefaultJSONProvider.default(o)
+
+    def dumps(self, obj, **kwargs) -> str:
+        name = request.endpoint if has_request_context() else None
+        start = time.perf_counter()
+        with profiling.span(f'encode {encoder_name()}', 'serialize'):
+            body = self.encode(obj, **kwargs)
+        record_metric(
+            name or 'other', encoded=1, bytes=len(body),
+            encode_ms=(time.perf_counter() - start) * 1000,
+        )
+        return body
+
+    def encode(self, obj, **kwargs) -> str:
+        """
+        Encodes an object, falling back to the standard library for
+        arguments and values orjson does not support.
+        """
+        if orjson is not None and not kwargs:
+            option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+            if self.sort_keys:
+                option |= orjson.OPT_SORT_KEYS
+            try:
+                return orjson.dumps(obj, default=self.default, option=option).decode()
+            except TypeError:
+                # e.g. integers wider than 64 bits
+                pass
+        kwargs.setdefault('default', self.default)
+        kwargs.setdefault('ensure_ascii', self.ensure_ascii)
+        kwargs.setdefault('sort_keys', self.sort_keys)
+        return json.dumps(obj, **kwargs)
+
+
+def version_of(results: list) -> tuple:
+    """
+    Returns the version of data built from poll results.
+
+    Parameters:
+        results (list): The results of a federated poll, with the 'version'
+            of the snapshot each value comes from.
+
+    Returns:
+        tuple: Changes whenever a value or the status of a source changes.
+    """
+    return tuple(
+        tuple(
+            (key, value) for key, value in sorted(result.items())
+            if key != 'value'
+        )
+        for result in results
+    )
+
+
+def accepts_gzip() -> bool:
+    """
+    Returns:
+        bool: True if the client of the current request accepts gzip.
+    """
+    return request.accept_encodings['gzip'] > 0
+
+
+def etag_of(name: str, version) -> str:
+    """
+    Returns the strong ETag of a cached response.
+
+    Parameters:
+        name (str): The name of the response.
+        version: The version of the response, including the store epoch.
+
+    Returns:
+        str: The ETag, without quotes.
+    """
+    return hashlib.sha1(repr((name, version)).encode()).hexdigest()[:20]
+
+
+def cached_json(name: str, version, build):
+    """
+    Serves JSON encoded once per version.
+
+    Parameters:
+        name (str): The name of the response, e.g. 'guacamole.topology',
+            including anything besides the version it depends on.
+        version: Hashable version of the snapshots the data is built from.
+        build (callable): Returns the data, only called when the version
+            changed.
+
+    Returns:
+        Response: The JSON response, gzip compressed when accepted and
+            larger than RESPONSE_GZIP_MIN bytes, or 304 Not Modified when
+            If-None-Match holds its ETag.
+    """
+    # versions of a previous snapshot store mean nothing
+    version = (snapshots.store.epoch, version)
+    etag = etag_of(name, version)
+    response = current_app.response_class(mimetype='application/json')
+    response.vary.add('Accept-Encoding')
+    # the gzip variant is another representation, with its own ETag
+    for variant in (etag, f'{etag}-gzip'):
+        if request.if_none_match.contains_weak(variant):
+            record_metric(name, not_modified=1)
+            response.set_etag(variant)
+            response.status_code = 304
+            return response
+
+    with _lock:
+        cached = response_cache.get(name)
+    if cached is not None and cached['version'] == version:
+        record_metric(name, cache_hits=1)
+    else:
+        start = time.perf_counter()
+        with profiling.span(f'encode {name}', 'serialize'):
+            body = f'{current_app.json.encode(build())}\n'.encode()
+        record_metric(
+            name, encoded=1, bytes=len(body),
+            encode_ms=(time.perf_counter() - start) * 1000,
+        )
+        cached = {'version': version, 'body': body, 'gzip': None}
+        with _lock:
+            response_cache[name] = cached
+
+    body = cached['body']
+    if len(body) >= current_app.config['RESPONSE_GZIP_MIN'] and accepts_gzip():
+        if cached['gzip'] is None:
+            with profiling.span(f'gzip {name}', 'serialize'):
+                cached['gzip'] = gzip.compress(body, compresslevel=6)
+        body = cached['gzip']
+        etag = f'{etag}-gzip'
+        response.content_encoding = 'gzip'
+        record_metric(name, gzip_served=1)
+    response.set_etag(etag)
+    response.set_data(body)
+    return response
+
+
+def get_metrics() -> dict:
+    """
+    Returns:
+        dict: The encoder in use, the counters by endpoint or response
+            name, and the sizes of every cached response.
+    """
+    with _lock:
+        return {
+            'encoder': encoder_name(),
+            'metrics': {
+                name: dict(counters, encode_ms=round(counters['encode_ms'], 3))
+                for name, counters in metrics.items()
+            },
+            'cached': {
+                name: {
+                    'bytes': len(cached['body']),
+                    'gzip_bytes': len(cached['gzip']) if cached['gzip'] else None,
+                }
+                for name, cached in response_cache.items()
+            },
+        }
+
+
+def init_app(app):
+    """
+    Encodes the JSON responses of the app with JSONProvider.
+
+    Parameters:
+        app (object): The Flask app instance.
+
+    Returns:
+        None
+    """
+    app.config.setdefault('RESPONSE_GZIP_MIN', 1024)
+    app.json = JSONProvider(app)
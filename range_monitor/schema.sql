@@ -37,7 +37,8 @@ CREATE TABLE guacamole (
     username TEXT NOT NULL,
     password TEXT NOT NULL,
     datasource TEXT NOT NULL,
-    enabled BOOLEAN NOT NULL
+    enabled BOOLEAN NOT NULL,
+    timeout REAL NOT NULL DEFAULT 12
 );
 
 INSERT INTO guacamole (endpoint, username, password, datasource, enabled)
@@ -91,12 +92,3 @@ VALUES
   'Administrator',
   'hostname',
   1);
-
-CREATE TABLE IF NOT EXISTS salt_temp (
-  id INTEGER PRIMARY KEY AUTOINCREMENT,
-  hostname TEXT NOT NULL,
-  node TEXT NOT NULL,
-  sensor TEXT NOT NULL,
-  temp REAL NOT NULL,
-  time DATETTIME NOT NULL
-)
\ No newline at end of file
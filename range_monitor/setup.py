@@ -1,6 +1,7 @@
 from flask import Flask, send_from_directory, abort, flash
 from importlib import import_module
 import os
+import shutil
 
 
 def import_plugins(app: Flask):
@@ -14,7 +15,7 @@ def import_plugins(app: Flask):
     Returns:
     - None
     '''
-    print("=" * os.get_terminal_size().columns)
+    print("=" * shutil.get_terminal_size().columns)
     print("[*] Plugins [*] ")
     plugins_path = os.path.join(app.root_path, 'plugins')
     for plugin in os.listdir(plugins_path):
@@ -22,7 +23,7 @@ def import_plugins(app: Flask):
         bp = getattr(plugin_module, 'bp')
         app.register_blueprint(bp, url_prefix=f"/{plugin}")
         print(f"[*] Loaded plugin '{plugin}'")
-    print("=" * os.get_terminal_size().columns)
+    print("=" * shutil.get_terminal_size().columns)
 
 def share_components(app: Flask):
     @app.route('/shared/components/<path:filename>')
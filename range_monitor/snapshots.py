@@ -0,0 +1,410 @@
+"""
+Shared store of upstream data snapshots.
+
+A snapshot is the last value loaded for a (key, source) pair, e.g. the
+physical nodes of one salt master. Snapshots expire after a TTL; an
+expired snapshot is still served while a background thread reloads it,
+unless it is older than its max_stale age. Every change of a snapshot's
+value bumps its version, which lets callers reuse work derived from it.
+Versions are only comparable within one store, identified by its epoch.
+
+With SNAPSHOT_PERSIST, every new value is also written to SNAPSHOT_DIR as
+compressed JSON, one file per snapshot. At startup those files are loaded
+back as stale snapshots: those younger than their max_stale age are served
+right away and reloaded in the background on first use, so dashboards
+render after a restart while the collectors catch up, older ones are
+reloaded first. Keys registered with never_persist, e.g. values holding
+credentials, are only kept in memory.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+import zlib
+from concurrent.futures import Future
+from flask import current_app
+from . import records
+
+# keys whose snapshots are never written to disk
+transient_keys = set()
+
+
+class Snapshot:
+    """
+    A loaded value and when it was loaded.
+
+    Parameters:
+        key (str): The name of the data, e.g. 'salt.physical_nodes'.
+        source (str): The data source the value was loaded from.
+        value: The loaded value.
+        version (int): Bumped every time the value changes.
+        loaded (float): When the value was loaded, in seconds since the epoch.
+        stale (bool): Restored from disk and not reloaded since.
+    """
+
+    def __init__(self, key: str, source: str, value, version: int,
+                 loaded: float, stale: bool = False):
+        self.key = key
+        self.source = source
+        self.value = value
+        self.version = version
+        self.loaded = loaded
+        self.stale = stale
+
+    def age(self) -> float:
+        """
+        Returns:
+            float: The seconds since the value was loaded.
+        """
+        return time.time() - self.loaded
+
+
+class SnapshotStore:
+    """
+    Thread-safe store of snapshots keyed by (key, source). Its epoch is
+    unique to the store, versions restart with every new store.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshots = {}
+        self._refreshing = set()
+        self._loading = {}
+        self._versions = 0
+        self.directory = None
+        self.epoch = uuid.uuid4().hex[:12]
+
+    def peek(self, key: str, source: str):
+        """
+        Returns the stored snapshot without loading or refreshing it.
+
+        Parameters:
+            key (str): The name of the data.
+            source (str): The data source.
+
+        Returns:
+            Snapshot: The snapshot, None if nothing is stored.
+        """
+        with self._lock:
+            return self._snapshots.get((key, source))
+
+    def put(self, key: str, source: str, value, loaded: float = None) -> Snapshot:
+        """
+        Stores a value, bumping the version only if it changed.
+
+        Parameters:
+            key (str): The name of the data.
+            source (str): The data source.
+            value: The loaded value.
+            loaded (float, optional): When it was loaded, defaults to now.
+
+        Returns:
+            Snapshot: The stored snapshot.
+        """
+        loaded = time.time() if loaded is None else loaded
+        with self._lock:
+            current = self._snapshots.get((key, source))
+            if current is not None and current.value == value:
+                version = current.version
+            else:
+                self._versions += 1
+                version = self._versions
+            snapshot = Snapshot(key, source, value, version, loaded)
+            self._snapshots[(key, source)] = snapshot
+        if self.directory is not None and key not in transient_keys and (
+                current is None or current.version != version or current.stale):
+            self.save(snapshot)
+        return snapshot
+
+    def never_persist(self, key: str):
+        """
+        Keeps the snapshots of a key in memory only, in every store,
+        dropping the ones already restored or persisted.
+
+        Parameters:
+            key (str): The name of the data.
+        """
+        transient_keys.add(key)
+        with self._lock:
+            dropped = [
+                pair for pair, snapshot in self._snapshots.items()
+                if pair[0] == key and snapshot.stale
+            ]
+            for pair in dropped:
+                del self._snapshots[pair]
+        if self.directory is None:
+            return
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json.z'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                with open(path, 'rb') as persisted:
+                    if json.loads(zlib.decompress(persisted.read()))['key'] == key:
+                        os.remove(path)
+            except (OSError, ValueError, KeyError, zlib.error) as e:
+                print(f"Unable to check snapshot {name}:", e)
+
+    def path_of(self, key: str, source: str) -> str:
+        """
+        Returns the file of a snapshot in the persistence directory.
+        """
+        name = hashlib.sha1(f'{key}\0{source}'.encode()).hexdigest()
+        return os.path.join(self.directory, f'{name}.json.z')
+
+    def save(self, snapshot: Snapshot):
+        """
+        Writes a snapshot to the persistence directory, replacing the
+        previous file atomically. Records are persisted as dictionaries,
+        other values that are not JSON serializable are not persisted.
+
+        Parameters:
+            snapshot (Snapshot): The snapshot.
+        """
+        try:
+            data = zlib.compress(json.dumps({
+                'key': snapshot.key,
+                'source': snapshot.source,
+                'loaded': snapshot.loaded,
+                'value': snapshot.value,
+            }, separators=(',', ':'), default=records.to_json).encode())
+        except (TypeError, ValueError) as e:
+            print(f"Unable to persist snapshot {snapshot.key} of {snapshot.source}:", e)
+            return
+        try:
+            fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as temp_file:
+                temp_file.write(data)
+            os.replace(temp_path, self.path_of(snapshot.key, snapshot.source))
+        except OSError as e:
+            print(f"Unable to persist snapshot {snapshot.key} of {snapshot.source}:", e)
+
+    def restore(self, directory: str, max_age: float) -> int:
+        """
+        Persists the snapshots to a directory from now on and loads the
+        ones it holds as stale snapshots.
+
+        Parameters:
+            directory (str): The persistence directory.
+            max_age (float): Seconds after which a persisted snapshot is
+                dropped instead of loaded.
+
+        Returns:
+            int: The number of loaded snapshots.
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        restored = 0
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if not name.endswith('.json.z'):
+                continue
+            try:
+                with open(path, 'rb') as persisted:
+                    data = json.loads(zlib.decompress(persisted.read()))
+            except (OSError, ValueError, zlib.error) as e:
+                print(f"Unable to restore snapshot {name}:", e)
+                continue
+            if time.time() - data['loaded'] > max_age or data['key'] in transient_keys:
+                os.remove(path)
+                continue
+            with self._lock:
+                pair = (data['key'], data['source'])
+                if pair in self._snapshots:
+                    continue
+                self._versions += 1
+                self._snapshots[pair] = Snapshot(
+                    data['key'], data['source'], data['value'],
+                    self._versions, data['loaded'], stale=True
+                )
+            restored += 1
+        return restored
+
+    def get(self, key: str, source: str, loader, ttl: float,
+            max_stale: float = None) -> Snapshot:
+        """
+        Returns the snapshot of a key, loading it when missing or too old.
+
+        A snapshot older than ttl is returned as is while it is reloaded in
+        the background, a snapshot older than max_stale is reloaded first.
+        Exceptions raised by the loader propagate on synchronous loads and
+        leave the previous snapshot in place on background ones.
+
+        Parameters:
+            key (str): The name of the data.
+            source (str): The data source.
+            loader (callable): Called with the source to load the value.
+            ttl (float): Seconds a snapshot is fresh.
+            max_stale (float, optional): Seconds after which a stale
+                snapshot is not served anymore, defaults to 10 * ttl.
+
+        Returns:
+            Snapshot: The snapshot.
+        """
+        max_stale = ttl * 10 if max_stale is None else max_stale
+        snapshot = self.peek(key, source)
+        if snapshot is not None:
+            background = current_app.config.get('SNAPSHOT_BACKGROUND_REFRESH', True)
+            age = snapshot.age()
+            if age < ttl and not snapshot.stale:
+                return snapshot
+            # expired or restored at startup, served until the reload
+            # unless older than max_stale
+            if age < max_stale and background:
+                self.refresh_async(key, source, loader)
+                return snapshot
+        return self.put(key, source, loader(source))
+
+    def refresh_async(self, key: str, source: str, loader):
+        """
+        Reloads a snapshot in a background thread, at most one per key.
+
+        Parameters:
+            key (str): The name of the data.
+            source (str): The data source.
+            loader (callable): Called with the source to load the value.
+        """
+        with self._lock:
+            if (key, source) in self._refreshing:
+                return
+            self._refreshing.add((key, source))
+
+        app = current_app._get_current_object()
+
+        def refresh():
+            try:
+                with app.app_context():
+                    self.put(key, source, loader(source))
+            except Exception as e:
+                print(f"Unable to refresh snapshot {key} of {source}:", e)
+            finally:
+                with self._lock:
+                    self._refreshing.discard((key, source))
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+    def load_async(self, key: str, source: str, loader, ttl: float = 0) -> Future:
+        """
+        Returns a future of the snapshot of a key, loading it in a
+        background thread when missing, older than ttl or restored from
+        disk. Concurrent callers share one load per key and source, so a
+        hung source holds a single thread however often it is polled.
+
+        Parameters:
+            key (str): The name of the data.
+            source (str): The data source.
+            loader (callable): Called with the source to load the value.
+            ttl (float, optional): Seconds a snapshot is fresh.
+
+        Returns:
+            Future: Resolves to the snapshot, or to the exception raised by
+                the loader.
+        """
+        snapshot = self.peek(key, source)
+        if snapshot is not None and not snapshot.stale and snapshot.age() < ttl:
+            future = Future()
+            future.set_result(snapshot)
+            return future
+
+        with self._lock:
+            future = self._loading.get((key, source))
+            if future is not None:
+                return future
+            future = self._loading[(key, source)] = Future()
+
+        app = current_app._get_current_object()
+
+        def load():
+            try:
+                with app.app_context():
+                    snapshot = self.put(key, source, loader(source))
+            except Exception as e:
+                with self._lock:
+                    self._loading.pop((key, source), None)
+                future.set_exception(e)
+            else:
+                with self._lock:
+                    self._loading.pop((key, source), None)
+                future.set_result(snapshot)
+
+        threading.Thread(target=load, daemon=True).start()
+        return future
+
+    def invalidate(self, key: str = None, source: str = None) -> int:
+        """
+        Drops snapshots so they are loaded again on next use.
+
+        Parameters:
+            key (str, optional): Only snapshots of this key.
+            source (str, optional): Only snapshots of this data source.
+
+        Returns:
+            int: The number of dropped snapshots.
+        """
+        with self._lock:
+            dropped = [
+                pair for pair in self._snapshots
+                if (key is None or pair[0] == key)
+                and (source is None or pair[1] == source)
+            ]
+            for pair in dropped:
+                del self._snapshots[pair]
+            return len(dropped)
+
+    def list(self) -> list:
+        """
+        Returns:
+            list: The stored snapshots.
+        """
+        with self._lock:
+            return list(self._snapshots.values())
+
+
+store = SnapshotStore()
+
+
+def get(key: str, source: str, loader, ttl: float, max_stale: float = None) -> Snapshot:
+    """
+    Returns a snapshot from the shared store, see SnapshotStore.get.
+    """
+    return store.get(key, source, loader, ttl, max_stale)
+
+
+def never_persist(key: str):
+    """
+    Keeps a key of the shared store in memory only, see
+    SnapshotStore.never_persist.
+    """
+    store.never_persist(key)
+
+
+def invalidate(key: str = None, source: str = None) -> int:
+    """
+    Drops snapshots from the shared store, see SnapshotStore.invalidate.
+    """
+    return store.invalidate(key, source)
+
+
+def init_app(app):
+    """
+    Restores the persisted snapshots when SNAPSHOT_PERSIST is enabled, the
+    default outside of testing.
+
+    Parameters:
+        app (object): The Flask app instance.
+
+    Returns:
+        None
+    """
+    app.config.setdefault('SNAPSHOT_PERSIST', not app.testing)
+    app.config.setdefault('SNAPSHOT_DIR', os.path.join(app.instance_path, 'snapshots'))
+    app.config.setdefault('SNAPSHOT_MAX_AGE', 86400)
+    if app.config['SNAPSHOT_PERSIST']:
+        store.restore(app.config['SNAPSHOT_DIR'], app.config['SNAPSHOT_MAX_AGE'])
+    else:
+        # the store is shared by every app of the process
+        store.directory = None
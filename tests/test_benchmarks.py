@@ -0,0 +1,60 @@
+from benchmarks import memory, run
+
+
+def test_percentile():
+    """
+    Test the interpolated percentile used by the benchmark summaries.
+
+    Returns:
+        None
+    """
+    assert run.percentile([4, 1, 3, 2], 50) == 2.5
+    assert run.percentile([1, 2, 3], 100) == 3
+    assert run.percentile([], 95) == 0.0
+
+
+def test_compare_flags_regressions():
+    """
+    Test that only benchmarks slower than the threshold are reported.
+
+    Returns:
+        None
+    """
+    baseline = {'a': {'p50_ms': 10.0}, 'b': {'p50_ms': 10.0}}
+    results = {'a': {'p50_ms': 11.0}, 'b': {'p50_ms': 13.0}, 'c': {'p50_ms': 1}}
+    assert run.compare(results, baseline, 0.2) == [('b', 10.0, 13.0)]
+
+
+def test_suite_smoke(tmp_path):
+    """
+    Test that the whole suite runs against the stub servers at a tiny scale.
+
+    Args:
+        tmp_path: The pytest temporary directory.
+
+    Returns:
+        None
+    """
+    exit_code = run.main([
+        '--connections', '10', '--minions', '7', '--jobs', '20',
+        '--instances', '5', '--history-rows', '50',
+        '--job-rows', '50',
+        '--iterations', '1', '--warmup', '0',
+        '--output', str(tmp_path),
+    ])
+    assert exit_code == 0
+    assert len(list(tmp_path.iterdir())) == 1
+
+
+def test_memory_smoke():
+    """
+    Test that every kind of entity is measured and kept smaller as a
+    record than as a dictionary.
+
+    Returns:
+        None
+    """
+    results = memory.measure(200)
+    assert set(results) == set(memory.entity_kinds())
+    for stats in results.values():
+        assert stats['record_bytes'] < stats['dict_bytes']
@@ -1,6 +1,7 @@
 import sqlite3
 
 import pytest
+from range_monitor import create_app
 from range_monitor.db import get_db
 
 
@@ -51,3 +52,84 @@ def test_init_db_command(runner, monkeypatch):
     result = runner.invoke(args=['init-db'])
     assert 'Initialized' in result.output
     assert Recorder.called
+
+
+def test_migrate_on_startup(app):
+    """
+    Test that tables added after the database was created are created on
+    startup without touching the existing data.
+
+    Parameters:
+        app (object): The Flask application object.
+
+    Returns:
+        None
+    """
+    with app.app_context():
+        db = get_db()
+        db.executescript('DROP TABLE salt_jobs; DROP TABLE guac_history;')
+        users = db.execute('SELECT COUNT(*) FROM user').fetchone()[0]
+
+    create_app({'TESTING': True, 'DATABASE': app.config['DATABASE']})
+
+    with app.app_context():
+        db = get_db()
+        assert db.execute('SELECT COUNT(*) FROM salt_jobs').fetchone()[0] == 0
+        assert db.execute('SELECT COUNT(*) FROM guac_history').fetchone()[0] == 0
+        assert db.execute('SELECT COUNT(*) FROM user').fetchone()[0] == users
+
+
+def test_migrate_adds_columns(app):
+    """
+    Test that columns added to existing tables are added on startup to a
+    database created before them.
+
+    Parameters:
+        app (object): The Flask application object.
+
+    Returns:
+        None
+    """
+    with app.app_context():
+        db = get_db()
+        db.executescript(
+            'ALTER TABLE guacamole DROP COLUMN timeout;'
+            'INSERT INTO guacamole (endpoint, username, password, datasource, enabled)'
+            " VALUES ('http://guac.test/', 'admin', 'admin', 'mysql', 1);"
+        )
+
+    create_app({'TESTING': True, 'DATABASE': app.config['DATABASE']})
+
+    with app.app_context():
+        rows = get_db().execute('SELECT timeout FROM guacamole').fetchall()
+        assert [row['timeout'] for row in rows] == [12, 12]
+
+
+def test_migrate_replaced_tables(app):
+    """
+    Test that the rows of the salt_temp table are moved to salt_sensors.
+
+    Parameters:
+        app (object): The Flask application object.
+
+    Returns:
+        None
+    """
+    with app.app_context():
+        get_db().executescript(
+            'CREATE TABLE salt_temp (id INTEGER PRIMARY KEY AUTOINCREMENT,'
+            ' hostname TEXT NOT NULL, node TEXT NOT NULL, sensor TEXT NOT NULL,'
+            ' temp REAL NOT NULL, time DATETTIME NOT NULL);'
+            "INSERT INTO salt_temp (hostname, node, sensor, temp, time)"
+            " VALUES ('salt', 'compute-1', 'cpu', 61, '2024-06-10 14:07:00');"
+        )
+
+    create_app({'TESTING': True, 'DATABASE': app.config['DATABASE']})
+
+    with app.app_context():
+        db = get_db()
+        rows = db.execute('SELECT sensor, unit, value, time FROM salt_sensors').fetchall()
+        assert [tuple(row) for row in rows] == [('cpu_temp', 'C', 61, 1718028420)]
+        assert db.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'salt_temp'"
+        ).fetchone() is None
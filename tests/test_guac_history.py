@@ -0,0 +1,231 @@
+import pytest
+from range_monitor.plugins.guacamole import guac_conn, guac_history, parse
+
+
+class FakeSession:
+    """
+    Stands in for 'guacamole.session', counting history requests.
+    """
+
+    def __init__(self, host='http://guac.test'):
+        self.host = host
+        self.history = [
+            {'connectionIdentifier': '1', 'connectionName': 'kali',
+             'username': 'alice', 'remoteHost': '10.0.0.1',
+             'startDate': 1000, 'endDate': 5000},
+            {'connectionIdentifier': '1', 'connectionName': 'kali',
+             'username': 'bob', 'remoteHost': '10.0.0.2',
+             'startDate': 2000, 'endDate': None},
+            {'connectionIdentifier': '2', 'connectionName': 'win',
+             'username': 'alice', 'remoteHost': '10.0.0.1',
+             'startDate': 3000, 'endDate': 4000},
+        ]
+        self.calls = 0
+
+    def list_history_connections(self):
+        self.calls += 1
+        return [dict(entry) for entry in self.history]
+
+    def list_active_connections(self):
+        self.calls += 1
+        return {
+            f'uuid-{index}': {
+                'connectionIdentifier': entry['connectionIdentifier'],
+                'username': entry['username'],
+                'startDate': entry['startDate'],
+            }
+            for index, entry in enumerate(self.history)
+            if entry['endDate'] is None
+        }
+
+    def detail_connection(self, identifier, option=None):
+        self.calls += 1
+        return [
+            {key: value for key, value in entry.items()
+             if key != 'connectionIdentifier'}
+            for entry in self.history
+            if entry['connectionIdentifier'] == str(identifier)
+        ]
+
+
+@pytest.fixture
+def gconn(app, monkeypatch):
+    fake = FakeSession()
+    # the recorded sessions are from 1970
+    app.config['GUAC_HISTORY_RETENTION'] = 100 * 365 * 86400
+    monkeypatch.setattr(guac_conn, 'guac_connect', lambda server_id=None: fake)
+    monkeypatch.setattr(guac_conn, 'list_servers',
+                        lambda: [{'id': 1, 'endpoint': fake.host}])
+    monkeypatch.setattr(guac_conn, 'connect', lambda guac_config: fake)
+    monkeypatch.setattr(guac_history, 'history_cache',
+                        {'last_ingest': {}, 'backfilled': set()})
+    return fake
+
+
+def test_history_ingest(app, gconn):
+    """
+    Test that history is ingested once per TTL and that open sessions
+    are updated once they end.
+
+    Args:
+        app: The Flask app.
+        gconn: The fake Guacamole session.
+
+    Returns:
+        None
+    """
+    with app.app_context():
+        history = guac_history.get_connection_history('1')
+        assert [entry['username'] for entry in history] == ['alice', 'bob']
+        assert history[1]['active']
+        calls = gconn.calls
+
+        guac_history.get_connection_history('1')
+        assert gconn.calls == calls
+
+        assert guac_history.get_watermark(gconn.host) == 2000
+        gconn.history[1]['endDate'] = 6000
+        guac_history.ingest(force=True)
+        history = guac_history.get_connection_history('1')
+        assert history[1]['endDate'] == 6000
+        assert guac_history.get_watermark(gconn.host) == 3000
+
+
+def test_history_queries(app, gconn):
+    """
+    Test the per-user totals and the concurrency series.
+
+    Args:
+        app: The Flask app.
+        gconn: The fake Guacamole session.
+
+    Returns:
+        None
+    """
+    gconn.history[1]['endDate'] = 6000
+    with app.app_context():
+        totals = guac_history.get_user_totals()
+        assert totals == [
+            {'username': 'alice', 'sessions': 2, 'total': 5000},
+            {'username': 'bob', 'sessions': 1, 'total': 4000},
+        ]
+        assert guac_history.get_concurrency() == [
+            [1000, 1], [2000, 2], [3000, 3], [4000, 2], [5000, 1], [6000, 0]
+        ]
+        assert guac_history.get_concurrency(since=2500, until=4500) == [
+            [2500, 2], [3000, 3], [4000, 2], [5000, 1], [6000, 0]
+        ]
+
+
+def test_history_routes(client, auth, gconn):
+    """
+    Test the history API routes.
+
+    Args:
+        client: The client object used to make HTTP requests.
+        auth: The authentication actions helper.
+        gconn: The fake Guacamole session.
+
+    Returns:
+        None
+    """
+    auth.login()
+    response = client.get('/guacamole/api/history/users?since=4500')
+    assert [row['username'] for row in response.get_json()] == ['bob', 'alice']
+    response = client.get('/guacamole/api/history/concurrency?connection=2')
+    assert response.get_json() == [[3000, 1], [4000, 0]]
+
+
+def test_format_history_sparse(gconn):
+    """
+    Test that the timeline holds one point per session and user, summed
+    per bucket when bucketed.
+
+    Args:
+        gconn: The fake Guacamole session.
+
+    Returns:
+        None
+    """
+    gconn.history[1]['endDate'] = 6000
+    dataset = parse.format_history(gconn.history)
+    assert dataset == {'datasets': [
+        {'label': 'alice', 'data': [{'x': 1000, 'y': 4000}, {'x': 3000, 'y': 1000}]},
+        {'label': 'bob', 'data': [{'x': 2000, 'y': 4000}]},
+    ]}
+
+    dataset = parse.format_history(gconn.history, bucket=5000)
+    assert dataset['datasets'][0]['data'] == [{'x': 0, 'y': 5000}]
+
+
+def test_history_closed_and_pruned(app, gconn):
+    """
+    Test that an open session missing from the active connections is
+    closed even once it dropped out of the history listing, releasing the
+    watermark, and that sessions past GUAC_HISTORY_RETENTION are deleted.
+
+    Args:
+        app: The Flask app.
+        gconn: The fake Guacamole session.
+
+    Returns:
+        None
+    """
+    with app.app_context():
+        guac_history.ingest(force=True)
+        assert guac_history.get_watermark(gconn.host) == 2000
+
+        bob = gconn.history.pop(1)
+        bob['endDate'] = 6000
+        guac_history.ingest(force=True)
+        assert guac_history.get_watermark(gconn.host) == 3000
+        totals = {row['username']: row for row in guac_history.get_user_totals()}
+        assert totals['bob']['total'] > 0
+
+        # bob's session was closed when found ended, the others in 1970
+        app.config['GUAC_HISTORY_RETENTION'] = 60
+        guac_history.ingest(force=True)
+        assert [row['username'] for row in guac_history.get_user_totals()] == ['bob']
+
+
+def test_history_servers(app, gconn, monkeypatch):
+    """
+    Test that totals and concurrency cover every server, that a namespaced
+    connection only matches its own server and that a server failing to
+    answer is served from the stored history.
+
+    Args:
+        app: The Flask app.
+        gconn: The fake Guacamole session of the first server.
+        monkeypatch: The pytest monkeypatch fixture.
+
+    Returns:
+        None
+    """
+    other = FakeSession('http://guac2.test')
+    other.history = [
+        {'connectionIdentifier': '1', 'connectionName': 'kali',
+         'username': 'carol', 'remoteHost': '10.0.1.1',
+         'startDate': 1500, 'endDate': 2500},
+    ]
+    sessions = {1: gconn, 2: other}
+    monkeypatch.setattr(guac_conn, 'list_servers', lambda: [
+        {'id': 1, 'endpoint': gconn.host}, {'id': 2, 'endpoint': other.host},
+    ])
+    monkeypatch.setattr(guac_conn, 'connect',
+                        lambda guac_config: sessions[guac_config['id']])
+    gconn.history[1]['endDate'] = 6000
+    with app.app_context():
+        totals = guac_history.get_user_totals()
+        assert [row['username'] for row in totals] == ['alice', 'bob', 'carol']
+        assert guac_history.get_concurrency(conn_identifier='2-1') == [[1500, 1], [2500, 0]]
+        assert guac_history.get_concurrency(conn_identifier='1') == [
+            [1000, 1], [2000, 2], [5000, 1], [6000, 0]
+        ]
+
+        def unreachable(guac_config):
+            raise ConnectionError('unreachable')
+
+        monkeypatch.setattr(guac_conn, 'connect', unreachable)
+        guac_history.history_cache['last_ingest'].clear()
+        assert guac_history.get_user_totals() == totals
@@ -0,0 +1,172 @@
+import time
+import pytest
+from range_monitor import snapshots
+from range_monitor.plugins.guacamole import guac_conn, guac_kill, guac_users
+
+
+class FakeSession:
+    """
+    Stands in for 'guacamole.session' with two teams of connections.
+    """
+
+    host = 'http://guac.test'
+    data_source = 'mysql'
+
+    def __init__(self):
+        self.tree = {
+            'identifier': 'ROOT',
+            'childConnectionGroups': [
+                {'identifier': '1', 'name': 'team-01',
+                 'childConnections': [{'identifier': '1'}, {'identifier': '2'}],
+                 'childConnectionGroups': [
+                     {'identifier': '3', 'name': 'team-01-dmz',
+                      'childConnections': [{'identifier': '5'}]},
+                 ]},
+                {'identifier': '2', 'name': 'team-02',
+                 'childConnections': [{'identifier': '3'}]},
+            ],
+        }
+        self.users = {
+            'alice': {'attributes': {'guac-organization': 'Red Team'}},
+            'bob': {'attributes': {'guac-organization': 'Blue Team'}},
+        }
+        self.active = {
+            f'uuid-{conn}-{user}': {'connectionIdentifier': conn, 'username': user}
+            for conn in ('1', '2', '3', '5')
+            for user in ('alice', 'bob')
+        }
+        self.tree_calls = 0
+        self.killed = []
+
+    def list_connection_group_connections(self):
+        self.tree_calls += 1
+        return self.tree
+
+    def list_active_connections(self):
+        return dict(self.active)
+
+    def list_users(self):
+        return self.users
+
+    def detail_user(self, username):
+        return self.users.get(username, {})
+
+    def kill_active_connections(self, uuids):
+        self.killed.append(list(uuids))
+        if 'uuid-3-bob' in uuids:
+            return {'message': 'Permission denied.'}
+        return ''
+
+
+@pytest.fixture
+def gconn(monkeypatch):
+    fake = FakeSession()
+    monkeypatch.setattr(guac_conn, 'guac_connect', lambda server_id=None: fake)
+    monkeypatch.setattr(guac_conn, 'list_servers', lambda: [{'id': 1}])
+    monkeypatch.setattr(guac_conn, 'connect', lambda guac_config: fake)
+    monkeypatch.setattr(snapshots, 'store', snapshots.SnapshotStore())
+    monkeypatch.setattr(guac_kill, 'kill_cache', {'indexes': {}, 'jobs': {}})
+    monkeypatch.setattr(guac_users, 'users_cache', {'directories': {}, 'indexes': {}})
+    return fake
+
+
+def test_resolve_sessions(app, gconn):
+    """
+    Test that groups include nested groups and that users and
+    organizations are matched, with the tree indexed once.
+
+    Args:
+        app: The Flask app.
+        gconn: The fake Guacamole session.
+
+    Returns:
+        None
+    """
+    with app.app_context():
+        assert guac_kill.get_group_index(gconn)['ROOT'] == {'1', '2', '3', '5'}
+        assert sorted(guac_kill.resolve_sessions(gconn, groups=['1'])) == [
+            'uuid-1-alice', 'uuid-1-bob', 'uuid-2-alice', 'uuid-2-bob',
+            'uuid-5-alice', 'uuid-5-bob',
+        ]
+        assert sorted(guac_kill.resolve_sessions(
+            gconn, connections=['3'], users=['alice']
+        )) == [
+            'uuid-1-alice', 'uuid-2-alice', 'uuid-3-alice', 'uuid-3-bob',
+            'uuid-5-alice',
+        ]
+        assert sorted(guac_kill.resolve_sessions(
+            gconn, organizations=['Blue Team']
+        )) == ['uuid-1-bob', 'uuid-2-bob', 'uuid-3-bob', 'uuid-5-bob']
+        assert gconn.tree_calls == 1
+
+
+def test_kill_sessions_progress(app, client, auth, gconn):
+    """
+    Test that a kill job runs in chunks, reports failed chunks and that
+    its progress can be polled.
+
+    Args:
+        app: The Flask app.
+        client: The test client.
+        auth: The authentication helper.
+        gconn: The fake Guacamole session.
+
+    Returns:
+        None
+    """
+    app.config['GUAC_KILL_CHUNK'] = 3
+    with app.app_context():
+        job = guac_kill.start_kill(groups=['ROOT'], wait=True)
+    assert sorted(len(chunk) for chunk in gconn.killed) == [2, 3, 3]
+    progress = job.to_dict()
+    assert progress['state'] == 'done'
+    assert progress['total'] == 8
+    assert progress['killed'] + progress['failed'] == 8
+    assert progress['failed'] in (2, 3)
+    assert progress['errors'] == ['Permission denied.']
+
+    auth.login()
+    response = client.post('/guacamole/api/kill-sessions', json={'users': ['alice']})
+    assert response.status_code == 202
+    job_id = response.get_json()['id']
+
+    for _ in range(100):
+        progress = client.get(f'/guacamole/api/kill-sessions/{job_id}').get_json()
+        if progress['state'] == 'done':
+            break
+        time.sleep(0.05)
+    assert progress['state'] == 'done'
+    assert (progress['total'], progress['killed']) == (4, 4)
+    assert client.get('/guacamole/api/kill-sessions/unknown').status_code == 404
+
+
+def test_kill_server_failure(app, gconn, monkeypatch):
+    """
+    Test that a server failing to resolve its sessions is reported in the
+    errors of the job while the sessions of the other server are killed.
+
+    Args:
+        app: The Flask app.
+        gconn: The fake Guacamole session.
+        monkeypatch: The pytest monkeypatch fixture.
+
+    Returns:
+        None
+    """
+    def connect(guac_config):
+        if guac_config['id'] == 2:
+            raise ConnectionError('unreachable')
+        return gconn
+
+    monkeypatch.setattr(guac_conn, 'list_servers', lambda: [
+        {'id': 1, 'endpoint': 'http://guac.test'},
+        {'id': 2, 'endpoint': 'http://guac2.test'},
+    ])
+    monkeypatch.setattr(guac_conn, 'connect', connect)
+    with app.app_context():
+        job = guac_kill.start_kill(users=['alice'], wait=True)
+    progress = job.to_dict()
+    assert progress['state'] == 'done'
+    assert (progress['resolving'], progress['total'], progress['killed']) == (0, 4, 4)
+    assert progress['errors'] == ['http://guac2.test: unreachable']
+    assert job.servers == [gconn]
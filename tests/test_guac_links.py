@@ -0,0 +1,96 @@
+from base64 import b64decode
+import pytest
+from range_monitor import snapshots
+from range_monitor.plugins.guacamole import guac_conn, guac_data
+
+
+class FakeSession:
+    """
+    Stands in for 'guacamole.session', counting active connection requests.
+    """
+
+    host = 'http://guac.test'
+    data_source = 'mysql'
+
+    def __init__(self):
+        self.active = {
+            'uuid-3': {'identifier': 'uuid-3', 'connectionIdentifier': '1',
+                       'username': 'bob', 'startDate': 3000},
+            'uuid-1': {'identifier': 'uuid-1', 'connectionIdentifier': '1',
+                       'username': 'alice', 'startDate': 1000},
+            'uuid-2': {'identifier': 'uuid-2', 'connectionIdentifier': '2',
+                       'username': 'carol', 'startDate': 2000},
+        }
+        self.calls = 0
+        self.killed = []
+
+    def list_active_connections(self):
+        self.calls += 1
+        return dict(self.active)
+
+    def kill_active_connections(self, uuids):
+        self.killed.extend(uuids)
+        for uuid in uuids:
+            self.active.pop(uuid, None)
+
+
+@pytest.fixture
+def gconn(monkeypatch):
+    fake = FakeSession()
+    monkeypatch.setattr(guac_conn, 'guac_connect', lambda server_id=None: fake)
+    monkeypatch.setattr(snapshots, 'store', snapshots.SnapshotStore())
+    monkeypatch.setattr(guac_data, 'links_cache', {'indexes': {}})
+    return fake
+
+
+def decode(client_id):
+    return b64decode(client_id + '=' * (-len(client_id) % 4)).decode().split('\u0000')
+
+
+def test_connection_link(app, gconn):
+    """
+    Test that links join the oldest session of active connections and the
+    connection of idle ones, from one active connections request.
+
+    Args:
+        app: The Flask app.
+        gconn: The fake Guacamole session.
+
+    Returns:
+        None
+    """
+    with app.app_context():
+        assert guac_data.get_active_ids() == {'1', '2'}
+        url = guac_data.get_connection_link(['1', '2', '7'])
+        assert gconn.calls == 1
+
+    assert url.startswith('http://guac.test/#/client/')
+    client_ids = url.rsplit('/', 1)[1].split('.')
+    assert [decode(client_id) for client_id in client_ids] == [
+        ['uuid-1', 'a', 'mysql'],
+        ['uuid-2', 'a', 'mysql'],
+        ['7', 'c', 'mysql'],
+    ]
+
+
+def test_kill_refreshes_links(app, gconn):
+    """
+    Test that killing sessions drops the active connections snapshot so
+    links point to the remaining sessions.
+
+    Args:
+        app: The Flask app.
+        gconn: The fake Guacamole session.
+
+    Returns:
+        None
+    """
+    with app.app_context():
+        first = guac_data.get_oldest_sessions(gconn)
+        assert guac_data.get_oldest_sessions(gconn) is first
+        assert first == {'1': 'uuid-1', '2': 'uuid-2'}
+
+        gconn.active.pop('uuid-1')
+        guac_data.kill_connection(['2'])
+        assert gconn.killed == ['uuid-2']
+        assert guac_data.get_oldest_sessions(gconn) == {'1': 'uuid-3'}
@@ -0,0 +1,221 @@
+import threading
+import time
+import pytest
+from range_monitor import snapshots
+from range_monitor.plugins.guacamole import guac_conn, guac_data, guac_servers
+
+
+class FakeSession:
+    """
+    Stands in for 'guacamole.session' of one server.
+    """
+
+    data_source = 'mysql'
+
+    def __init__(self, host):
+        self.host = host
+
+
+@pytest.fixture
+def servers(monkeypatch):
+    configs = [
+        {'id': 1, 'endpoint': 'http://guac-1.test', 'timeout': 12},
+        {'id': 2, 'endpoint': 'http://guac-2.test', 'timeout': 0.2},
+    ]
+    fakes = {config['id']: FakeSession(config['endpoint']) for config in configs}
+    monkeypatch.setattr(guac_conn, 'list_servers', lambda: configs)
+    monkeypatch.setattr(guac_conn, 'connect', lambda guac_config: fakes[guac_config['id']])
+    monkeypatch.setattr(
+        guac_conn, 'guac_connect',
+        lambda server_id=None: fakes.get(1 if server_id is None else int(server_id))
+    )
+    monkeypatch.setattr(snapshots, 'store', snapshots.SnapshotStore())
+    return fakes
+
+
+def test_identifiers():
+    """
+    Test that identifiers are namespaced with their server and split back,
+    plain identifiers having no server.
+
+    Returns:
+        None
+    """
+    assert guac_servers.namespace(2, 15) == '2-15'
+    assert guac_servers.split_identifier('2-15') == (2, '15')
+    assert guac_servers.split_identifier('15') == (None, '15')
+    assert guac_servers.group_by_server(['1-3', '2-4', '1-5', '6']) == {
+        1: ['3', '5'], 2: ['4'], None: ['6']
+    }
+
+
+def test_poll_serves_stale(app, servers):
+    """
+    Test that a server slower than its timeout does not delay the others
+    and that its last good value is served as stale.
+
+    Args:
+        app: The Flask app.
+        servers: The fake sessions by server id.
+
+    Returns:
+        None
+    """
+    release = threading.Event()
+
+    def answer(gconn):
+        if gconn.host == 'http://guac-2.test' and slow[0]:
+            release.wait(5)
+        return gconn.host
+
+    slow = [False]
+    app.config['GUAC_POLL_TTL'] = 0
+    with app.app_context():
+        results = guac_servers.poll('hosts', answer)
+        assert [result['value'] for result in results] == [
+            'http://guac-1.test', 'http://guac-2.test'
+        ]
+
+        slow[0] = True
+        results = guac_servers.poll('hosts', answer)
+        release.set()
+    assert results[0]['status'] == 'ok' and not results[0]['stale']
+    assert results[1]['status'] == 'timeout'
+    assert results[1]['stale']
+    assert results[1]['value'] == 'http://guac-2.test'
+
+
+def test_poll_shares_loads(app, servers):
+    """
+    Test that results are reused within GUAC_POLL_TTL and that polls of a
+    hung server wait on the load already in flight instead of starting
+    another one.
+
+    Args:
+        app: The Flask app.
+        servers: The fake sessions by server id.
+
+    Returns:
+        None
+    """
+    release = threading.Event()
+    calls = []
+
+    def answer(gconn):
+        calls.append(gconn.host)
+        if gconn.host == 'http://guac-2.test' and len(calls) > 2:
+            release.wait(5)
+        return gconn.host
+
+    with app.app_context():
+        guac_servers.poll('hosts', answer, ttl=60)
+        guac_servers.poll('hosts', answer, ttl=60)
+        assert len(calls) == 2
+
+        for _ in range(3):
+            results = guac_servers.poll('hosts', answer, ttl=0)
+        release.set()
+    assert calls.count('http://guac-2.test') == 2
+    assert calls.count('http://guac-1.test') == 4
+    assert results[1]['status'] == 'timeout'
+
+
+def test_topology_merged(app, servers, monkeypatch):
+    """
+    Test that the trees of every server are namespaced under one ROOT node
+    and that a failed server is reported without its nodes.
+
+    Args:
+        app: The Flask app.
+        servers: The fake sessions by server id.
+        monkeypatch: The pytest monkeypatch fixture.
+
+    Returns:
+        None
+    """
+    def server_topology(gconn):
+        if gconn.host == 'http://guac-2.test':
+            raise guac_data.GuacAPIError({'message': 'down'})
+        return [
+            {'identifier': 'ROOT', 'parentIdentifier': None, 'activeConnections': 2},
+            {'identifier': '4', 'parentIdentifier': 'ROOT'},
+        ]
+
+    monkeypatch.setattr(guac_servers, 'server_topology', server_topology)
+    with app.app_context():
+        topology = guac_servers.get_topology()
+    nodes = {node['identifier']: node for node in topology['nodes']}
+    assert nodes['1-ROOT']['parentIdentifier'] == 'ROOT'
+    assert nodes['1-4']['parentIdentifier'] == '1-ROOT'
+    assert nodes['ROOT']['activeConnections'] == 2
+    assert [server['status'] for server in topology['servers']] == ['ok', 'error']
+
+
+def test_actions_routed(app, servers, monkeypatch):
+    """
+    Test that kills and links go to the server owning each identifier.
+
+    Args:
+        app: The Flask app.
+        servers: The fake sessions by server id.
+        monkeypatch: The pytest monkeypatch fixture.
+
+    Returns:
+        None
+    """
+    monkeypatch.setattr(
+        guac_data, 'kill_connection',
+        lambda identifiers, gconn: [f'{gconn.host}/{i}' for i in identifiers]
+    )
+    monkeypatch.setattr(guac_data, 'get_token', lambda gconn: gconn.host)
+    monkeypatch.setattr(
+        guac_data, 'get_connection_link',
+        lambda identifiers, gconn: ','.join(identifiers)
+    )
+    with app.app_context():
+        assert sorted(guac_servers.kill_connections(['2-7', '1-3', '4'])) == [
+            'http://guac-1.test/3', 'http://guac-1.test/4', 'http://guac-2.test/7'
+        ]
+        links = guac_servers.get_links(['2-7', '2-8', '9-1'])
+    assert links == [{'server': 2, 'token': 'http://guac-2.test', 'url': '7,8'}]
+
+
+def test_poll_serves_restored(app, servers, monkeypatch, tmp_path):
+    """
+    Test that a result restored from disk is served without waiting for
+    a slow server, which refreshes it in the background.
+
+    Args:
+        app: The Flask app.
+        servers: The fake sessions by server id.
+        monkeypatch: The pytest monkeypatch fixture.
+        tmp_path: A temporary directory.
+
+    Returns:
+        None
+    """
+    snapshots.store.restore(str(tmp_path), max_age=3600)
+    with app.app_context():
+        guac_servers.poll('hosts', lambda gconn: 'before restart')
+    restored = snapshots.SnapshotStore()
+    restored.restore(str(tmp_path), max_age=3600)
+    monkeypatch.setattr(snapshots, 'store', restored)
+
+    release = threading.Event()
+
+    def answer(gconn):
+        release.wait(5)
+        return 'after restart'
+
+    app.config['GUAC_TIMEOUT'] = 5
+    with app.app_context():
+        results = guac_servers.poll('hosts', answer)
+    assert [(result['status'], result['value']) for result in results] == [
+        ('restored', 'before restart'), ('restored', 'before restart')
+    ]
+    release.set()
+    for _ in range(100):
+        if not restored.peek('guac.hosts', 'http://guac-1.test').stale:
+            break
+        time.sleep(0.01)
+    assert restored.peek('guac.hosts', 'http://guac-1.test').value == 'after restart'
@@ -0,0 +1,110 @@
+import pytest
+from range_monitor.plugins.guacamole import guac_conn, guac_users
+
+
+class FakeSession:
+    """
+    Stands in for 'guacamole.session', counting user requests.
+    """
+
+    host = 'http://guac.test'
+
+    def __init__(self):
+        self.users = {
+            'alice': {'username': 'alice',
+                      'attributes': {'guac-organization': 'Red Team'}},
+            'bob': {'username': 'bob',
+                    'attributes': {'guac-organization': 'Blue Team'}},
+            'carol': {'username': 'carol', 'attributes': {}},
+        }
+        self.active = {}
+        self.calls = []
+
+    def list_users(self):
+        self.calls.append('list_users')
+        return {username: dict(user) for username, user in self.users.items()}
+
+    def detail_user(self, username):
+        self.calls.append(f'detail_user:{username}')
+        return dict(self.users.get(username, {}))
+
+    def list_active_connections(self):
+        return dict(self.active)
+
+    def open(self, uuid, username):
+        self.active[uuid] = {'identifier': uuid, 'username': username,
+                             'connectionIdentifier': '1'}
+
+
+@pytest.fixture
+def gconn(monkeypatch):
+    fake = FakeSession()
+    monkeypatch.setattr(guac_conn, 'guac_connect', lambda server_id=None: fake)
+    monkeypatch.setattr(guac_users, 'users_cache',
+                        {'directories': {}, 'indexes': {}})
+    return fake
+
+
+def test_active_users_deduplicated(app, gconn):
+    """
+    Test that users with several sessions are looked up and listed once
+    and that the directory is prefetched once per TTL.
+
+    Args:
+        app: The Flask app.
+        gconn: The fake Guacamole session.
+
+    Returns:
+        None
+    """
+    for uuid in range(5):
+        gconn.open(f'a{uuid}', 'alice')
+    gconn.open('b0', 'bob')
+    gconn.open('c0', 'carol')
+
+    with app.app_context():
+        assert guac_users.get_active_users() == {
+            'Red Team': ['alice'],
+            'Blue Team': ['bob'],
+            'No Organization': ['carol'],
+        }
+        assert gconn.calls == ['list_users']
+
+        guac_users.get_active_users()
+        assert gconn.calls == ['list_users']
+
+
+def test_active_users_incremental(app, gconn):
+    """
+    Test that sessions coming and going update the grouping, that only new
+    users are detailed and that organization changes are picked up on the
+    next prefetch.
+
+    Args:
+        app: The Flask app.
+        gconn: The fake Guacamole session.
+
+    Returns:
+        None
+    """
+    app.config['GUAC_USERS_TTL'] = 300
+    gconn.open('a0', 'alice')
+    gconn.open('a1', 'alice')
+    with app.app_context():
+        assert guac_users.get_active_users() == {'Red Team': ['alice']}
+
+        del gconn.active['a0']
+        assert guac_users.get_active_users() == {'Red Team': ['alice']}
+        del gconn.active['a1']
+        assert guac_users.get_active_users() == {}
+
+        gconn.users['dave'] = {'username': 'dave',
+                               'attributes': {'guac-organization': 'Red Team'}}
+        gconn.open('d0', 'dave')
+        gconn.open('d1', 'dave')
+        assert guac_users.get_active_users() == {'Red Team': ['dave']}
+        assert gconn.calls == ['list_users', 'detail_user:dave']
+
+        gconn.users['dave']['attributes'] = {'guac-organization': 'White Cell'}
+        guac_users.get_directory(gconn.host).loaded = 0
+        assert guac_users.get_active_users() == {'White Cell': ['dave']}
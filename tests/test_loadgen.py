@@ -0,0 +1,51 @@
+from range_monitor import loadgen
+
+
+def test_percentile():
+    """
+    Test the nearest-rank percentile used in the load report.
+
+    Returns:
+        None
+    """
+    samples = list(range(1, 101))
+    assert loadgen.percentile(samples, 50) == 50
+    assert loadgen.percentile(samples, 99) == 99
+    assert loadgen.percentile([], 95) == 0.0
+
+
+def test_load_stats_report():
+    """
+    Test that the report aggregates latency, errors and amplification.
+
+    Returns:
+        None
+    """
+    stats = loadgen.LoadStats()
+    stats.record('/api/a', 0.010, True, 3)
+    stats.record('/api/a', 0.030, False, 5)
+    stats.record('/api/b', 0.020, True)
+
+    rows = {row['route']: row for row in stats.report(elapsed=2.0)}
+    assert rows['/api/a']['requests'] == 2
+    assert rows['/api/a']['error_rate'] == 0.5
+    assert rows['/api/a']['amplification'] == 4
+    assert rows['/api/b']['amplification'] is None
+    assert 'upstream calls/s' in loadgen.format_report({
+        'elapsed': 2.0, 'logins_failed': 0, 'routes': list(rows.values())
+    })
+
+
+def test_load_test_command(runner):
+    """
+    Test that the load-test command is registered next to init-db.
+
+    Args:
+        runner: The Flask CLI test runner.
+
+    Returns:
+        None
+    """
+    result = runner.invoke(args=['load-test', '--help'])
+    assert result.exit_code == 0
+    assert '--sessions' in result.output
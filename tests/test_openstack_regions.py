@@ -0,0 +1,169 @@
+import threading
+import pytest
+from range_monitor import snapshots
+from range_monitor.plugins.openstack import stack_conn, stack_regions
+
+
+class FakeResource(dict):
+    """
+    Stands in for an openstacksdk resource.
+    """
+
+    def to_dict(self):
+        return dict(self)
+
+
+class FakeConnection:
+    """
+    Stands in for 'openstack.connection.Connection' of one region.
+    """
+
+    def __init__(self, servers, networks, fail=None, block=None):
+        self.fail = fail
+        self.block = block
+        self.compute = self
+        self.network = self
+        self._servers = [FakeResource(server) for server in servers]
+        self._networks = [FakeResource(network) for network in networks]
+
+    def servers(self):
+        if self.block is not None:
+            self.block.wait(5)
+        if self.fail:
+            raise self.fail
+        return iter(self._servers)
+
+    def networks(self):
+        return iter(self._networks)
+
+
+@pytest.fixture
+def regions(monkeypatch):
+    configs = [
+        {'id': 1, 'auth_url': 'http://one.test', 'region': '1/RegionOne'},
+        {'id': 1, 'auth_url': 'http://one.test', 'region': '1/RegionTwo'},
+        {'id': 2, 'auth_url': 'http://two.test', 'region': '2/RegionOne'},
+    ]
+    connections = {
+        '1/RegionOne': FakeConnection(
+            [{'id': 'a', 'status': 'ACTIVE'}, {'id': 'b', 'status': 'SHUTOFF'}],
+            [{'id': 'net', 'status': 'ACTIVE'}]
+        ),
+        '1/RegionTwo': FakeConnection(
+            [{'id': 'a', 'status': 'ACTIVE'}],
+            [{'id': 'net', 'status': 'DOWN'}]
+        ),
+        '2/RegionOne': FakeConnection([{'id': 'c', 'status': 'ACTIVE'}], []),
+    }
+    monkeypatch.setattr(stack_conn, 'list_regions', lambda: configs)
+    monkeypatch.setattr(
+        stack_conn, 'connect_region',
+        lambda openstack_config: connections[openstack_config['region']]
+    )
+    monkeypatch.setattr(snapshots, 'store', snapshots.SnapshotStore())
+    return connections
+
+
+def test_list_regions(app):
+    """
+    Test that every region of every enabled entry gets its own
+    configuration.
+
+    Args:
+        app: The Flask app.
+
+    Returns:
+        None
+    """
+    with app.app_context():
+        from range_monitor.db import get_db
+        db = get_db()
+        db.execute("UPDATE openstack SET region_name = 'RegionOne, RegionTwo'")
+        regions = stack_conn.list_regions()
+    assert [region['region'] for region in regions] == ['1/RegionOne', '1/RegionTwo']
+    assert [region['region_name'] for region in regions] == ['RegionOne', 'RegionTwo']
+
+
+def test_inventory_tagged(app, regions):
+    """
+    Test that resources are tagged with their region and the dashboard
+    counts are added up across regions.
+
+    Args:
+        app: The Flask app.
+        regions: The fake connections by region.
+
+    Returns:
+        None
+    """
+    with app.app_context():
+        inventory = stack_regions.get_inventory()
+        overview = stack_regions.get_overview()
+    assert [(server['region'], server['id']) for server in inventory['servers']] == [
+        ('1/RegionOne', 'a'), ('1/RegionOne', 'b'), ('1/RegionTwo', 'a'),
+        ('2/RegionOne', 'c'),
+    ]
+    assert overview['instances_summary'] == {'active_instances': 3, 'total_instances': 4}
+    assert overview['networks_summary'] == {'active_networks': 1, 'total_networks': 2}
+    assert overview['regions'][1]['instances'] == {'active': 1, 'total': 1}
+
+
+def test_region_failures_isolated(app, regions):
+    """
+    Test that a failing region and a region slower than OPENSTACK_TIMEOUT
+    keep their last inventory without affecting the others.
+
+    Args:
+        app: The Flask app.
+        regions: The fake connections by region.
+
+    Returns:
+        None
+    """
+    app.config['OPENSTACK_TIMEOUT'] = 0.2
+    app.config['OPENSTACK_POLL_TTL'] = 0
+    release = threading.Event()
+    with app.app_context():
+        stack_regions.get_inventory()
+        regions['1/RegionTwo'].fail = RuntimeError('Unauthorized')
+        regions['2/RegionOne'].block = release
+        inventory = stack_regions.get_inventory()
+        release.set()
+    assert [(region['status'], region['stale']) for region in inventory['regions']] == [
+        ('ok', False), ('error', True), ('timeout', True)
+    ]
+    assert inventory['regions'][1]['error'] == 'Unauthorized'
+    assert len(inventory['servers']) == 4
+
+
+def test_region_loads_shared(app, regions):
+    """
+    Test that inventories are reused within OPENSTACK_POLL_TTL and that
+    polls of a hung region share the collection in flight.
+
+    Args:
+        app: The Flask app.
+        regions: The fake connections by region.
+
+    Returns:
+        None
+    """
+    calls = []
+    release = threading.Event()
+
+    def load(connection):
+        calls.append(connection)
+        return stack_regions.load_inventory(connection)
+
+    app.config['OPENSTACK_TIMEOUT'] = 0.1
+    with app.app_context():
+        stack_regions.poll('inventory', load, ttl=60)
+        stack_regions.poll('inventory', load, ttl=60)
+        assert len(calls) == 3
+
+        regions['2/RegionOne'].block = release
+        for _ in range(3):
+            results = stack_regions.poll('inventory', load, ttl=0)
+        release.set()
+    assert calls.count(regions['2/RegionOne']) == 2
+    assert results[2]['status'] == 'timeout'
@@ -0,0 +1,101 @@
+from range_monitor import profiling
+from range_monitor.db import get_db
+
+
+def test_profile_header(client, auth):
+    """
+    Test that the 'X-Profile' header is ignored on anonymous requests, that
+    a request of a logged in user sent with it is profiled and that its
+    span tree can be retrieved by an admin.
+
+    Args:
+        client: The client object used to make HTTP requests.
+        auth: The authentication actions helper.
+
+    Returns:
+        None
+    """
+    anonymous = client.get('/auth/login', headers={'X-Profile': '1'})
+    assert 'X-Profile-Id' not in anonymous.headers
+    assert 'Server-Timing' not in anonymous.headers
+
+    auth.login()
+    response = client.get('/auth/login', headers={'X-Profile': '1'})
+    profile_id = response.headers['X-Profile-Id']
+    assert 'total;dur=' in response.headers['Server-Timing']
+    assert response.headers['X-Upstream-Calls'] == '0'
+
+    profile = client.get(f'/debug/profile/{profile_id}').get_json()
+    assert profile['spans']['name'] == 'auth.login'
+    kinds = {child['kind'] for child in profile['spans']['children']}
+    assert 'template' in kinds
+
+
+def test_profile_disabled_by_default(client):
+    """
+    Test that requests are not profiled without the header or toggle.
+
+    Args:
+        client: The client object used to make HTTP requests.
+
+    Returns:
+        None
+    """
+    response = client.get('/auth/login')
+    assert 'X-Profile-Id' not in response.headers
+
+
+def test_profile_toggle(client, auth):
+    """
+    Test that the admin toggle profiles every request of the session.
+
+    Args:
+        client: The client object used to make HTTP requests.
+        auth: The authentication actions helper.
+
+    Returns:
+        None
+    """
+    auth.login()
+    assert client.post('/debug/profile/toggle').get_json()['profile']
+    response = client.get('/')
+    profile = profiling.get_profile(response.headers['X-Profile-Id'])
+    assert profile['spans']['name'] == 'main.index'
+    assert any(
+        child['kind'] == 'sql' for child in profile['spans']['children']
+    )
+
+
+def test_span_outside_request():
+    """
+    Test that spans are no-ops when no profile is active.
+
+    Returns:
+        None
+    """
+    with profiling.span('noop') as current:
+        assert current is None
+    assert not profiling.is_active()
+
+
+def test_sql_unprofiled(app, monkeypatch):
+    """
+    Test that statements run outside a profiled request skip the span.
+
+    Args:
+        app: The Flask app.
+        monkeypatch: The pytest monkeypatch fixture.
+
+    Returns:
+        None
+    """
+    def span(*args):
+        raise AssertionError('span opened without a profile')
+
+    monkeypatch.setattr(profiling, 'span', span)
+    with app.app_context():
+        db = get_db()
+        assert db.execute('SELECT 1').fetchone()[0] == 1
+        db.execute('CREATE TEMP TABLE numbers (n INTEGER)')
+        db.executemany('INSERT INTO numbers (n) VALUES (?)', [(1,), (2,)])
+        assert db.execute('SELECT count(*) FROM numbers').fetchone()[0] == 2
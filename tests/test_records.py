@@ -0,0 +1,61 @@
+import json
+from range_monitor import snapshots
+from range_monitor.plugins.guacamole import parse as guac_parse
+from range_monitor.plugins.saltstack import parse as salt_parse
+
+
+def test_record_mapping():
+    """
+    Test that a record reads and writes like the dictionary it was built
+    from, unknown keys included, and compares equal to it.
+
+    Returns:
+        None
+    """
+    data = {'identifier': '4', 'protocol': 'rdp', 'childConnections': []}
+    conn = guac_parse.Connection.from_dict(data)
+    assert not hasattr(conn, '__dict__')
+    assert conn == data and dict(conn) == data
+    assert conn['protocol'] == 'rdp' and conn.get('name') is None
+    assert 'name' not in conn and 'childConnections' in conn
+
+    conn['users'] = ['student001']
+    del conn['childConnections']
+    assert conn.to_dict() == {'identifier': '4', 'protocol': 'rdp', 'users': ['student001']}
+    assert conn._extra is None
+
+
+def test_fields_interned():
+    """
+    Test that repeated fields of records built from decoded JSON share one
+    string.
+
+    Returns:
+        None
+    """
+    first, second = json.loads('[{"role": "compute"}, {"role": "compute"}]')
+    assert first['role'] is not second['role']
+    minions = salt_parse.clean_minion_data({'a': first, 'b': second}, ['role'])
+    assert minions['a']['role'] is minions['b']['role']
+
+
+def test_records_persisted(tmp_path):
+    """
+    Test that snapshots of records are persisted and restored as
+    dictionaries.
+
+    Args:
+        tmp_path: A temporary directory.
+
+    Returns:
+        None
+    """
+    store = snapshots.SnapshotStore()
+    store.restore(str(tmp_path), max_age=3600)
+    session = guac_parse.Session.from_dict({'identifier': 'a', 'username': 'student001'})
+    store.put('guac.active_connections', 'http://guac.test', {'a': session})
+
+    restored = snapshots.SnapshotStore()
+    restored.restore(str(tmp_path), max_age=3600)
+    value = restored.peek('guac.active_connections', 'http://guac.test').value
+    assert value == {'a': {'identifier': 'a', 'username': 'student001'}}
@@ -0,0 +1,202 @@
+import gzip
+import json
+import threading
+import time
+from datetime import datetime, timezone
+import pytest
+from range_monitor import responses, snapshots
+from range_monitor.plugins.guacamole import guac_conn, guac_servers, parse
+
+
+@pytest.fixture(autouse=True)
+def caches(monkeypatch):
+    monkeypatch.setattr(responses, 'response_cache', {})
+    monkeypatch.setattr(responses, 'metrics', {})
+    monkeypatch.setattr(snapshots, 'store', snapshots.SnapshotStore())
+
+
+def test_encoded_once_per_version(app):
+    """
+    Test that a cached response is only built and encoded again when its
+    version or the snapshot store changes, and that gzip is served when
+    accepted.
+
+    Args:
+        app: The Flask app.
+
+    Returns:
+        None
+    """
+    app.config['RESPONSE_GZIP_MIN'] = 10
+    builds = []
+
+    def build():
+        builds.append(1)
+        return {'nodes': list(range(50))}
+
+    with app.test_request_context(headers={'Accept-Encoding': 'gzip'}):
+        first = responses.cached_json('test.nodes', 1, build)
+        second = responses.cached_json('test.nodes', 1, build)
+        assert len(builds) == 1
+        assert second.headers['Content-Encoding'] == 'gzip'
+        assert json.loads(gzip.decompress(second.get_data())) == {'nodes': list(range(50))}
+        assert first.get_data() == second.get_data()
+
+        responses.cached_json('test.nodes', 2, build)
+        snapshots.store = snapshots.SnapshotStore()
+        responses.cached_json('test.nodes', 2, build)
+        assert len(builds) == 3
+
+    with app.test_request_context():
+        plain = responses.cached_json('test.nodes', 2, build)
+        assert 'Content-Encoding' not in plain.headers
+        assert plain.get_json() == {'nodes': list(range(50))}
+    assert responses.get_metrics()['metrics']['test.nodes']['cache_hits'] == 2
+
+
+def test_encoders_agree(app, monkeypatch):
+    """
+    Test that orjson and the standard library encode records, dates and
+    integer keys alike.
+
+    Args:
+        app: The Flask app.
+        monkeypatch: The pytest monkeypatch fixture.
+
+    Returns:
+        None
+    """
+    data = {
+        'conn': parse.Connection.from_dict({'identifier': '1', 'protocol': 'rdp'}),
+        'date': datetime(2024, 6, 10, 14, 7, tzinfo=timezone.utc),
+        'counts': {3: 'c', 1: 'a'},
+        'huge': 2 ** 70,
+    }
+    with app.app_context():
+        fast = app.json.dumps(data)
+        monkeypatch.setattr(responses, 'orjson', None)
+        standard = app.json.dumps(data)
+    assert json.loads(fast) == json.loads(standard)
+    assert json.loads(standard)['conn'] == {'identifier': '1', 'protocol': 'rdp'}
+
+
+def test_topology_served_from_cache(client, auth, monkeypatch):
+    """
+    Test that unchanged topology polls are served without encoding the
+    topology again, and that a change is served right away.
+
+    Args:
+        client: The test client.
+        auth: The authentication helper.
+        monkeypatch: The pytest monkeypatch fixture.
+
+    Returns:
+        None
+    """
+    tree = [{'identifier': 'ROOT', 'parentIdentifier': None, 'activeConnections': 0}]
+    monkeypatch.setattr(guac_conn, 'list_servers',
+                        lambda: [{'id': 1, 'endpoint': 'http://guac.test'}])
+    monkeypatch.setattr(guac_conn, 'connect', lambda guac_config: None)
+    monkeypatch.setattr(guac_servers, 'server_topology', lambda gconn: list(tree))
+
+    client.application.config['GUAC_TOPOLOGY_TTL'] = 0
+    auth.login()
+    first = client.get('/guacamole/api/topology_data').get_json()
+    second = client.get('/guacamole/api/topology_data').get_json()
+    assert first == second
+    counters = responses.get_metrics()['metrics']['guacamole.topology']
+    assert (counters['encoded'], counters['cache_hits']) == (1, 1)
+
+    tree.append({'identifier': '4', 'parentIdentifier': 'ROOT'})
+    third = client.get('/guacamole/api/topology_data').get_json()
+    assert len(third['nodes']) == len(first['nodes']) + 1
+
+
+def test_conditional_get(client, auth, monkeypatch):
+    """
+    Test that If-None-Match with the ETag of the current version is
+    answered with an empty 304, and that a change of the data or a new
+    snapshot store, as after a restart, changes the ETag.
+
+    Args:
+        client: The test client.
+        auth: The authentication helper.
+        monkeypatch: The pytest monkeypatch fixture.
+
+    Returns:
+        None
+    """
+    users = {'team-01': ['student001']}
+    monkeypatch.setattr(guac_conn, 'list_servers',
+                        lambda: [{'id': 1, 'endpoint': 'http://guac.test'}])
+    monkeypatch.setattr(guac_conn, 'connect', lambda guac_config: None)
+    monkeypatch.setattr(guac_servers.guac_data, 'get_active_users',
+                        lambda gconn: dict(users))
+
+    client.application.config['GUAC_ACTIVE_USERS_TTL'] = 0
+    auth.login()
+    first = client.get('/guacamole/api/users_data')
+    etag = first.headers['ETag']
+    assert first.get_json() == users
+
+    cached = client.get('/guacamole/api/users_data', headers={'If-None-Match': etag})
+    assert cached.status_code == 304
+    assert cached.get_data() == b''
+    assert cached.headers['ETag'] == etag
+
+    users['team-02'] = ['student002']
+    changed = client.get('/guacamole/api/users_data', headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.get_json() == users
+
+    snapshots.store = snapshots.SnapshotStore()
+    restarted = client.get(
+        '/guacamole/api/users_data',
+        headers={'If-None-Match': changed.headers['ETag']}
+    )
+    assert restarted.status_code == 200
+    assert restarted.headers['ETag'] not in (etag, changed.headers['ETag'])
+    assert responses.get_metrics()['metrics']['guacamole.active_users']['not_modified'] == 1
+
+
+def test_not_modified_without_upstream(client, auth, monkeypatch):
+    """
+    Test that conditional polls of the topology are answered from the
+    snapshots: within GUAC_TOPOLOGY_TTL without calling Guacamole, and
+    once expired without waiting for the server to answer again.
+
+    Args:
+        client: The test client.
+        auth: The authentication helper.
+        monkeypatch: The pytest monkeypatch fixture.
+
+    Returns:
+        None
+    """
+    calls = []
+    release = threading.Event()
+
+    def server_topology(gconn):
+        calls.append(1)
+        if len(calls) > 1:
+            release.wait(5)
+        return [{'identifier': 'ROOT', 'parentIdentifier': None, 'activeConnections': 0}]
+
+    monkeypatch.setattr(guac_conn, 'list_servers',
+                        lambda: [{'id': 1, 'endpoint': 'http://guac.test', 'timeout': 5}])
+    monkeypatch.setattr(guac_conn, 'connect', lambda guac_config: None)
+    monkeypatch.setattr(guac_servers, 'server_topology', server_topology)
+    client.application.config['GUAC_TOPOLOGY_TTL'] = 60
+
+    auth.login()
+    etag = client.get('/guacamole/api/topology_data').headers['ETag']
+    headers = {'If-None-Match': etag}
+    assert client.get('/guacamole/api/topology_data', headers=headers).status_code == 304
+    assert len(calls) == 1
+
+    snapshot = snapshots.store.peek('guac.topology', 'http://guac.test')
+    snapshot.loaded -= 120
+    started = time.time()
+    assert client.get('/guacamole/api/topology_data', headers=headers).status_code == 304
+    assert time.time() - started < 1
+    release.set()
@@ -0,0 +1,99 @@
+from collections import deque
+import pytest
+from range_monitor.plugins.saltstack import salt_alerts
+
+
+@pytest.fixture
+def engine():
+    return salt_alerts.AlertEngine({'cpu_temp': 85}, sigma=4.0, warmup=5)
+
+
+def test_threshold_alert(engine):
+    """
+    Test that a reading at the limit raises an alert that is updated while
+    it lasts and cleared by the first normal reading.
+
+    Args:
+        engine: An AlertEngine.
+
+    Returns:
+        None
+    """
+    assert engine.observe('salt', 'compute-1', 'cpu_temp', 'C', 60, now=1) == []
+    raised = engine.observe('salt', 'compute-1', 'cpu_temp', 'C', 90, now=2)
+    assert [change['event'] for change in raised] == ['raised']
+    assert raised[0]['alert']['limit'] == 85
+
+    assert engine.observe('salt', 'compute-1', 'cpu_temp', 'C', 91, now=3) == []
+    active = engine.get_active('salt')
+    assert len(active) == 1
+    assert active[0]['value'] == 91 and active[0]['since'] == 2
+
+    cleared = engine.observe('salt', 'compute-1', 'cpu_temp', 'C', 70, now=4)
+    assert [change['event'] for change in cleared] == ['cleared']
+    assert engine.get_active() == []
+    assert [change['id'] for change in engine.changes_since(0)] == [1, 2]
+
+
+def test_deviation_alert(engine):
+    """
+    Test that sudden deviations are flagged only after the warmup and per
+    node, and that the state is updated without keeping the samples.
+
+    Args:
+        engine: An AlertEngine.
+
+    Returns:
+        None
+    """
+    for now, rpm in enumerate([5400, 5420, 5380, 5410, 5390, 5400]):
+        assert engine.observe('salt', 'compute-1', 'fan1', 'RPM', rpm, now=now) == []
+        engine.observe('salt', 'compute-2', 'fan1', 'RPM', rpm * 2, now=now)
+
+    changes = engine.observe('salt', 'compute-1', 'fan1', 'RPM', 1200, now=10)
+    assert changes[0]['alert']['kind'] == 'deviation'
+    assert changes[0]['alert']['sigma'] >= 4
+    assert engine.observe('salt', 'compute-2', 'fan1', 'RPM', 10800, now=10) == []
+
+    assert engine.states[('salt', 'compute-1', 'fan1')].count == 7
+    assert [alert['node'] for alert in engine.get_active()] == ['compute-1']
+
+
+def test_stream_format(engine):
+    """
+    Test the server-sent event formatting of alert changes.
+
+    Args:
+        engine: An AlertEngine.
+
+    Returns:
+        None
+    """
+    change = engine.observe('salt', 'compute-1', 'cpu_temp', 'C', 101.5, now=1)[0]
+    message = salt_alerts.format_event(change)
+    assert message.startswith('id: 1\nevent: raised\ndata: {')
+    assert message.endswith('\n\n')
+    assert '"value": 101.5' in message
+
+
+def test_stream_resync(engine, monkeypatch):
+    """
+    Test that a Last-Event-ID of a previous process, or older than the
+    kept changes, gets the active alerts again and the current id.
+
+    Args:
+        engine: An AlertEngine.
+        monkeypatch: The pytest monkeypatch fixture.
+
+    Returns:
+        None
+    """
+    monkeypatch.setattr(salt_alerts, 'alerts_cache', {'engine': engine})
+    engine.changes = deque(maxlen=2)
+    for now, value in enumerate([90, 70, 90]):
+        engine.observe('salt', 'compute-1', 'cpu_temp', 'C', value, now=now)
+
+    assert engine.can_resume(2)
+    for last_id in (None, 50, 0):
+        message = next(salt_alerts.stream('salt', last_id, lambda: None, 0))
+        assert message.startswith('id: 3\nevent: active\ndata: [{')
@@ -0,0 +1,136 @@
+import pytest
+from benchmarks.datasets import SaltDataset
+from benchmarks.stubs import SaltHandler, StubServer
+from range_monitor import snapshots
+from range_monitor.db import get_db
+from range_monitor.plugins.saltstack import salt_conn, salt_presence
+
+
+class RecordingHandler(SaltHandler):
+    """
+    Records the commands received by the stub master.
+    """
+
+    commands = []
+    paths = []
+
+    def route(self, method, path, query, body):
+        self.paths.append(path)
+        return super().route(method, path, query, body)
+
+    def execute(self, chunk):
+        self.commands.append(chunk['arg'][0])
+        return super().execute(chunk)
+
+
+@pytest.fixture
+def master(app, monkeypatch):
+    dataset = SaltDataset(minions=7, jobs=0)
+    monkeypatch.setattr(RecordingHandler, 'commands', [])
+    monkeypatch.setattr(RecordingHandler, 'paths', [])
+    monkeypatch.setattr(salt_conn, 'minion_cache', {})
+    monkeypatch.setattr(salt_presence, 'presence_cache', {})
+    with StubServer(RecordingHandler, dataset) as server:
+        with app.app_context():
+            db = get_db()
+            db.execute(
+                'UPDATE saltstack SET endpoint = ?, hostname = ?',
+                (server.url, dataset.hostname)
+            )
+            db.commit()
+        yield dataset
+
+
+def test_minions_projected(app, master):
+    """
+    Test that only the grains of the page are requested and that the
+    sorted result is reused until a minion changes.
+
+    Args:
+        app: The Flask app.
+        master: The stub salt master dataset.
+
+    Returns:
+        None
+    """
+    app.config['SALT_MINION_GRAINS'] = {'minions': ['id', 'role', 'virtual']}
+    with app.app_context():
+        minions = salt_conn.get_all_minions()
+        assert RecordingHandler.commands == [
+            ['grains.item', '*', ['id', 'role', 'virtual']]
+        ]
+        assert sum(len(role) for role in minions.values()) == 7
+        _, grains = minions['compute'][0]
+        assert set(grains) == {'id', 'role', 'virtual'}
+
+        assert salt_conn.get_all_minions() is minions
+
+        minion_id = next(iter(master.grains))
+        master.grains[minion_id]['virtual'] = 'qemu'
+        changed = salt_conn.get_all_minions()
+        assert changed is not minions
+        assert dict(changed['compute']) == dict(minions['compute'])
+        assert dict(changed['controller'])[minion_id]['virtual'] == 'qemu'
+
+
+def test_minion_detail_single_request(client, auth, master):
+    """
+    Test that the minion page sends its three commands as one batch and
+    that the salt-api token is reused across requests.
+
+    Args:
+        client: The client object used to make HTTP requests.
+        auth: The authentication actions helper.
+        master: The stub salt master dataset.
+
+    Returns:
+        None
+    """
+    auth.login()
+    minion_id = next(
+        minion_id for minion_id, grains in master.grains.items()
+        if grains['virtual'] == 'physical'
+    )
+    response = client.get(f'/saltstack/minions/{minion_id}')
+    assert response.status_code == 200
+    assert RecordingHandler.paths == ['/login', '']
+    assert [command[0] for command in RecordingHandler.commands] == [
+        'status.uptime', 'status.loadavg', 'grains.item'
+    ]
+
+    client.get(f'/saltstack/minions/{minion_id}')
+    assert RecordingHandler.paths == ['/login', '', '']
+
+
+def test_physical_nodes_not_cached_on_error(app, master, monkeypatch):
+    """
+    Test that a failed salt-api call is not cached as the physical nodes
+    and that invalidation picks up new hypervisors.
+
+    Args:
+        app: The Flask app.
+        master: The stub salt master dataset.
+        monkeypatch: The pytest monkeypatch fixture.
+
+    Returns:
+        None
+    """
+    monkeypatch.setattr(snapshots, 'store', snapshots.SnapshotStore())
+    execute_local_cmd = salt_conn.execute_local_cmd
+    with app.app_context():
+        monkeypatch.setattr(salt_conn, 'execute_local_cmd',
+                            lambda cmd: {'API ERROR': 'unreachable'})
+        assert salt_conn.get_physical_nodes() is False
+
+        monkeypatch.setattr(salt_conn, 'execute_local_cmd', execute_local_cmd)
+        nodes = salt_conn.get_physical_nodes()
+        assert len(nodes) == 2
+
+        minion_id = next(
+            minion_id for minion_id, grains in master.grains.items()
+            if grains['virtual'] != 'physical'
+        )
+        master.grains[minion_id]['virtual'] = 'physical'
+        assert salt_conn.get_physical_nodes() == nodes
+        salt_conn.invalidate_physical_nodes()
+        assert len(salt_conn.get_physical_nodes()) == 3
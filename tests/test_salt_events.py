@@ -0,0 +1,152 @@
+import sqlite3
+import time
+import pytest
+from benchmarks.datasets import SaltDataset
+from benchmarks.stubs import SaltHandler, StubServer
+from range_monitor import snapshots
+from range_monitor.db import get_db
+from range_monitor.plugins.saltstack import salt_conn, salt_events, salt_jobs, salt_presence, salt_sensors
+
+
+@pytest.fixture
+def master(app, monkeypatch):
+    dataset = SaltDataset(minions=7, jobs=10)
+    monkeypatch.setattr(salt_events, 'event_states', {})
+    monkeypatch.setattr(salt_jobs, 'jobs_cache',
+                        {'last_sync': {}, 'timelines': {}, 'results': None})
+    monkeypatch.setattr(salt_presence, 'presence_cache', {})
+    monkeypatch.setattr(snapshots, 'store', snapshots.SnapshotStore())
+    # the recorded jobs are from 2024
+    app.config['SALT_JOBS_RETENTION'] = 10 * 365 * 24 * 3600
+    with StubServer(SaltHandler, dataset) as server:
+        with app.app_context():
+            db = get_db()
+            db.execute(
+                'UPDATE saltstack SET endpoint = ?, hostname = ?',
+                (server.url, dataset.hostname)
+            )
+            db.commit()
+        yield dataset
+
+
+def test_parse_event_stream():
+    """
+    Test that events are split on blank lines and malformed ones skipped.
+
+    Returns:
+        None
+    """
+    lines = [
+        'retry: 400', '',
+        'tag: salt/minion/web/start',
+        'data: {"tag": "salt/minion/web/start", "data": {"id": "web"}}', '',
+        'tag: broken', 'data: {', '',
+    ]
+    assert list(salt_events.parse_event_stream(lines)) == [
+        ('salt/minion/web/start', {'id': 'web'})
+    ]
+
+
+def test_event_subscriber(app, master):
+    """
+    Test that the subscriber stores new jobs in the job index and that
+    presence and beacon events replace polling while the stream is live.
+
+    Args:
+        app: The Flask app.
+        master: The stub salt master dataset.
+
+    Returns:
+        None
+    """
+    minions = list(master.grains)
+    compute = next(minion for minion in minions if minion.startswith('compute'))
+    jid = '20240610150000000000'
+    master.events = [
+        (f'salt/job/{jid}/new', {
+            'jid': jid, 'fun': 'state.apply', 'arg': ['compute'],
+            'tgt': compute, 'tgt_type': 'glob', 'user': 'root',
+            'minions': [compute], '_stamp': '2024-06-10T15:00:00.000000',
+        }),
+        (f'salt/job/{jid}/ret/{compute}', {
+            'fun': 'state.apply', 'success': True, 'retcode': 0,
+            'return': {
+                'file_|-hosts': {'result': True, 'changes': {'diff': '+'}},
+                'pkg_|-ipmitool': {'result': False, 'changes': {}},
+            },
+        }),
+        ('salt/presence/present', {'present': minions[:3]}),
+        (f'salt/beacon/{compute}/ipmi/', {'cpu_temp': '61 degrees C', '_stamp': ''}),
+    ]
+
+    subscriber = salt_events.EventSubscriber(app)
+    assert subscriber.run_once()
+
+    state = salt_events.get_state(master.hostname)
+    assert state.recent_state_runs()[jid]['minions'][compute] == {
+        'succeeded': 1, 'failed': 1, 'changed': 1
+    }
+
+    with app.app_context():
+        jobs = salt_jobs.get_jobs_by_target(master.hostname)
+        assert next(iter(jobs[compute])) == jid
+
+        state.connected = True
+        count = salt_conn.get_minion_count()
+        assert sum(count['y']) == 3
+        assert salt_sensors.get_sensor('cpu_temp')[compute] == 61
+
+        # a connected but silent stream no longer replaces polling
+        app.config['SALT_EVENTS_MAX_SILENCE'] = 60
+        state.last_event -= 120
+        assert not salt_events.is_live(master.hostname)
+        count = salt_conn.get_minion_count()
+        assert sum(count['y']) == len(minions)
+
+
+def test_subscriber_survives_errors(app, master, monkeypatch):
+    """
+    Test that an error while storing jobs is retried instead of ending the
+    subscriber thread.
+
+    Args:
+        app: The Flask app.
+        master: The stub salt master dataset.
+        monkeypatch: The pytest monkeypatch fixture.
+
+    Returns:
+        None
+    """
+    jid = '20240610150000000000'
+    master.events = [
+        (f'salt/job/{jid}/new', {
+            'jid': jid, 'fun': 'test.ping', 'arg': [], 'tgt': '*',
+            'tgt_type': 'glob', 'user': 'root', 'minions': list(master.grains),
+            '_stamp': '2024-06-10T15:00:00.000000',
+        }),
+    ]
+    store_jobs = salt_jobs.store_jobs
+    calls = []
+
+    def flaky_store_jobs(*args, **kwargs):
+        calls.append(1)
+        if len(calls) == 1:
+            raise sqlite3.OperationalError('database is locked')
+        return store_jobs(*args, **kwargs)
+
+    monkeypatch.setattr(salt_jobs, 'store_jobs', flaky_store_jobs)
+    subscriber = salt_events.EventSubscriber(app)
+    subscriber.start()
+    try:
+        for _ in range(100):
+            with app.app_context():
+                if salt_jobs.get_watermark(master.hostname) == jid:
+                    break
+            time.sleep(0.05)
+    finally:
+        subscriber.stop.set()
+        subscriber.join(5)
+    assert len(calls) > 1
+    assert not subscriber.is_alive()
+    with app.app_context():
+        assert salt_jobs.get_watermark(master.hostname) == jid
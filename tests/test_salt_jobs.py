@@ -0,0 +1,234 @@
+import threading
+import pytest
+from datetime import datetime
+from benchmarks.datasets import SaltDataset
+from benchmarks.stubs import SaltHandler, StubServer
+from range_monitor.db import get_db
+from range_monitor.plugins.saltstack import parse, salt_conn, salt_jobs
+
+
+class CountingHandler(SaltHandler):
+    """
+    Records the jobs.list_jobs commands received by the stub master.
+    """
+
+    commands = []
+    lookups = []
+
+    def execute(self, chunk):
+        if chunk['arg'][0][0] == 'jobs.list_jobs':
+            self.commands.append(chunk['arg'][0])
+        if chunk['arg'][0][0] == 'jobs.lookup_jid':
+            self.lookups.append(chunk['arg'][0][1])
+        return super().execute(chunk)
+
+
+@pytest.fixture
+def master(app, monkeypatch):
+    dataset = SaltDataset(minions=7, jobs=50)
+    monkeypatch.setattr(CountingHandler, 'commands', [])
+    monkeypatch.setattr(CountingHandler, 'lookups', [])
+    monkeypatch.setattr(salt_jobs, 'jobs_cache', {'last_sync': {}, 'timelines': {}, 'results': None})
+    # the recorded jobs are from 2024
+    app.config['SALT_JOBS_RETENTION'] = 10 * 365 * 24 * 3600
+    with StubServer(CountingHandler, dataset) as server:
+        with app.app_context():
+            db = get_db()
+            db.execute(
+                'UPDATE saltstack SET endpoint = ?, hostname = ?',
+                (server.url, dataset.hostname)
+            )
+            db.commit()
+        yield dataset
+
+
+def test_jobs_index(app, master):
+    """
+    Test that only jobs newer than the watermark are fetched and that the
+    index groups cleaned jobs by target, newest first.
+
+    Args:
+        app: The Flask app.
+        master: The stub salt master dataset.
+
+    Returns:
+        None
+    """
+    with app.app_context():
+        jobs = salt_conn.get_all_jobs()
+        assert CountingHandler.commands == [['jobs.list_jobs', '']]
+        assert sum(len(target_jobs) for target_jobs in jobs.values()) == 40
+        for target_jobs in jobs.values():
+            jids = list(target_jobs)
+            assert jids == sorted(jids, reverse=True)
+            assert all(job['Function'] != 'test.ping' for job in target_jobs.values())
+
+        newest = max(master.jobs)
+        assert salt_jobs.get_watermark(master.hostname) == newest
+        jid = '20240610150000000000'
+        master.jobs[jid] = dict(
+            master.jobs[min(master.jobs)], StartTime='2024, Jun 10 15:00:00.000000'
+        )
+
+        salt_jobs.sync_jobs(force=True)
+        assert CountingHandler.commands[1] == [
+            'jobs.list_jobs', '', ['start_time=2024-06-10 14:07:00']
+        ]
+        jobs = salt_conn.get_all_jobs()
+        assert next(iter(jobs[master.jobs[jid]['Target']])) == jid
+        assert salt_jobs.get_watermark(master.hostname) == jid
+
+
+def test_jobs_page(client, auth, master):
+    """
+    Test that the jobs page renders from the index.
+
+    Args:
+        client: The client object used to make HTTP requests.
+        auth: The authentication actions helper.
+        master: The stub salt master dataset.
+
+    Returns:
+        None
+    """
+    auth.login()
+    response = client.get('/saltstack/jobs')
+    assert response.status_code == 200
+    assert min(master.jobs).encode() in response.data
+
+
+def test_job_timeline():
+    """
+    Test that a JobTimeline keeps each target sorted on insert and serves
+    the latest jobs per target.
+
+    Returns:
+        None
+    """
+    timeline = parse.JobTimeline()
+    for jid, minute, target in [
+        ('20240610140500000000', 5, ['web', 'db']),
+        ('20240610140100000000', 1, 'web'),
+        ('20240610140900000000', 9, 'db'),
+        ('20240610140300000000', 3, 'web'),
+    ]:
+        timeline.add(parse.JobRecord(jid, {
+            'Function': 'state.apply',
+            'Target': target,
+            'StartTime': f'2024, Jun 10 14:0{minute}:00.000000',
+        }))
+    timeline.add(parse.JobRecord('20240610140300000000', {
+        'Target': 'web', 'StartTime': '2024, Jun 10 14:03:00.000000',
+    }))
+
+    assert len(timeline) == 4
+    assert [record.jid[10:12] for record in timeline.latest('web')] == ['05', '03', '01']
+    assert [record.jid[10:12] for record in timeline.latest('web', 2)] == ['05', '03']
+    assert list(timeline.grouped(1)) == ['db', 'web']
+    assert list(timeline.grouped(1)['db']) == ['20240610140900000000']
+
+
+def test_timeline_shared(app, master):
+    """
+    Test that threads reading the index at once share one timeline and
+    add every job to it once.
+
+    Args:
+        app: The Flask app.
+        master: The stub salt master dataset.
+
+    Returns:
+        None
+    """
+    with app.app_context():
+        salt_jobs.sync_jobs()
+
+    timelines = []
+
+    def read():
+        with app.app_context():
+            timelines.append(salt_jobs.get_timeline(master.hostname))
+
+    threads = [threading.Thread(target=read) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len({id(timeline) for timeline in timelines}) == 1
+    jobs = timelines[0].by_target
+    assert sum(len(target_jobs) for target_jobs in jobs.values()) == len(timelines[0]) == 40
+
+
+def test_jobs_pruned(app, master):
+    """
+    Test that jobs older than SALT_JOBS_RETENTION are deleted from the
+    index and the timeline when new jobs are stored.
+
+    Args:
+        app: The Flask app.
+        master: The stub salt master dataset.
+
+    Returns:
+        None
+    """
+    with app.app_context():
+        salt_conn.get_all_jobs()
+        app.config['SALT_JOBS_RETENTION'] = 3600
+        jid = datetime.now().strftime(salt_jobs.JID_FORMAT)
+        job = dict(master.jobs[min(master.jobs)], Target='web')
+        assert salt_jobs.store_jobs(master.hostname, {jid: job}) == 1
+
+        db = get_db()
+        assert [row['jid'] for row in db.execute('SELECT jid FROM salt_jobs')] == [jid]
+        assert [row['jid'] for row in db.execute('SELECT jid FROM salt_job_targets')] == [jid]
+        assert salt_conn.get_all_jobs() == {'web': {jid: parse.JobRecord(jid, job).to_dict()}}
+
+
+def test_job_lookup_cache(app, master):
+    """
+    Test that jobs every minion returned from are looked up once and that
+    jobs still missing returns are looked up again once their TTL expired,
+    however old they are.
+
+    Args:
+        app: The Flask app.
+        master: The stub salt master dataset.
+
+    Returns:
+        None
+    """
+    app.config['SALT_JOB_RUNNING_TTL'] = 0
+    with app.app_context():
+        salt_conn.get_all_jobs()
+        done = min(master.jobs)
+        first = salt_conn.get_specified_job(done)
+        assert salt_conn.get_specified_job(done) == first
+        assert CountingHandler.lookups == [done]
+
+        running = max(master.jobs)
+        master.jobs[running]['Minions'] = [master.jobs[running]['Target'], 'minion-missing']
+        salt_conn.get_specified_job(running)
+        salt_conn.get_specified_job(running)
+        assert CountingHandler.lookups == [done, running, running]
+
+
+def test_job_result_cache_bounds():
+    """
+    Test that the result cache compresses large returns and evicts the
+    least recently used entries beyond its byte budget.
+
+    Returns:
+        None
+    """
+    cache = salt_jobs.JobResultCache(max_bytes=2000, compress_threshold=500)
+    large = {'minion': 'x' * 10000}
+    cache.put('large', large)
+    assert cache.entries['large'][1]
+    assert cache.get('large') == large
+
+    for index in range(20):
+        cache.put(index, {'minion': 'y' * 150})
+    assert cache.size <= 2000
+    assert cache.get('large') is None
+    assert cache.get(19) == {'minion': 'y' * 150}
+    assert cache.get(0) is None
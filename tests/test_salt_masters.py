@@ -0,0 +1,138 @@
+import pytest
+from benchmarks.datasets import SaltDataset
+from benchmarks.stubs import SaltHandler, StubServer
+from range_monitor import snapshots
+from range_monitor.db import get_db
+from range_monitor.plugins.saltstack import salt_jobs, salt_masters, salt_presence
+
+
+class TargetHandler(SaltHandler):
+    """
+    Records the target of the lowstate chunks received by the stub master.
+    """
+
+    targets = []
+
+    def execute(self, chunk):
+        self.targets.append(chunk['tgt'])
+        return super().execute(chunk)
+
+
+@pytest.fixture
+def masters(app, monkeypatch):
+    datasets = [
+        SaltDataset(minions=4, jobs=3, hostname='salt-east'),
+        SaltDataset(minions=6, jobs=5, hostname='salt-west'),
+    ]
+    monkeypatch.setattr(TargetHandler, 'targets', [])
+    monkeypatch.setattr(snapshots, 'store', snapshots.SnapshotStore())
+    monkeypatch.setattr(salt_jobs, 'jobs_cache',
+                        {'last_sync': {}, 'timelines': {}, 'results': None})
+    monkeypatch.setattr(salt_presence, 'presence_cache', {})
+    with StubServer(TargetHandler, datasets[0]) as east, \
+            StubServer(TargetHandler, datasets[1]) as west:
+        with app.app_context():
+            db = get_db()
+            db.execute(
+                'UPDATE saltstack SET endpoint = ?, hostname = ?',
+                (east.url, 'salt-east')
+            )
+            db.execute(
+                'INSERT INTO saltstack (endpoint, username, password, hostname, enabled)'
+                ' VALUES (?, ?, ?, ?, 1)',
+                (west.url, 'Administrator', 'Administrator', 'salt-west')
+            )
+            db.commit()
+        yield datasets
+
+
+def test_collect_every_master(app, masters):
+    """
+    Test that every master is collected with its own hostname as target
+    and that the results are keyed by master.
+
+    Args:
+        app: The Flask app.
+        masters: The stub salt master datasets.
+
+    Returns:
+        None
+    """
+    with app.app_context():
+        minions = salt_masters.get_minions()
+        counts = salt_masters.get_minion_count()
+    assert [master['status'] for master in minions['masters']] == ['ok', 'ok']
+    assert {
+        hostname: sum(len(group) for group in by_role.values())
+        for hostname, by_role in minions['values'].items()
+    } == {'salt-east': 4, 'salt-west': 6}
+    assert sum(counts['y']) == 10
+    assert set(TargetHandler.targets) == {'salt-east', 'salt-west'}
+
+
+def test_failed_master_isolated(app, masters):
+    """
+    Test that a master that stops answering keeps its last result, marked
+    stale, while the other master is still collected.
+
+    Args:
+        app: The Flask app.
+        masters: The stub salt master datasets.
+
+    Returns:
+        None
+    """
+    app.config['SALT_POLL_TTL'] = 0
+    with app.app_context():
+        salt_masters.get_jobs()
+        db = get_db()
+        db.execute(
+            "UPDATE saltstack SET endpoint = 'http://127.0.0.1:9' WHERE hostname = 'salt-west'"
+        )
+        db.commit()
+        salt_jobs.jobs_cache['last_sync'].clear()
+        jobs = salt_masters.get_jobs()
+    assert [(master['status'], master['stale']) for master in jobs['masters']] == [
+        ('ok', False), ('error', True)
+    ]
+    assert jobs['values']['salt-west'] is not None
+
+
+def test_results_reused(app, masters):
+    """
+    Test that results younger than SALT_POLL_TTL are served without
+    collecting from the masters again.
+
+    Args:
+        app: The Flask app.
+        masters: The stub salt master datasets.
+
+    Returns:
+        None
+    """
+    app.config['SALT_POLL_TTL'] = 60
+    with app.app_context():
+        first = salt_masters.get_minion_count()
+        requests = len(TargetHandler.targets)
+        assert salt_masters.get_minion_count() == first
+    assert len(TargetHandler.targets) == requests
+
+
+def test_select_master(client, auth, masters):
+    """
+    Test that ?master= serves the data of another enabled master.
+
+    Args:
+        client: The test client.
+        auth: The authentication helper.
+        masters: The stub salt master datasets.
+
+    Returns:
+        None
+    """
+    auth.login()
+    east = client.get('/saltstack/api/minion_data').get_json()
+    west = client.get('/saltstack/api/minion_data?master=salt-west').get_json()
+    assert sum(east['y']) == 4
+    assert sum(west['y']) == 6
+    assert client.get('/saltstack/api/minion_data?master=unknown').status_code == 404
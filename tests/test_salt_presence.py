@@ -0,0 +1,42 @@
+import pytest
+from range_monitor.plugins.saltstack import salt_presence
+
+
+@pytest.fixture(autouse=True)
+def presence_cache(monkeypatch):
+    monkeypatch.setattr(salt_presence, 'presence_cache', {})
+
+
+def test_presence_transitions(app):
+    """
+    Test that only changes between manage.up results are recorded and that
+    availability and flapping are computed from them.
+
+    Args:
+        app: The Flask app.
+
+    Returns:
+        None
+    """
+    app.config['SALT_FLAP_THRESHOLD'] = 3
+    with app.app_context():
+        assert len(salt_presence.record('salt', ['web-1', 'db-1'], now=1000)) == 2
+        assert salt_presence.record('salt', ['web-1', 'db-1'], now=1100) == []
+        assert salt_presence.record('salt', ['db-1'], now=1200) == [('web-1', False)]
+        salt_presence.record('salt', ['web-1', 'db-1'], now=1400)
+        salt_presence.record('salt', ['db-1'], now=1600)
+
+        salt_presence.presence_cache.clear()
+        assert salt_presence.get_known('salt') == {'web-1': False, 'db-1': True}
+
+        availability = salt_presence.get_availability('salt', 1000, 2000)
+        web = availability['minions']['web-1']
+        assert web['availability'] == 40.0
+        assert web['transitions'] == 3
+        assert web['flapping']
+        assert availability['minions']['db-1']['availability'] == 100.0
+        assert availability['roles']['web']['flapping'] == ['web-1']
+
+        availability = salt_presence.get_availability('salt', 1300, 2000)
+        assert availability['minions']['web-1']['availability'] == round(100 * 200 / 700, 2)
+        assert availability['minions']['web-1']['transitions'] == 2
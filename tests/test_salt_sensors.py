@@ -0,0 +1,178 @@
+import time
+import pytest
+from benchmarks.datasets import SaltDataset
+from benchmarks.stubs import SaltHandler, StubServer
+from range_monitor import snapshots
+from range_monitor.db import get_db
+from range_monitor.plugins.saltstack import parse, salt_alerts, salt_conn, salt_sensors
+
+
+class RecordingHandler(SaltHandler):
+    """
+    Records the commands received by the stub master.
+    """
+
+    commands = []
+
+    def execute(self, chunk):
+        self.commands.append(chunk['arg'][0])
+        return super().execute(chunk)
+
+
+@pytest.fixture
+def master(app, monkeypatch):
+    dataset = SaltDataset(minions=8, jobs=0)
+    monkeypatch.setattr(RecordingHandler, 'commands', [])
+    monkeypatch.setattr(snapshots, 'store', snapshots.SnapshotStore())
+    monkeypatch.setattr(salt_alerts, 'alerts_cache', {'engine': None})
+    with StubServer(RecordingHandler, dataset) as server:
+        with app.app_context():
+            db = get_db()
+            db.execute(
+                'UPDATE saltstack SET endpoint = ?, hostname = ?',
+                (server.url, dataset.hostname)
+            )
+            db.commit()
+        yield dataset
+
+
+def test_parse_ipmi_sensors():
+    """
+    Test that every numeric reading is parsed with its unit, including
+    3-digit ones, and that other values are skipped.
+
+    Returns:
+        None
+    """
+    samples = parse.parse_ipmi_sensors({
+        'cpu_temp': '105 degrees C',
+        'fan1': '5400 RPM',
+        'vcore': '1.02 Volts',
+        'pwr_consumption': '312 Watts',
+        'ip_address': '10.100.0.2',
+        'mac_address': '0a:1b:2c:3d:4e:5f',
+        'system_temp': 'Error: no reading',
+    })
+    assert sorted(samples) == [
+        ('cpu_temp', 'C', 105.0),
+        ('fan1', 'RPM', 5400.0),
+        ('pwr_consumption', 'W', 312.0),
+        ('vcore', 'V', 1.02),
+    ]
+
+
+def test_collect_sensors(app, master):
+    """
+    Test that only the physical nodes are read, in one salt-api request,
+    that the readings are shared until SALT_SENSORS_INTERVAL expires and that the
+    samples are stored for the trends.
+
+    Args:
+        app: The Flask app.
+        master: The stub salt master dataset.
+
+    Returns:
+        None
+    """
+    app.config['SALT_SENSORS_INTERVAL'] = 60
+    with app.app_context():
+        readings = salt_sensors.get_readings()
+        assert set(readings) == set(master.ipmi)
+        assert salt_sensors.get_readings() is readings
+        assert RecordingHandler.commands == [['grains.item', '*', ['virtual']]] + [
+            ['grains.item', node, ['ipmi']] for node in salt_conn.get_physical_nodes()
+        ]
+
+        node, ipmi = next(iter(master.ipmi.items()))
+        assert readings[node]['fan1'] == {'value': 5400.0, 'unit': 'RPM'}
+        assert salt_sensors.get_sensor('cpu_temp')[node] == float(ipmi['cpu_temp'].split()[0])
+        assert salt_sensors.list_sensors(readings)['pwr_consumption'] == 'W'
+
+        trend = salt_sensors.get_trend('vcore', time.time() - 60, node=node)
+        assert trend['unit'] == 'V'
+        assert list(trend['nodes']) == [node]
+        assert trend['nodes'][node][0][1] == 1.02
+
+
+def test_sensor_routes(app, client, auth, master):
+    """
+    Test the sensor API and that the temperature pages render the generic
+    sensor chart.
+
+    Args:
+        app: The Flask app.
+        client: The test client.
+        auth: The authentication helper.
+        master: The stub salt master dataset.
+
+    Returns:
+        None
+    """
+    auth.login()
+    data = client.get('/saltstack/api/sensors').get_json()
+    assert set(data['nodes']) == set(master.ipmi)
+    assert data['sensors']['fan2'] == 'RPM'
+
+    temps = client.get('/saltstack/api/cpu_temp').get_json()
+    assert set(temps) == set(master.ipmi)
+
+    trend = client.get('/saltstack/api/sensors/fan1/trend').get_json()
+    assert set(trend['nodes']) == set(master.ipmi)
+
+    response = client.get('/saltstack/system_temp')
+    assert b'sensor_trends.js' in response.data
+    assert b'data-sensor="system_temp"' in response.data
+
+
+def test_sensor_alerts(app, client, auth, master):
+    """
+    Test that collected readings feed the alert engine and that the active
+    alerts are served by the API.
+
+    Args:
+        app: The Flask app.
+        client: The test client.
+        auth: The authentication helper.
+        master: The stub salt master dataset.
+
+    Returns:
+        None
+    """
+    app.config['SALT_SENSOR_THRESHOLDS'] = {'pwr_consumption': 300}
+    auth.login()
+    client.get('/saltstack/api/sensors')
+    alerts = client.get('/saltstack/api/alerts').get_json()['alerts']
+    assert {alert['node'] for alert in alerts} == set(master.ipmi)
+    assert {alert['sensor'] for alert in alerts} == {'pwr_consumption'}
+    assert alerts[0]['limit'] == 300
+
+
+def test_sensor_retention(app, client, auth, master):
+    """
+    Test that samples older than SALT_SENSORS_RETENTION are deleted when
+    new ones are stored and that check_data is limited.
+
+    Args:
+        app: The Flask app.
+        client: The test client.
+        auth: The authentication helper.
+        master: The stub salt master dataset.
+
+    Returns:
+        None
+    """
+    app.config['SALT_SENSORS_RETENTION'] = 3600
+    with app.app_context():
+        db = get_db()
+        db.execute(
+            'INSERT INTO salt_sensors (hostname, node, sensor, unit, value, time)'
+            " VALUES (?, 'old', 'cpu_temp', 'C', 40, ?)",
+            (master.hostname, time.time() - 7200)
+        )
+        db.commit()
+        salt_sensors.get_readings()
+        nodes = {row['node'] for row in db.execute('SELECT node FROM salt_sensors')}
+    assert nodes == set(master.ipmi)
+
+    auth.login()
+    assert len(client.get('/saltstack/check_data?limit=3').get_json()) == 3
@@ -0,0 +1,189 @@
+import time
+
+import pytest
+from range_monitor import snapshots
+
+
+@pytest.fixture
+def store(monkeypatch):
+    store = snapshots.SnapshotStore()
+    monkeypatch.setattr(snapshots, 'store', store)
+    return store
+
+
+def test_snapshot_ttl_and_versions(app, store):
+    """
+    Test that fresh snapshots are reused, that versions only change with
+    the value and that invalidation forces a reload.
+
+    Args:
+        app: The Flask app.
+        store: An empty snapshot store.
+
+    Returns:
+        None
+    """
+    calls = []
+
+    def loader(source):
+        calls.append(source)
+        return ['compute-1']
+
+    with app.app_context():
+        first = snapshots.get('nodes', 'salt', loader, ttl=60)
+        assert snapshots.get('nodes', 'salt', loader, ttl=60) is first
+        assert snapshots.get('nodes', 'other', loader, ttl=60).version != first.version
+        assert calls == ['salt', 'other']
+
+        assert store.put('nodes', 'salt', ['compute-1']).version == first.version
+        assert store.put('nodes', 'salt', ['compute-2']).version > first.version
+
+        assert snapshots.invalidate(source='salt') == 1
+        snapshots.get('nodes', 'salt', loader, ttl=60)
+        assert calls == ['salt', 'other', 'salt']
+
+
+def test_snapshot_background_refresh(app, store):
+    """
+    Test that an expired snapshot is served while it is reloaded in the
+    background and that failed reloads keep the previous value.
+
+    Args:
+        app: The Flask app.
+        store: An empty snapshot store.
+
+    Returns:
+        None
+    """
+    values = iter([['a'], ['b']])
+
+    def loader(source):
+        value = next(values, None)
+        if value is None:
+            raise RuntimeError('salt-api is down')
+        return value
+
+    with app.app_context():
+        store.put('nodes', 'salt', ['old'], loaded=time.time() - 120)
+        assert snapshots.get('nodes', 'salt', loader, ttl=60).value == ['old']
+        for _ in range(100):
+            if store.peek('nodes', 'salt').value == ['a']:
+                break
+            time.sleep(0.01)
+        assert store.peek('nodes', 'salt').value == ['a']
+
+        store.put('nodes', 'salt', ['a'], loaded=time.time() - 1200)
+        assert snapshots.get('nodes', 'salt', loader, ttl=60).value == ['b']
+        store.put('nodes', 'salt', ['b'], loaded=time.time() - 1200)
+        with pytest.raises(RuntimeError):
+            snapshots.get('nodes', 'salt', loader, ttl=60)
+        assert store.peek('nodes', 'salt').value == ['b']
+
+
+def test_snapshot_persistence(app, store, tmp_path):
+    """
+    Test that new values are persisted, restored as stale snapshots that
+    are served at once and reloaded in the background, and that expired
+    files are dropped.
+
+    Args:
+        app: The Flask app.
+        store: An empty snapshot store.
+        tmp_path: A temporary directory.
+
+    Returns:
+        None
+    """
+    store.restore(str(tmp_path), max_age=3600)
+    store.put('nodes', 'salt', ['compute-1'])
+    store.put('nodes', 'old', ['compute-9'], loaded=time.time() - 7200)
+    assert len(list(tmp_path.glob('*.json.z'))) == 2
+
+    restored = snapshots.SnapshotStore()
+    assert restored.restore(str(tmp_path), max_age=3600) == 1
+    assert len(list(tmp_path.glob('*.json.z'))) == 1
+    snapshot = restored.peek('nodes', 'salt')
+    assert snapshot.stale and snapshot.value == ['compute-1']
+
+    with app.app_context():
+        served = restored.get('nodes', 'salt', lambda source: ['compute-2'], ttl=60)
+        assert served is snapshot
+        for _ in range(100):
+            if not restored.peek('nodes', 'salt').stale:
+                break
+            time.sleep(0.01)
+    refreshed = restored.peek('nodes', 'salt')
+    assert refreshed.value == ['compute-2'] and refreshed.version > snapshot.version
+
+
+def test_restored_snapshot_max_stale(app, store, tmp_path):
+    """
+    Test that a restored snapshot older than its max_stale age is loaded
+    again before it is served.
+
+    Args:
+        app: The Flask app.
+        store: An empty snapshot store.
+        tmp_path: A temporary directory.
+
+    Returns:
+        None
+    """
+    store.restore(str(tmp_path), max_age=86400)
+    store.put('sessions', 'guac', ['ended'], loaded=time.time() - 80000)
+
+    restored = snapshots.SnapshotStore()
+    restored.restore(str(tmp_path), max_age=86400)
+    with app.app_context():
+        served = restored.get('sessions', 'guac', lambda source: ['active'],
+                              ttl=2, max_stale=20)
+    assert served.value == ['active'] and not served.stale
+
+
+def test_never_persist(store, tmp_path, monkeypatch):
+    """
+    Test that snapshots of a transient key are neither written nor
+    restored, and that files persisted before are removed.
+
+    Args:
+        store: An empty snapshot store.
+        tmp_path: A temporary directory.
+        monkeypatch: The pytest monkeypatch fixture.
+
+    Returns:
+        None
+    """
+    monkeypatch.setattr(snapshots, 'transient_keys', set())
+    store.restore(str(tmp_path), max_age=3600)
+    store.put('slideshow', 'guac', {'token': 'secret'})
+    store.put('nodes', 'salt', ['compute-1'])
+    assert len(list(tmp_path.glob('*.json.z'))) == 2
+
+    restored = snapshots.SnapshotStore()
+    restored.restore(str(tmp_path), max_age=3600)
+    restored.never_persist('slideshow')
+    assert restored.peek('slideshow', 'guac') is None
+    assert len(list(tmp_path.glob('*.json.z'))) == 1
+
+    restored.put('slideshow', 'guac', {'token': 'secret'})
+    assert len(list(tmp_path.glob('*.json.z'))) == 1
+
+
+def test_snapshot_debug_routes(client, auth, store):
+    """
+    Test that admins can list and invalidate snapshots.
+
+    Args:
+        client: The client object used to make HTTP requests.
+        auth: The authentication actions helper.
+        store: An empty snapshot store.
+
+    Returns:
+        None
+    """
+    store.put('salt.physical_nodes', 'salt-dev', ['compute-1'])
+    auth.login()
+    assert client.get('/debug/snapshots').get_json()[0]['key'] == 'salt.physical_nodes'
+    response = client.post('/debug/snapshots/invalidate', json={'source': 'salt-dev'})
+    assert response.get_json()['dropped'] == 1
+    assert store.list() == []